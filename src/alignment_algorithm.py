@@ -10,42 +10,61 @@ This file contains three functions :
     - glocal
     
 Those functions are able to find an alignment between two proteic sequences
-following the corresponding algorithms.
+following the corresponding algorithms, and write it in the results 
+repository.
+
+The tracebacks themselves are done by needleman_wunsch_alignment,
+smith_waterman_alignments and glocal_alignments, which return the alignments
+instead of writing them. alignment_text and write_alignments give the text
+format of the result files.
+
+needleman_wunsch_directions, smith_waterman_directions and glocal_directions
+give the same alignments from the direction matrices of alignment_matrix,
+without the alignment matrix.
+
+An alignment is a tuple: the alignment score, the two aligned sequences and 
+the cells of the path, ((i, j), (i, j)), the cell of the alignment matrix 
+where the traceback stops and the one where it starts. The aligned residues 
+are fasta1[i:i'] and fasta2[j:j'] of those two cells. The path of a glocal 
+alignment can go past the first row: its first row is then negative, as the 
+rows before the first one are the last ones.
 
 """
 
 import numpy as np
 
+import alignment_matrix as am
+import profiling as pr
+
+# Kind of alignment of each mode, used in the result files.
+KINDS = {"nw": "Global", "sw": "Local", "gl": "Glocal"}
+
 ###############################################################################
 #                                                                             #
 #                           Needleman and Wunsch                              #
 #                                                                             #
 ###############################################################################
 
-def needleman_wunsch(fasta1, fasta2, prot_name1, prot_name2, alignment_matrix):
-    """Performs a global alignment following the Needleman and Wunsch algorithm.
+def needleman_wunsch_alignment(fasta1, fasta2, alignment_matrix):
+    """Finds the global alignment following the Needleman and Wunsch 
+    algorithm.
 
     Parameters
     ----------
-    fasta1 : list of sting
+    fasta1 : list of string
         A list of string containing the first fasta sequence.
         
     fasta2 : list of string
         A list of string containing the second fasta sequence.
         
-    prot_name1 : string
-        The name of the first protein.
-        
-    prot_name2 : string
-        The name of the second protein.
-        
     alignment_matrix : array
         An array containing the alignment matrix.
 
     Returns
     -------
-    str
-        A string presenting the alignment.
+    tuple
+        The alignment score, the two aligned sequences (str) and the cells 
+        of the path, ((i, j), (i, j)), where it starts and where it ends.
     """
     
     # result1 and result2 will contain the aligned sequences.
@@ -56,6 +75,7 @@ def needleman_wunsch(fasta1, fasta2, prot_name1, prot_name2, alignment_matrix):
     # i for rows and j for columns.
     i = alignment_matrix.shape[0]-1
     j = alignment_matrix.shape[1]-1
+    end = (i, j)
     
     # Gives the score of the alignment.
     alignment_score = alignment_matrix[i][j]
@@ -100,28 +120,12 @@ def needleman_wunsch(fasta1, fasta2, prot_name1, prot_name2, alignment_matrix):
     # We need to reverse the two sequences.
     result1 = result1[::-1]
     result2 = result2[::-1]
+    
+    return alignment_score, result1, result2, ((i, j), end)
 
-    # Creates a text file as output and writes the results in it.
-    writting_model = (f"Global alignment of {prot_name1} and {prot_name2}\n\n"
-                      f"Alignment_score = {alignment_score}\n\n"
-                      f"{prot_name1}\n"
-                      f"{result1}\n"
-                      f"{result2}\n"
-                      f"{prot_name2}\n\n")
-
-    file_name = (f"../results/{prot_name1}_&_{prot_name2}_Global.txt")
-
-    with open (file_name, "w") as file:
-        file.write(writting_model)
 
-###############################################################################
-#                                                                             #
-#                           Smith and Waterman                                #
-#                                                                             #
-###############################################################################
-
-def smith_waterman(fasta1, fasta2, prot_name1, prot_name2, alignment_matrix):
-    """Performs a local alignment following the Smith and Waterman algorithm.
+def needleman_wunsch(fasta1, fasta2, prot_name1, prot_name2, alignment_matrix):
+    """Performs a global alignment following the Needleman and Wunsch algorithm.
 
     Parameters
     ----------
@@ -133,7 +137,7 @@ def smith_waterman(fasta1, fasta2, prot_name1, prot_name2, alignment_matrix):
         
     prot_name1 : string
         The name of the first protein.
-            
+        
     prot_name2 : string
         The name of the second protein.
         
@@ -146,6 +150,42 @@ def smith_waterman(fasta1, fasta2, prot_name1, prot_name2, alignment_matrix):
         A string presenting the alignment.
     """
     
+    alignment = needleman_wunsch_alignment(fasta1, fasta2, alignment_matrix)
+    
+    # Creates a text file as output and writes the results in it.
+    write_alignments("Global", prot_name1, prot_name2, [alignment], "w")
+
+###############################################################################
+#                                                                             #
+#                           Smith and Waterman                                #
+#                                                                             #
+###############################################################################
+
+def smith_waterman_alignments(fasta1, fasta2, alignment_matrix):
+    """Finds the local alignments following the Smith and Waterman algorithm.
+    
+    There is one alignment for each maximum of the alignment matrix.
+
+    Parameters
+    ----------
+    fasta1 : list of string
+        A list of string containing the first fasta sequence.
+        
+    fasta2 : list of string
+        A list of string containing the second fasta sequence.
+        
+    alignment_matrix : array
+        An array containing the alignment matrix.
+
+    Returns
+    -------
+    list
+        A list of tuples, the alignment score, the two aligned sequences 
+        (str) and the cells of the path of each alignment.
+    """
+    
+    alignments = []
+    
     # strating_position corresponds to the location of the maximum score in 
     # the entire table.
     starting_position = np.where(alignment_matrix == np.amax(alignment_matrix))
@@ -163,8 +203,9 @@ def smith_waterman(fasta1, fasta2, prot_name1, prot_name2, alignment_matrix):
         
         # i and j are set to the position of the maximum score of the table.
         # i for rows and j for columns.
-        i = list(starting_position[0])[max_number-1]
-        j = list(starting_position[1])[max_number-1]
+        i = int(list(starting_position[0])[max_number-1])
+        j = int(list(starting_position[1])[max_number-1])
+        end = (i, j)
         # alignment-score corresponds to the value of the maximum.
         alignment_score = alignment_matrix[i][j]
     
@@ -199,34 +240,17 @@ def smith_waterman(fasta1, fasta2, prot_name1, prot_name2, alignment_matrix):
         result1 = result1[::-1]
         result2 = result2[::-1]
 
-        # Creates a text file as output and writes the results in it.
-        writting_model = (
-                      f"Local alignment of {prot_name1} and {prot_name2}\n\n"
-                      f"Alignment_score = {alignment_score}\n\n"
-                      f"{prot_name1}\n"
-                      f"{result1}\n"
-                      f"{result2}\n"
-                      f"{prot_name2}\n\n")
-        
-        file_name = (f"../results/{prot_name1}_&_{prot_name2}_Local.txt")
-
-        with open (file_name, "a") as file:
-            file.write(writting_model)
+        alignments.append((alignment_score, result1, result2, 
+                           ((i, j), end)))
         
         # Reiterates the while loop.
         max_number -= 1
+    
+    return alignments
 
-###############################################################################
-#                                                                             #
-#                                   Glocal                                    #
-#                                                                             #
-###############################################################################
 
-def glocal(fasta1, fasta2, prot_name1, prot_name2, alignment_matrix):
-    """Performs a glocal alignment.
-    
-    The alignment starts at the maximum score of the last column and ends
-    at the first column.
+def smith_waterman(fasta1, fasta2, prot_name1, prot_name2, alignment_matrix):
+    """Performs a local alignment following the Smith and Waterman algorithm.
 
     Parameters
     ----------
@@ -250,6 +274,45 @@ def glocal(fasta1, fasta2, prot_name1, prot_name2, alignment_matrix):
     str
         A string presenting the alignment.
     """
+    
+    alignments = smith_waterman_alignments(fasta1, fasta2, alignment_matrix)
+    
+    # Creates a text file as output and writes the results in it.
+    write_alignments("Local", prot_name1, prot_name2, alignments, "w")
+
+###############################################################################
+#                                                                             #
+#                                   Glocal                                    #
+#                                                                             #
+###############################################################################
+
+def glocal_alignments(fasta1, fasta2, alignment_matrix):
+    """Finds the glocal alignments.
+    
+    The alignment starts at the maximum score of the last column and ends
+    at the first column. There is one alignment for each maximum of the last
+    column.
+
+    Parameters
+    ----------
+    fasta1 : list of string
+        A list of string containing the first fasta sequence.
+        
+    fasta2 : list of string
+        A list of string containing the second fasta sequence.
+        
+    alignment_matrix : array
+        An array containing the alignment matrix.
+
+    Returns
+    -------
+    list
+        A list of tuples, the alignment score, the two aligned sequences 
+        (str) and the cells of the path of each alignment.
+    """
+    
+    alignments = []
+    
     # strating_position corresponds to the position of the maximum score in 
     # the last column.
     starting_position = np.where(alignment_matrix[:,-1] \
@@ -266,8 +329,9 @@ def glocal(fasta1, fasta2, prot_name1, prot_name2, alignment_matrix):
         
         # i and j are set to the maximum score of the table.
         # i for rows and j for columns.
-        i = list(starting_position[0])[max_number-1]
+        i = int(list(starting_position[0])[max_number-1])
         j = int(alignment_matrix.shape[1]-1)
+        end = (i, j)
         
         alignment_score = alignment_matrix[i][j]
         
@@ -301,19 +365,375 @@ def glocal(fasta1, fasta2, prot_name1, prot_name2, alignment_matrix):
         result1 = result1[::-1]
         result2 = result2[::-1]
 
-        # Creates a text file as output and writes the results in it.
-        writting_model = (
-                      f"Glocal alignment of {prot_name1} and {prot_name2}\n\n"
-                      f"Alignment_score = {alignment_score}\n\n"
-                      f"{prot_name1}\n"
-                      f"{result1}\n"
-                      f"{result2}\n"
-                      f"{prot_name2}\n\n")
-        
-        file_name = (f"../results/{prot_name1}_&_{prot_name2}_Glocal.txt")
-
-        with open (file_name, "a") as file:
-            file.write(writting_model)
+        alignments.append((alignment_score, result1, result2, 
+                           ((i, j), end)))
             
         # Reiterates the while loop.
         max_number -= 1
+    
+    return alignments
+
+
+def glocal(fasta1, fasta2, prot_name1, prot_name2, alignment_matrix):
+    """Performs a glocal alignment.
+    
+    The alignment starts at the maximum score of the last column and ends
+    at the first column.
+
+    Parameters
+    ----------
+    fasta1 : list of sting
+        A list of string containing the first fasta sequence.
+        
+    fasta2 : list of string
+        A list of string containing the second fasta sequence.
+        
+    prot_name1 : string
+        The name of the first protein.
+            
+    prot_name2 : string
+        The name of the second protein.
+        
+    alignment_matrix : array
+        An array containing the alignment matrix.
+
+    Returns
+    -------
+    str
+        A string presenting the alignment.
+    """
+    
+    alignments = glocal_alignments(fasta1, fasta2, alignment_matrix)
+    
+    # Creates a text file as output and writes the results in it.
+    write_alignments("Glocal", prot_name1, prot_name2, alignments, "w")
+
+###############################################################################
+#                                                                             #
+#                        Direction matrix tracebacks                          #
+#                                                                             #
+###############################################################################
+
+def path_strings(fasta1, fasta2, index1, index2):
+    """Writes the aligned sequences from the positions collected by a 
+    traceback.
+
+    Parameters
+    ----------
+    fasta1 : list of string
+        A list of string containing the first fasta sequence.
+        
+    fasta2 : list of string
+        A list of string containing the second fasta sequence.
+        
+    index1 : array
+        The positions in the first sequence, from the end of the alignment. 
+        len(fasta1) stands for a gap.
+        
+    index2 : array
+        The positions in the second sequence, from the end of the alignment.
+        len(fasta2) stands for a gap.
+
+    Returns
+    -------
+    tuple
+        The two aligned sequences (str).
+    """
+    
+    # A gap is added at the end of each sequence.
+    residues1 = np.array(list(fasta1) + ["-"])
+    residues2 = np.array(list(fasta2) + ["-"])
+    
+    # The positions have been collected from the end of the alignment.
+    return ("".join(residues1[index1[::-1]]), 
+            "".join(residues2[index2[::-1]]))
+
+
+def walk(directions, i, j, index1, index2, step, gap1, gap2, seq1_size,
+         seq2_size, glocal=False):
+    """Follows the direction matrix from a cell.
+    
+    The walk stops at the first row or column, or at the first column only
+    for the glocal traceback (the rows before the first row are then the 
+    last ones, as in glocal).
+
+    Parameters
+    ----------
+    directions : array
+        The direction matrix.
+        
+    i, j : int
+        The starting cell.
+        
+    index1, index2 : array
+        The arrays receiving the positions in each sequence.
+        
+    step : int
+        The first free position of index1 and index2.
+        
+    gap1, gap2 : int
+        The positions standing for a gap in each sequence.
+        
+    seq1_size, seq2_size : int
+        The size of each sequence.
+        
+    glocal : bool
+        OPTIONAL, True for the glocal traceback. By default, False.
+
+    Returns
+    -------
+    tuple
+        The last cell (i, j) and the next free position of index1 and index2.
+    """
+    
+    while j > 0 and (glocal or i > 0):
+        
+        # As in glocal, the rows before the first row are the last ones,
+        # but only once.
+        if i-1 < -seq1_size:
+            raise IndexError("The glocal traceback went past the matrix.")
+        
+        direction = directions.item(i, j)
+        
+        if direction == am.DIAGONAL:
+            index1[step] = (i-1) % seq1_size
+            index2[step] = j-1
+            i -= 1
+            j -= 1
+        elif direction == am.TOP:
+            index1[step] = (i-1) % seq1_size
+            index2[step] = gap2
+            i -= 1
+        else:
+            index1[step] = gap1
+            index2[step] = j-1
+            j -= 1
+        step += 1
+    
+    return i, j, step
+
+
+def needleman_wunsch_directions(fasta1, fasta2, directions, last_column):
+    """Finds the global alignment from a direction matrix.
+    
+    Gives the same alignment as needleman_wunsch_alignment.
+
+    Parameters
+    ----------
+    fasta1 : list of string
+        A list of string containing the first fasta sequence.
+        
+    fasta2 : list of string
+        A list of string containing the second fasta sequence.
+        
+    directions : array
+        The direction matrix, as given by direction_matrix_nw.
+        
+    last_column : array
+        The last column of the alignment matrix.
+
+    Returns
+    -------
+    tuple
+        The alignment score, the two aligned sequences (str) and the cells 
+        of the path, as needleman_wunsch_alignment.
+    """
+    
+    seq1_size = directions.shape[0]-1
+    seq2_size = directions.shape[1]-1
+    gap1 = len(fasta1)
+    gap2 = len(fasta2)
+    
+    # The positions of the path are collected in preallocated arrays.
+    index1 = np.empty(seq1_size+seq2_size, dtype=np.intp)
+    index2 = np.empty(seq1_size+seq2_size, dtype=np.intp)
+    
+    i, j, step = walk(directions, seq1_size, seq2_size, index1, index2, 0, 
+                      gap1, gap2, seq1_size, seq2_size)
+    
+    # The rest of the sequences is completed as in 
+    # needleman_wunsch_alignment.
+    while j > 0:
+        index1[step] = (i-1) % seq1_size
+        index2[step] = gap2
+        step += 1
+        j -= 1
+    while i > 0:
+        index1[step] = gap1
+        index2[step] = (j-1) % seq2_size
+        step += 1
+        i -= 1
+    
+    return (last_column[-1],
+            *path_strings(fasta1, fasta2, index1[:step], index2[:step]),
+            ((i, j), (seq1_size, seq2_size)))
+
+
+def smith_waterman_directions(fasta1, fasta2, directions, maxima, best):
+    """Finds the local alignments from a direction matrix.
+    
+    Gives the same alignments as smith_waterman_alignments.
+
+    Parameters
+    ----------
+    fasta1 : list of string
+        A list of string containing the first fasta sequence.
+        
+    fasta2 : list of string
+        A list of string containing the second fasta sequence.
+        
+    directions : array
+        The direction matrix, as given by direction_matrix_sw.
+        
+    maxima : tuple
+        The positions of the maximums of the alignment matrix.
+        
+    best : float
+        The maximum of the alignment matrix.
+
+    Returns
+    -------
+    list
+        A list of tuples, the alignment score, the two aligned sequences 
+        (str) and the cells of the path of each alignment.
+    """
+    
+    seq1_size = directions.shape[0]-1
+    seq2_size = directions.shape[1]-1
+    
+    index1 = np.empty(seq1_size+seq2_size, dtype=np.intp)
+    index2 = np.empty(seq1_size+seq2_size, dtype=np.intp)
+    
+    alignments = []
+    
+    # The maximums are taken from the last one, as in smith_waterman.
+    for i, j in zip(maxima[0][::-1], maxima[1][::-1]):
+        end = (int(i), int(j))
+        i, j, step = walk(directions, *end, index1, index2, 0, len(fasta1), 
+                          len(fasta2), seq1_size, seq2_size)
+        alignments.append((best, *path_strings(fasta1, fasta2, 
+                                               index1[:step], 
+                                               index2[:step]),
+                           ((i, j), end)))
+    
+    return alignments
+
+
+def glocal_directions(fasta1, fasta2, directions, last_column):
+    """Finds the glocal alignments from a direction matrix.
+    
+    Gives the same alignments as glocal_alignments.
+
+    Parameters
+    ----------
+    fasta1 : list of string
+        A list of string containing the first fasta sequence.
+        
+    fasta2 : list of string
+        A list of string containing the second fasta sequence.
+        
+    directions : array
+        The direction matrix, as given by direction_matrix_sw.
+        
+    last_column : array
+        The last column of the alignment matrix.
+
+    Returns
+    -------
+    list
+        A list of tuples, the alignment score, the two aligned sequences 
+        (str) and the cells of the path of each alignment.
+    """
+    
+    seq1_size = directions.shape[0]-1
+    seq2_size = directions.shape[1]-1
+    
+    # The glocal traceback can go past the first row, up to once more the 
+    # whole matrix.
+    index1 = np.empty(2*seq1_size+seq2_size+2, dtype=np.intp)
+    index2 = np.empty(2*seq1_size+seq2_size+2, dtype=np.intp)
+    
+    alignments = []
+    
+    # The maximums of the last column, from the last one, as in glocal.
+    ends = np.where(last_column == np.amax(last_column))[0]
+    for end in ends[::-1]:
+        end = (int(end), seq2_size)
+        i, j, step = walk(directions, *end, index1, index2, 0, len(fasta1), 
+                          len(fasta2), seq1_size, seq2_size, glocal=True)
+        alignments.append((last_column[end[0]], 
+                           *path_strings(fasta1, fasta2, index1[:step], 
+                                         index2[:step]),
+                           ((i, j), end)))
+    
+    return alignments
+
+###############################################################################
+#                                                                             #
+#                                  Output                                     #
+#                                                                             #
+###############################################################################
+
+def alignment_text(kind, prot_name1, prot_name2, alignment):
+    """Presents an alignment as in the result files.
+
+    Parameters
+    ----------
+    kind : str
+        The kind of alignment: Global, Local or Glocal.
+        
+    prot_name1 : string
+        The name of the first protein.
+            
+    prot_name2 : string
+        The name of the second protein.
+        
+    alignment : tuple
+        The alignment score, the two aligned sequences (str) and the cells 
+        of the path.
+
+    Returns
+    -------
+    str
+        A string presenting the alignment.
+    """
+    
+    alignment_score, result1, result2, _ = alignment
+    
+    return (f"{kind} alignment of {prot_name1} and {prot_name2}\n\n"
+            f"Alignment_score = {alignment_score}\n\n"
+            f"{prot_name1}\n"
+            f"{result1}\n"
+            f"{result2}\n"
+            f"{prot_name2}\n\n")
+
+
+def write_alignments(kind, prot_name1, prot_name2, alignments, file_mode):
+    """Writes alignments in ../results/<prot_name1>_&_<prot_name2>_<kind>.txt.
+
+    Parameters
+    ----------
+    kind : str
+        The kind of alignment: Global, Local or Glocal.
+        
+    prot_name1 : string
+        The name of the first protein.
+            
+    prot_name2 : string
+        The name of the second protein.
+        
+    alignments : list
+        A list of tuples, the alignment score, the two aligned sequences 
+        (str) and the cells of the path of each alignment.
+        
+    file_mode : str
+        "w" to replace the file, "a" to add the alignments at its end.
+    """
+    
+    file_name = (f"../results/{prot_name1}_&_{prot_name2}_{kind}.txt")
+    
+    with pr.stage("write"), open (file_name, file_mode) as file:
+        for alignment in alignments:
+            text = alignment_text(kind, prot_name1, prot_name2, alignment)
+            file.write(text)
+            pr.count("bytes_written", len(text))
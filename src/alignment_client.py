@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 08:39:31 2026
+
+@author: Jean Delhomme
+
+Client of the alignment server (see alignment_server).
+
+This file contains two functions :
+    - send_requests
+    - align_remote
+
+It can be used as main.py, the proteins being aligned by a running server
+instead of a new process :
+
+    python3 alignment_client.py EMB1 FASTA1 EMB2 FASTA2 [MODE] [ENGINE]
+                                [--socket PATH] [--score-only]
+
+The files are looked for in ../data/emb/ and ../data/fasta/, as with
+main.py, and the alignments are written in the same result file. As with
+main.py, MODE can be several modes separated by commas, or all. With
+--score-only, the scores are only printed.
+
+"""
+
+# Importation of common modules.
+import argparse
+import json
+import os
+import socket
+import sys
+
+# Importation of the modules used for writing the results.
+import alignment_algorithm as aa
+import alignment_server as sv
+
+
+def send_requests(requests, path=sv.SOCKET):
+    """Sends requests to the server and waits for all the responses.
+
+    Parameters
+    ----------
+    requests : list
+        A list of requests (dict, see alignment_server). The requests
+        without id are numbered by their position.
+
+    path : str
+        OPTIONAL, the path of the socket of the server.
+
+    Returns
+    -------
+    list
+        The response of each request, in the order of the requests.
+    """
+
+    requests = [dict(request) for request in requests]
+    for number, request in enumerate(requests):
+        request.setdefault("id", number)
+    positions = {request["id"]: number
+                 for number, request in enumerate(requests)}
+    responses = [None] * len(requests)
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(path)
+        # The server reads the requests while it answers them, so they can
+        # all be sent first.
+        connection.sendall(b"".join(json.dumps(request).encode() + b"\n"
+                                    for request in requests))
+        with connection.makefile("rb") as stream:
+            for _ in requests:
+                line = stream.readline()
+                if not line:
+                    raise ConnectionError("The server closed the "
+                                          "connection.")
+                response = json.loads(line)
+                if response.get("id") not in positions:
+                    raise RuntimeError(response.get("error",
+                                                    "Unexpected response."))
+                responses[positions[response["id"]]] = response
+
+    return responses
+
+
+def align_remote(embedding_file1, fasta_file1, embedding_file2, fasta_file2,
+                 mode="nw", engine="numpy", score_only=False, options=None,
+                 path=sv.SOCKET):
+    """Aligns two proteins on the server.
+
+    The paths are made absolute, as the server may run in another
+    directory.
+
+    Parameters
+    ----------
+    embedding_file1, fasta_file1 : str
+        The embedding and fasta files of the first protein.
+
+    embedding_file2, fasta_file2 : str
+        The embedding and fasta files of the second protein.
+
+    mode : str or list
+        OPTIONAL, nw (global), sw (local) or gl (glocal), or a list of
+        modes. By default, nw.
+
+    engine : str
+        OPTIONAL, the engine (see batch.py). By default, numpy.
+
+    score_only : bool
+        OPTIONAL, True to only compute the alignment score. By default,
+        False.
+
+    options : dict
+        OPTIONAL, the settings of the engine (see batch.align).
+
+    path : str
+        OPTIONAL, the path of the socket of the server.
+
+    Returns
+    -------
+    dict
+        The response of the server.
+    """
+
+    request = {"embedding1": os.path.abspath(embedding_file1),
+               "fasta1": os.path.abspath(fasta_file1),
+               "embedding2": os.path.abspath(embedding_file2),
+               "fasta2": os.path.abspath(fasta_file2),
+               "mode": mode, "engine": engine, "score_only": score_only,
+               "options": options or {}}
+
+    response = send_requests([request], path)[0]
+    if "error" in response:
+        raise RuntimeError(response["error"])
+
+    return response
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(
+        description="Aligns two proteins on a running alignment server.")
+    parser.add_argument("embedding1")
+    parser.add_argument("fasta1")
+    parser.add_argument("embedding2")
+    parser.add_argument("fasta2")
+    parser.add_argument("mode", nargs="?", default="nw",
+                        help="nw, sw, gl, several modes separated by commas "
+                             "or all")
+    parser.add_argument("engine", nargs="?", default="numpy")
+    parser.add_argument("--socket", default=sv.SOCKET,
+                        help="path of the Unix socket of the server")
+    parser.add_argument("--score-only", action="store_true",
+                        help="only print the alignment score")
+    arguments = parser.parse_args()
+
+    # Variables for the path of the data files, as in main.py.
+    path_embedding = "../data/emb/"
+    path_fasta = "../data/fasta/"
+
+    # Several modes are aligned by a single request.
+    modes = list(aa.KINDS) if arguments.mode == "all" \
+        else arguments.mode.split(",")
+    for name in modes:
+        if name not in aa.KINDS:
+            sys.exit(f"Unknown mode {name}, use nw, sw, gl or all.")
+
+    try:
+        result = align_remote(path_embedding + arguments.embedding1,
+                              path_fasta + arguments.fasta1,
+                              path_embedding + arguments.embedding2,
+                              path_fasta + arguments.fasta2,
+                              modes, arguments.engine,
+                              arguments.score_only, path=arguments.socket)
+    except (OSError, RuntimeError) as error:
+        sys.exit(f"Alignment failed: {error}")
+
+    for mode in modes:
+        if arguments.score_only:
+            print(f"{mode}\t{result['score'][mode]}")
+        else:
+            aa.write_alignments(aa.KINDS[mode], result["query"],
+                                result["target"],
+                                [tuple(alignment)
+                                 for alignment in result["alignments"][mode]],
+                                "w")
@@ -4,18 +4,48 @@ Created on Tue Sep 13 15:49:06 2022
 
 @author: Jean Delhomme
 
-This file contains two functions :
-    - alignment_matrix_nw
+This file contains eight functions :
     - alignment_matrix_nw
+    - alignment_matrix_sw
+    - alignment_matrix_nw_numpy
+    - alignment_matrix_sw_numpy
+    - direction_matrix_nw
+    - direction_matrix_sw
+    - alignment_matrix_nw_blocked
+    - alignment_matrix_sw_blocked
     
 Those functions are able to calculate the alignment matrix used in Needleman
 and Wunsch and Smith and Waterman algorithms.
 The alignment matrix of Needleman and Wunsch is also used for glocal alignment.
 
+The _numpy functions compute the same matrices as the pure Python functions,
+bit for bit, but fill a whole row at once with array operations. The
+ENGINES dictionary gives access to both versions by name.
+
+The direction_matrix functions do not keep the alignment matrix. They record,
+during the fill, the move chosen by the tracebacks of alignment_algorithm in
+each cell (one byte per cell instead of eight) and only keep two rows of
+scores.
+
+The _blocked functions cut the alignment matrix in tiles. A tile only needs
+the last row of the tile above and the last column of the tile on its left,
+so all the tiles of a block anti-diagonal are filled at the same time, on a
+pool of threads (numpy releases the GIL in its array operations). Each tile
+is filled as in the _numpy functions, so the matrices are the same, bit for
+bit.
+
 """
 
+import concurrent.futures
+import os
+import sys
+import time
+
 import numpy as np
 
+# Default number of rows and columns of a tile of the _blocked functions.
+TILE_SIZE = 1024
+
 ###############################################################################
 #                                                                             #
 #                        Needleman and Wunsch + Glocal                        #
@@ -126,4 +156,508 @@ def alignment_matrix_sw(array):
             # In Smith and Waterman, the maximum needs to be > 0.
             alignment_matrix[i][j] = max(diagonal, top, left, 0)
     
-    return alignment_matrix
\ No newline at end of file
+    return alignment_matrix
+
+###############################################################################
+#                                                                             #
+#                     Needleman and Wunsch + Glocal (numpy)                   #
+#                                                                             #
+###############################################################################
+
+def alignment_matrix_nw_numpy(array):
+    """Creates an alignment matrix from a score matrix, one row at a time.
+    
+    Gives exactly the same matrix as alignment_matrix_nw. The diagonal and top
+    moves only depend on the previous row, so they are computed for the whole
+    row with a single array operation. As the gap is fixed at 0, the left 
+    moves reduce to a running maximum along the row (np.maximum.accumulate).
+    Only maximums and the diagonal additions are used, so no rounding differs
+    from the pure Python version.
+
+    Parameters
+    ----------
+    array : array
+        An array containing the score matrix for an alignment.
+
+    Returns
+    -------
+    array
+        An array containing the alignment matrix.
+    """
+    
+    # The gap is fixed at 0.
+    gap = 0
+    
+    # seq1_size is the size of the first sequence and seq2_size the size of 
+    # the second sequence.
+    seq1_size = array.shape[0]
+    seq2_size = array.shape[1]
+    
+    # The alignment matrix is created and stored with 0s.
+    alignment_matrix = np.zeros((seq1_size+1, seq2_size+1))
+    
+    # Fills the first column and the first row.
+    alignment_matrix[:, 0] = np.arange(seq1_size+1) * gap
+    alignment_matrix[0, :] = np.arange(seq2_size+1) * gap
+    
+    # Fills out all other rows of the alignment matrix.
+    for i in range(1, seq1_size+1):
+        previous_row = alignment_matrix[i-1]
+        row = alignment_matrix[i]
+        # Calculates the best of the diagonal and top cells for the whole row.
+        np.maximum(previous_row[:-1] + array[i-1], previous_row[1:] + gap, 
+                   out=row[1:])
+        # Propagates the left cells: the running maximum starts from the 
+        # first column which is already filled.
+        np.maximum.accumulate(row, out=row)
+    
+    return alignment_matrix
+
+###############################################################################
+#                                                                             #
+#                        Smith and Waterman (numpy)                           #
+#                                                                             #
+###############################################################################
+
+def alignment_matrix_sw_numpy(array):
+    """Creates an alignment matrix from a score matrix according to the Smith
+    and Waterman algorithm, one row at a time.
+    
+    Gives exactly the same matrix as alignment_matrix_sw, see 
+    alignment_matrix_nw_numpy for the row formulation.
+
+    Parameters
+    ----------
+    array : array
+        An array containing the score matrix for an alignment.
+
+    Returns
+    -------
+    array
+        An array containing the alignment matrix.
+    """
+    
+    # The gap is fixed at 0.
+    gap = 0
+    
+    # seq1_size is the size of the first sequence and seq2_size the size of 
+    # the second sequence.
+    seq1_size = array.shape[0]
+    seq2_size = array.shape[1]
+    
+    # The alignment matrix is created and stored with 0s.
+    alignment_matrix = np.zeros((seq1_size+1, seq2_size+1))
+    
+    # Fills the first column and the first row.
+    alignment_matrix[:, 0] = np.arange(seq1_size+1) * gap
+    alignment_matrix[0, :] = np.arange(seq2_size+1) * gap
+    
+    # Fills out all other rows of the alignment matrix.
+    for i in range(1, seq1_size+1):
+        previous_row = alignment_matrix[i-1]
+        row = alignment_matrix[i]
+        # Calculates the best of the diagonal and top cells for the whole row.
+        np.maximum(previous_row[:-1] + array[i-1], previous_row[1:] + gap, 
+                   out=row[1:])
+        # In Smith and Waterman, the maximum needs to be > 0.
+        np.maximum(row[1:], 0, out=row[1:])
+        # Propagates the left cells with a running maximum.
+        np.maximum.accumulate(row, out=row)
+    
+    return alignment_matrix
+
+###############################################################################
+#                                                                             #
+#                             Direction matrices                              #
+#                                                                             #
+###############################################################################
+
+# Codes of the direction matrix.
+STOP = 0
+DIAGONAL = 1
+TOP = 2
+LEFT = 3
+
+
+def row_directions(directions, previous_row, row):
+    """Records the moves of the tracebacks for one row.
+    
+    The tracebacks of alignment_algorithm go to the best of the diagonal, 
+    top and left cells, preferring the diagonal, then the top.
+
+    Parameters
+    ----------
+    directions : array
+        The row of the direction matrix to fill.
+        
+    previous_row : array
+        The previous row of the alignment matrix.
+        
+    row : array
+        The current row of the alignment matrix.
+    """
+    
+    diagonal = previous_row[:-1]
+    top = previous_row[1:]
+    left = row[:-1]
+    best = np.maximum(np.maximum(diagonal, left), top)
+    
+    # The first column is never read by the tracebacks.
+    directions[1:] = np.where(best == diagonal, DIAGONAL, 
+                              np.where(best == top, TOP, LEFT))
+
+
+def direction_matrix(array, local=False):
+    """Creates the direction matrix from a score matrix.
+    
+    The rows of the alignment matrix are computed as in 
+    alignment_matrix_nw_numpy (or alignment_matrix_sw_numpy if local), but 
+    only two of them are kept.
+    
+    The first row of the direction matrix holds the moves for the top row
+    when the glocal traceback goes past it: as in glocal, the row before the
+    first row is then the last one.
+
+    Parameters
+    ----------
+    array : array
+        An array containing the score matrix for an alignment.
+        
+    local : bool
+        OPTIONAL, True for the Smith and Waterman matrix. By default, False.
+
+    Returns
+    -------
+    tuple
+        The direction matrix (uint8 array), the last column of the alignment 
+        matrix (array), the positions of the maximums of the alignment matrix
+        (tuple of two arrays, as given by np.where) and the maximum.
+    """
+    
+    # The gap is fixed at 0.
+    gap = 0
+    
+    seq1_size = array.shape[0]
+    seq2_size = array.shape[1]
+    
+    directions = np.zeros((seq1_size+1, seq2_size+1), dtype=np.uint8)
+    last_column = np.zeros(seq1_size+1)
+    
+    # The first row of the alignment matrix.
+    first_row = np.arange(seq2_size+1) * gap
+    previous_row = first_row.astype(float)
+    
+    # Maximums of the alignment matrix, in the order of np.where.
+    best = previous_row.max()
+    columns = np.flatnonzero(previous_row == best)
+    maxima_rows = [np.zeros(len(columns), dtype=np.intp)]
+    maxima_columns = [columns]
+    
+    for i in range(1, seq1_size+1):
+        
+        # Same recurrence as alignment_matrix_nw_numpy.
+        row = np.empty(seq2_size+1)
+        row[0] = i * gap
+        np.maximum(previous_row[:-1] + array[i-1], previous_row[1:] + gap, 
+                   out=row[1:])
+        # In Smith and Waterman, the maximum needs to be > 0.
+        if local:
+            np.maximum(row[1:], 0, out=row[1:])
+        np.maximum.accumulate(row, out=row)
+        
+        row_directions(directions[i], previous_row, row)
+        last_column[i] = row[-1]
+        
+        # Keeps the positions of the maximums.
+        row_max = row.max()
+        if row_max >= best:
+            if row_max > best:
+                best = row_max
+                maxima_rows = []
+                maxima_columns = []
+            columns = np.flatnonzero(row == best)
+            maxima_rows.append(np.full(len(columns), i, dtype=np.intp))
+            maxima_columns.append(columns)
+        
+        previous_row = row
+    
+    # The row before the first row is the last one (glocal traceback).
+    row_directions(directions[0], previous_row, first_row)
+    
+    maxima = (np.concatenate(maxima_rows), np.concatenate(maxima_columns))
+    
+    return directions, last_column, maxima, best
+
+
+def direction_matrix_nw(array):
+    """Creates the direction matrix of the Needleman and Wunsch alignment
+    matrix. See direction_matrix.
+
+    Parameters
+    ----------
+    array : array
+        An array containing the score matrix for an alignment.
+
+    Returns
+    -------
+    tuple
+        The direction matrix, the last column of the alignment matrix, the 
+        positions of its maximums and the maximum.
+    """
+    
+    return direction_matrix(array, local=False)
+
+
+def direction_matrix_sw(array):
+    """Creates the direction matrix of the Smith and Waterman alignment
+    matrix. See direction_matrix.
+
+    Parameters
+    ----------
+    array : array
+        An array containing the score matrix for an alignment.
+
+    Returns
+    -------
+    tuple
+        The direction matrix, the last column of the alignment matrix, the 
+        positions of its maximums and the maximum.
+    """
+    
+    return direction_matrix(array, local=True)
+
+###############################################################################
+#                                                                             #
+#                            Blocked wavefront                                #
+#                                                                             #
+###############################################################################
+
+def fill_tile(alignment_matrix, array, row_start, row_stop, column_start, 
+              column_stop, local=False):
+    """Fills one tile of the alignment matrix, in place.
+    
+    The tile is made of the rows row_start+1 to row_stop and of the columns
+    column_start+1 to column_stop. The row row_start (above the tile) and the
+    column column_start (on its left) must already be filled.
+
+    Parameters
+    ----------
+    alignment_matrix : array
+        The alignment matrix being filled.
+        
+    array : array
+        An array containing the score matrix for an alignment.
+        
+    row_start, row_stop : int
+        The row above the tile and the last row of the tile.
+        
+    column_start, column_stop : int
+        The column on the left of the tile and the last column of the tile.
+        
+    local : bool
+        OPTIONAL, True for the Smith and Waterman matrix. By default, False.
+    """
+    
+    # The gap is fixed at 0.
+    gap = 0
+    
+    for i in range(row_start+1, row_stop+1):
+        previous_row = alignment_matrix[i-1, column_start:column_stop+1]
+        # The first cell is the last cell of the tile on the left.
+        row = alignment_matrix[i, column_start:column_stop+1]
+        # Same recurrence as alignment_matrix_nw_numpy, on the columns of the
+        # tile: the running maximum starts from the cell on the left.
+        np.maximum(previous_row[:-1] + array[i-1, column_start:column_stop], 
+                   previous_row[1:] + gap, out=row[1:])
+        # In Smith and Waterman, the maximum needs to be > 0.
+        if local:
+            np.maximum(row[1:], 0, out=row[1:])
+        np.maximum.accumulate(row, out=row)
+
+
+def alignment_matrix_blocked(array, local=False, tile_size=TILE_SIZE, 
+                             threads=None):
+    """Creates an alignment matrix from a score matrix, tile by tile.
+    
+    The tiles (bi, bj) with the same bi + bj are independent: they are filled
+    at the same time, then the next anti-diagonal of tiles is started.
+
+    Parameters
+    ----------
+    array : array
+        An array containing the score matrix for an alignment.
+        
+    local : bool
+        OPTIONAL, True for the Smith and Waterman matrix. By default, False.
+        
+    tile_size : int
+        OPTIONAL, the number of rows and columns of a tile.
+        
+    threads : int
+        OPTIONAL, the number of threads. By default, the number of cores.
+
+    Returns
+    -------
+    array
+        An array containing the alignment matrix.
+    """
+    
+    # The gap is fixed at 0.
+    gap = 0
+    
+    seq1_size = array.shape[0]
+    seq2_size = array.shape[1]
+    threads = threads or os.cpu_count()
+    
+    # The alignment matrix is created and stored with 0s.
+    alignment_matrix = np.zeros((seq1_size+1, seq2_size+1))
+    
+    # Fills the first column and the first row.
+    alignment_matrix[:, 0] = np.arange(seq1_size+1) * gap
+    alignment_matrix[0, :] = np.arange(seq2_size+1) * gap
+    
+    # Limits of the tiles: the tile (bi, bj) goes from row_limits[bi] 
+    # (excluded) to row_limits[bi+1], and the same for the columns.
+    row_limits = list(range(0, seq1_size, tile_size)) + [seq1_size]
+    column_limits = list(range(0, seq2_size, tile_size)) + [seq2_size]
+    tile_rows = len(row_limits) - 1
+    tile_columns = len(column_limits) - 1
+    
+    with concurrent.futures.ThreadPoolExecutor(threads) as executor:
+        for diagonal in range(tile_rows + tile_columns - 1):
+            futures = []
+            for bi in range(max(0, diagonal-tile_columns+1), 
+                            min(diagonal, tile_rows-1)+1):
+                bj = diagonal - bi
+                futures.append(executor.submit(
+                    fill_tile, alignment_matrix, array, row_limits[bi], 
+                    row_limits[bi+1], column_limits[bj], column_limits[bj+1], 
+                    local))
+            # The next anti-diagonal needs all the tiles of this one (result
+            # also raises the errors of the threads).
+            for future in futures:
+                future.result()
+    
+    return alignment_matrix
+
+
+def alignment_matrix_nw_blocked(array, tile_size=TILE_SIZE, threads=None):
+    """Creates the Needleman and Wunsch alignment matrix on several threads.
+    See alignment_matrix_blocked.
+
+    Parameters
+    ----------
+    array : array
+        An array containing the score matrix for an alignment.
+        
+    tile_size : int
+        OPTIONAL, the number of rows and columns of a tile.
+        
+    threads : int
+        OPTIONAL, the number of threads. By default, the number of cores.
+
+    Returns
+    -------
+    array
+        An array containing the alignment matrix.
+    """
+    
+    return alignment_matrix_blocked(array, False, tile_size, threads)
+
+
+def alignment_matrix_sw_blocked(array, tile_size=TILE_SIZE, threads=None):
+    """Creates the Smith and Waterman alignment matrix on several threads.
+    See alignment_matrix_blocked.
+
+    Parameters
+    ----------
+    array : array
+        An array containing the score matrix for an alignment.
+        
+    tile_size : int
+        OPTIONAL, the number of rows and columns of a tile.
+        
+    threads : int
+        OPTIONAL, the number of threads. By default, the number of cores.
+
+    Returns
+    -------
+    array
+        An array containing the alignment matrix.
+    """
+    
+    return alignment_matrix_blocked(array, True, tile_size, threads)
+
+
+def blocked_scaling(size=4000, tile_size=TILE_SIZE, max_threads=None):
+    """Times alignment_matrix_nw_blocked from 1 to max_threads threads.
+    
+    The matrices are compared to the one of alignment_matrix_nw_numpy.
+
+    Parameters
+    ----------
+    size : int
+        OPTIONAL, the number of rows and columns of the random score matrix.
+        
+    tile_size : int
+        OPTIONAL, the number of rows and columns of a tile.
+        
+    max_threads : int
+        OPTIONAL, the largest number of threads. By default, the number of 
+        cores.
+
+    Returns
+    -------
+    list
+        A list of tuples: the number of threads, the time in seconds and the
+        speed-up against alignment_matrix_nw_numpy.
+    """
+    
+    array = np.random.default_rng(0).normal(size=(size, size))
+    
+    start = time.perf_counter()
+    expected = alignment_matrix_nw_numpy(array)
+    serial = time.perf_counter() - start
+    
+    timings = []
+    for threads in range(1, (max_threads or os.cpu_count())+1):
+        start = time.perf_counter()
+        alignment_matrix = alignment_matrix_nw_blocked(array, tile_size, 
+                                                       threads)
+        elapsed = time.perf_counter() - start
+        if not np.array_equal(alignment_matrix, expected):
+            raise AssertionError(f"Different matrix with {threads} threads.")
+        timings.append((threads, elapsed, serial / elapsed))
+    
+    return timings
+
+###############################################################################
+#                                                                             #
+#                                 Engines                                     #
+#                                                                             #
+###############################################################################
+
+# Functions filling the alignment matrix, by engine name and by algorithm.
+# "python" is the original cell by cell version, "numpy" the row version and
+# "blocked" the tile version on all the cores.
+ENGINES = {
+    "python": {"nw": alignment_matrix_nw, "sw": alignment_matrix_sw},
+    "numpy": {"nw": alignment_matrix_nw_numpy, 
+              "sw": alignment_matrix_sw_numpy},
+    "blocked": {"nw": alignment_matrix_nw_blocked, 
+                "sw": alignment_matrix_sw_blocked},
+}
+
+###############################################################################
+#                                                                             #
+#                                   Main                                      #
+#                                                                             #
+###############################################################################
+
+if __name__ == "__main__":
+    # Scaling of the blocked engine: python3 alignment_matrix.py [size] 
+    # [tile_size] [max_threads]
+    arguments = [int(argument) for argument in sys.argv[1:4]]
+    print("threads\tseconds\tspeed-up")
+    for threads, elapsed, speed_up in blocked_scaling(*arguments):
+        print(f"{threads}\t{elapsed:.3f}\t{speed_up:.2f}")
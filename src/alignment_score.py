@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 08:18:03 2026
+
+@author: Jean Delhomme
+
+This file contains three functions :
+    - alignment_score
+    - alignment_scores
+    - pair_scores
+
+Those functions give the Alignment_score written by needleman_wunsch,
+smith_waterman and glocal, without the traceback and without the result
+file. Only two rows of the alignment matrix are kept: the score of the
+global alignment is the last cell, the score of the local alignment is the
+maximum of all the rows and the score of the glocal alignment is the maximum
+of the last column.
+
+The rows are computed exactly as in alignment_matrix_nw_numpy and
+alignment_matrix_sw_numpy, so the scores are the same, bit for bit, as the
+ones of the full alignment matrix.
+
+The gap is the same on both sides, so the alignment matrix of the reversed
+pair (target, query) is the transposed matrix: the global and local scores
+are the same in both orders, and the glocal score of the reversed pair is
+the maximum of the last row. pair_scores gives both from a single fill.
+
+"""
+
+import numpy as np
+
+# Alignment matrix used by each mode.
+MATRIX = {"nw": "nw", "sw": "sw", "gl": "sw"}
+
+###############################################################################
+#                                                                             #
+#                                  Scores                                     #
+#                                                                             #
+###############################################################################
+
+def alignment_scores(dot_matrix, modes=("nw", "sw", "gl"), reverse=False):
+    """Computes the alignment scores of several modes in a single pass.
+
+    Parameters
+    ----------
+    dot_matrix : array
+        An array containing the score matrix for an alignment.
+
+    modes : tuple
+        OPTIONAL, the modes to compute: nw (global), sw (local) and/or
+        gl (glocal). By default, the three of them.
+
+    reverse : bool
+        OPTIONAL, True to also give the glocal score of the reversed pair
+        (the maximum of the last row), under the key gl_reverse. By default,
+        False.
+
+    Returns
+    -------
+    dict
+        The alignment score of each mode.
+    """
+
+    # The gap is fixed at 0.
+    gap = 0
+
+    seq2_size = dot_matrix.shape[1]
+
+    # The first row of each alignment matrix is filled with 0s.
+    rows = {matrix: np.zeros(seq2_size+1)
+            for matrix in {MATRIX[mode] for mode in modes}}
+    new_rows = {matrix: np.zeros(seq2_size+1) for matrix in rows}
+
+    # Running maximum of the Smith and Waterman matrix and of its last
+    # column.
+    best_local = 0.0
+    best_last_column = 0.0
+
+    for score_row in dot_matrix:
+
+        for matrix, row in rows.items():
+            new_row = new_rows[matrix]
+            # Diagonal and top cells, then left cells with a running maximum,
+            # as in alignment_matrix_nw_numpy.
+            new_row[0] = row[0] + gap
+            np.maximum(row[:-1] + score_row, row[1:] + gap,
+                       out=new_row[1:])
+            # In Smith and Waterman, the maximum needs to be > 0.
+            if matrix == "sw":
+                np.maximum(new_row[1:], 0, out=new_row[1:])
+            np.maximum.accumulate(new_row, out=new_row)
+
+        # The two rows are swapped instead of being allocated again.
+        rows, new_rows = new_rows, rows
+
+        if "sw" in rows:
+            best_local = max(best_local, rows["sw"].max())
+            best_last_column = max(best_last_column, rows["sw"][-1])
+
+    scores = {}
+    if reverse:
+        scores["gl_reverse"] = rows["sw"].max()
+    for mode in modes:
+        if mode == "nw":
+            scores[mode] = rows["nw"][-1]
+        elif mode == "sw":
+            scores[mode] = best_local
+        else:
+            scores[mode] = best_last_column
+
+    return scores
+
+
+def alignment_score(dot_matrix, mode="nw"):
+    """Computes the alignment score of one mode.
+
+    Parameters
+    ----------
+    dot_matrix : array
+        An array containing the score matrix for an alignment.
+
+    mode : str
+        OPTIONAL, nw (global), sw (local) or gl (glocal). By default, nw.
+
+    Returns
+    -------
+    float
+        The alignment score.
+    """
+
+    return alignment_scores(dot_matrix, (mode,))[mode]
+
+
+def pair_scores(dot_matrix, mode="nw"):
+    """Computes the alignment scores of a pair and of the reversed pair.
+
+    Parameters
+    ----------
+    dot_matrix : array
+        An array containing the score matrix for an alignment.
+
+    mode : str
+        OPTIONAL, nw (global), sw (local) or gl (glocal). By default, nw.
+
+    Returns
+    -------
+    tuple
+        The alignment score of the pair (query, target) and the one of the
+        pair (target, query).
+    """
+
+    if mode != "gl":
+        score = alignment_score(dot_matrix, mode)
+        return score, score
+
+    scores = alignment_scores(dot_matrix, ("gl",), True)
+
+    return scores["gl"], scores["gl_reverse"]
@@ -0,0 +1,474 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 08:39:31 2026
+
+@author: Jean Delhomme
+
+Alignment server for the embedding_project.
+
+Each call of main.py starts Python, imports numpy and reads both proteins
+before aligning them. The server is started once and aligns the proteins
+sent by its clients (see alignment_client) as long as it runs :
+    - the requests are read with asyncio, on a Unix socket or on the
+      standard input, and are aligned on a pool of processes.
+    - each process keeps the last proteins it read in memory (LRU cache of
+      batch.load_protein, --cache-size proteins), so a protein aligned
+      several times is only read once by each process.
+    - each process keeps the last matrices and alignments it computed (see
+      matrix_cache, --matrix-memory bytes), so a pair aligned again, or in
+      another mode, is not computed again.
+    - the responses are written as soon as each alignment is done, so they
+      are not in the order of the requests: the id of a request is given
+      back with its response.
+
+Protocol
+--------
+One JSON object per line, in both directions. A request :
+
+    {"id": 1, "embedding1": "a.t5emb", "fasta1": "a.fasta",
+     "embedding2": "b.t5emb", "fasta2": "b.fasta", "mode": "sw",
+     "engine": "numpy", "score_only": false, "options": {}}
+
+    - embedding1, embedding2: an embedding file, or a list of the name of a
+      database and the name of a protein (see embedding_database).
+    - fasta1, fasta2: OPTIONAL, a fasta file, or a list of the name of a
+      multi-fasta file and the name of a record (see fasta_index). By
+      default, looked for in --fasta-dir (or in the index of the database).
+    - mode, engine: OPTIONAL, as in batch.py. By default, nw and numpy.
+      mode can be a list of modes, the alignments are then given for each
+      mode.
+    - score_only: OPTIONAL, only the alignment score.
+    - options: OPTIONAL, the settings of the engine (see batch.align).
+    - command: OPTIONAL, align (by default), ping or shutdown.
+
+The response gives the id, the names of the proteins (query and target), the
+mode and either the alignments (a list of [score, aligned sequence 1,
+aligned sequence 2, cells of the path], see alignment_algorithm, or a
+dictionary of these lists for a list of modes) or
+the score (or a dictionary of scores). If the request failed, it only gives the
+id and the error.
+
+Usage
+-----
+python3 alignment_server.py [--socket PATH | --stdio] [--workers N]
+                            [--cache-size N] [--matrix-memory BYTES]
+                            [--fasta-dir DIR]
+
+"""
+
+# Importation of common modules.
+import argparse
+import asyncio
+import concurrent.futures
+import functools
+import json
+import os
+import sys
+import stat
+import tempfile
+
+# Importation of the modules used for the alignment.
+import alignment_matrix as am
+import alignment_score as asc
+import batch as ba
+import embedding_database as ed
+import embedding_precision as ep
+import matrix_cache as mc
+
+# Default socket of the server.
+SOCKET = os.path.join(tempfile.gettempdir(), "embedding_project.sock")
+
+# Default number of proteins kept in memory by each process.
+CACHE_SIZE = 256
+
+# Directory of the fasta files of a process, set by start_worker.
+FASTA_DIR = "../data/fasta/"
+
+###############################################################################
+#                                                                             #
+#                                 workers                                     #
+#                                                                             #
+###############################################################################
+
+def start_worker(cache_size, matrix_memory, fasta_dir):
+    """Prepares a process of the pool.
+
+    batch.load_protein keeps every protein it read, which is fine for a
+    batch but not for a server running for days: it is replaced by a cache
+    of the cache_size proteins used last.
+
+    Parameters
+    ----------
+    cache_size : int
+        The number of proteins kept in memory.
+
+    matrix_memory : int
+        The size of the cache of the matrices and alignments, in bytes.
+
+    fasta_dir : str
+        The directory containing the fasta files, or a multi-fasta file.
+    """
+
+    global FASTA_DIR
+
+    ba.load_protein = functools.lru_cache(maxsize=cache_size)(
+        ba.load_protein.__wrapped__)
+    mc.CACHE = mc.MatrixCache(matrix_memory)
+    FASTA_DIR = fasta_dir
+
+
+def request_protein(request, number):
+    """Gives a protein of a request, as in batch.read_protein_set.
+
+    Parameters
+    ----------
+    request : dict
+        The request.
+
+    number : int
+        1 for the first protein, 2 for the second one.
+
+    Returns
+    -------
+    tuple
+        The embedding file (or the name of a database and the name of a
+        protein) and the fasta file.
+    """
+
+    embedding_file = request[f"embedding{number}"]
+    fasta_file = request.get(f"fasta{number}")
+
+    # A record of a multi-fasta file.
+    if isinstance(fasta_file, list):
+        fasta_file = tuple(fasta_file)
+
+    # A protein of a database.
+    if isinstance(embedding_file, list):
+        embedding_file = tuple(embedding_file)
+        # The index of a database is read once by each process.
+        if fasta_file is None:
+            fasta_file = ed.open_database(embedding_file[0])[1][
+                embedding_file[1]][2]
+        if fasta_file is None:
+            fasta_file = ba.find_fasta(embedding_file[1], FASTA_DIR)
+
+    elif fasta_file is None:
+        fasta_file = ba.find_fasta(embedding_file, FASTA_DIR)
+
+    return embedding_file, fasta_file
+
+
+def run_request(request):
+    """Aligns the two proteins of a request in a process of the pool.
+
+    Parameters
+    ----------
+    request : dict
+        The request.
+
+    Returns
+    -------
+    dict
+        The response, without the id.
+    """
+
+    mode = request.get("mode", "nw")
+    engine = request.get("engine", "numpy")
+    options = request.get("options") or {}
+    precision = options.get("precision") or "float64"
+
+    # A list of modes gives a result for each mode.
+    modes = mode if isinstance(mode, list) else [mode]
+    for name in modes:
+        if name not in ("nw", "sw", "gl"):
+            raise ValueError(f"Unknown mode {name}.")
+    if engine not in ba.ENGINE_NAMES:
+        raise ValueError(f"Unknown engine {engine}.")
+
+    query = request_protein(request, 1)
+    target = request_protein(request, 2)
+    embedding1, fasta1, prot_name1 = ba.load_protein(*query, precision)
+    embedding2, fasta2, prot_name2 = ba.load_protein(*target, precision)
+
+    if request.get("score_only"):
+        # The scores of the modes are computed in a single pass.
+        if engine in am.ENGINES:
+            results = asc.alignment_scores(
+                ep.dot_matrix(embedding1, embedding2), modes)
+        else:
+            results = {name: ba.score_chunk([(query, target)], name, engine,
+                                            options)[0][2]
+                       for name in modes}
+        results = {name: float(score) for name, score in results.items()}
+        key = "score"
+
+    else:
+        # The matrix engines share their matrices between the modes and
+        # the requests.
+        if engine in am.ENGINES and not options.get("top_k"):
+            results = mc.align_modes(embedding1, embedding2, fasta1, fasta2,
+                                     modes, engine)
+        else:
+            results = {name: ba.align(embedding1, embedding2, fasta1,
+                                      fasta2, name, engine, options)
+                       for name in modes}
+        results = {name: [[float(score), result1, result2,
+                           [[int(i), int(j)] for i, j in cells]]
+                          for score, result1, result2, cells in alignments]
+                   for name, alignments in results.items()}
+        key = "alignments"
+
+    return {"query": prot_name1, "target": prot_name2, "mode": mode,
+            key: results if isinstance(mode, list) else results[mode]}
+
+###############################################################################
+#                                                                             #
+#                                  server                                     #
+#                                                                             #
+###############################################################################
+
+async def answer(line, executor, send, stop):
+    """Answers one request.
+
+    Parameters
+    ----------
+    line : bytes
+        The request, a line of JSON.
+
+    executor : Executor
+        The pool of processes.
+
+    send : coroutine function
+        Writes a response.
+
+    stop : asyncio.Event
+        Set to stop the server.
+    """
+
+    try:
+        request = json.loads(line)
+        if not isinstance(request, dict):
+            raise ValueError("A request is a JSON object.")
+    except ValueError as error:
+        await send({"id": None, "error": f"Invalid request: {error}"})
+        return
+
+    response = {"id": request.get("id")}
+    command = request.get("command", "align")
+
+    if command == "align":
+        try:
+            response.update(await asyncio.get_running_loop().run_in_executor(
+                executor, run_request, request))
+        except Exception as error:
+            response["error"] = f"{type(error).__name__}: {error}"
+    elif command == "ping":
+        response["status"] = "ok"
+    elif command == "shutdown":
+        response["status"] = "stopping"
+        stop.set()
+    else:
+        response["error"] = f"Unknown command {command}."
+
+    await send(response)
+
+
+async def serve_lines(read_line, send, executor, stop):
+    """Reads requests until the end of a stream, and answers them.
+
+    Each request is answered in its own task, so a long alignment does not
+    hold the next requests back. When the server stops, the requests already
+    read are still answered.
+
+    Parameters
+    ----------
+    read_line : coroutine function
+        Reads a line, empty at the end of the stream.
+
+    send : coroutine function
+        Writes a response.
+
+    executor : Executor
+        The pool of processes.
+
+    stop : asyncio.Event
+        Set to stop the server.
+    """
+
+    tasks = set()
+    stopping = asyncio.create_task(stop.wait())
+
+    while True:
+        # Waits for a line or for the server to stop.
+        reading = asyncio.ensure_future(read_line())
+        await asyncio.wait({reading, stopping},
+                           return_when=asyncio.FIRST_COMPLETED)
+        if not reading.done():
+            reading.cancel()
+            break
+
+        line = reading.result()
+        if not line:
+            break
+        if not line.strip():
+            continue
+        task = asyncio.create_task(answer(line, executor, send, stop))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    stopping.cancel()
+    if tasks:
+        await asyncio.gather(*tasks)
+
+
+async def serve_socket(path, executor):
+    """Serves the clients of a Unix socket until a shutdown request.
+
+    Parameters
+    ----------
+    path : str
+        The path of the socket.
+
+    executor : Executor
+        The pool of processes.
+    """
+
+    stop = asyncio.Event()
+    connections = set()
+
+    async def client(reader, writer):
+        connections.add(asyncio.current_task())
+
+        # Before Python 3.12, two tasks cannot wait for drain at once.
+        lock = asyncio.Lock()
+
+        async def send(response):
+            async with lock:
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+
+        try:
+            await serve_lines(reader.readline, send, executor, stop)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+            connections.discard(asyncio.current_task())
+
+    # A socket left by a server that was killed.
+    if os.path.exists(path):
+        os.remove(path)
+
+    server = await asyncio.start_unix_server(client, path=path)
+    print(f"Listening on {path}", file=sys.stderr)
+
+    try:
+        async with server:
+            await stop.wait()
+            # The clients connected get the responses of their requests.
+            if connections:
+                await asyncio.gather(*connections)
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+async def serve_stdio(executor):
+    """Serves the requests of the standard input until its end.
+
+    The responses are written on the standard output.
+
+    Parameters
+    ----------
+    executor : Executor
+        The pool of processes.
+    """
+
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+    reader = asyncio.StreamReader()
+
+    # asyncio cannot watch a file: a file given as standard input is read at
+    # once (it cannot block), a pipe or a terminal is watched.
+    if stat.S_ISREG(os.fstat(sys.stdin.fileno()).st_mode):
+        reader.feed_data(sys.stdin.buffer.read())
+        reader.feed_eof()
+    else:
+        await loop.connect_read_pipe(
+            lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+
+    async def send(response):
+        sys.stdout.write(json.dumps(response) + "\n")
+        sys.stdout.flush()
+
+    await serve_lines(reader.readline, send, executor, stop)
+
+
+def run_server(path=SOCKET, stdio=False, workers=None, cache_size=CACHE_SIZE,
+               matrix_memory=mc.MAX_BYTES, fasta_dir=FASTA_DIR):
+    """Runs the server until a shutdown request or the end of the input.
+
+    Parameters
+    ----------
+    path : str
+        OPTIONAL, the path of the Unix socket.
+
+    stdio : bool
+        OPTIONAL, True to read the requests on the standard input instead of
+        a socket. By default, False.
+
+    workers : int
+        OPTIONAL, the number of processes. By default, the number of CPUs.
+
+    cache_size : int
+        OPTIONAL, the number of proteins kept in memory by each process. By
+        default, 256.
+
+    matrix_memory : int
+        OPTIONAL, the size of the cache of the matrices and alignments of
+        each process, in bytes. By default, 512 MiB.
+
+    fasta_dir : str
+        OPTIONAL, the directory containing the fasta files of the requests
+        without fasta file.
+    """
+
+    with concurrent.futures.ProcessPoolExecutor(
+            workers or os.cpu_count(), initializer=start_worker,
+            initargs=(cache_size, matrix_memory, fasta_dir)) as executor:
+        if stdio:
+            asyncio.run(serve_stdio(executor))
+        else:
+            asyncio.run(serve_socket(path, executor))
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(
+        description="Aligns the proteins sent by clients, without starting "
+                    "a new process for each alignment.")
+    parser.add_argument("--socket", default=SOCKET,
+                        help=f"path of the Unix socket, by default {SOCKET}")
+    parser.add_argument("--stdio", action="store_true",
+                        help="read the requests on the standard input and "
+                             "write the responses on the standard output")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="number of processes, by default the number of "
+                             "CPUs")
+    parser.add_argument("--cache-size", type=int, default=CACHE_SIZE,
+                        help="number of proteins kept in memory by each "
+                             "process")
+    parser.add_argument("--matrix-memory", type=int, default=mc.MAX_BYTES,
+                        help="bytes of matrices and alignments kept in "
+                             "memory by each process")
+    parser.add_argument("--fasta-dir", default=FASTA_DIR,
+                        help="directory containing the fasta files, or a "
+                             "multi-fasta file")
+    arguments = parser.parse_args()
+
+    try:
+        run_server(arguments.socket, arguments.stdio, arguments.workers,
+                   arguments.cache_size, arguments.matrix_memory,
+                   arguments.fasta_dir)
+    except KeyboardInterrupt:
+        pass
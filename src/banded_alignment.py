@@ -0,0 +1,370 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 08:21:57 2026
+
+@author: Jean Delhomme
+
+This file contains three functions :
+    - banded_matrix_nw
+    - needleman_wunsch_banded
+    - banded_alignment
+
+Those functions perform a global alignment in a band around the diagonal of
+the alignment matrix, for closely related proteins of similar sizes. Only
+the dot products and the cells of the band are computed.
+
+The band of row i is centred on the column i * seq2_size / seq1_size, so
+that it goes from the top-left corner to the bottom-right corner even if the
+sizes differ, and spreads on width columns on each side. It is stored in an
+array of (seq1_size+1) rows and 2*width+1 columns: the cell (i, j) of the
+alignment matrix is band[i][j - first_columns[i]].
+
+When the band is wide enough to contain the whole matrix, the alignment is
+the one of needleman_wunsch. Otherwise, if the path touches the edge of the
+band, a better path may exist outside of it: banded_alignment reports it so
+that the alignment can be done again with a wider band.
+
+"""
+
+import math
+import warnings
+
+import numpy as np
+
+# Number of rows of dot products computed at once.
+BLOCK_SIZE = 64
+
+###############################################################################
+#                                                                             #
+#                                   Band                                      #
+#                                                                             #
+###############################################################################
+
+def band_width(seq1_size, seq2_size):
+    """Chooses a band width from the sizes of the sequences.
+
+    The band spreads on 10 % of the longest sequence on each side (at least
+    16 columns), and is always wide enough for the band of a row to touch the
+    band of the previous row.
+
+    Parameters
+    ----------
+    seq1_size : int
+        The size of the first sequence.
+
+    seq2_size : int
+        The size of the second sequence.
+
+    Returns
+    -------
+    int
+        The number of columns on each side of the centre of the band.
+    """
+
+    width = max(16, math.ceil(0.1 * max(seq1_size, seq2_size)))
+
+    return max(width, smallest_width(seq1_size, seq2_size))
+
+
+def smallest_width(seq1_size, seq2_size):
+    """Gives the smallest band width joining the bands of two rows.
+
+    The centre of the band moves by up to ceil(seq2_size / seq1_size)
+    columns from a row to the next one: a narrower band leaves cells out of
+    every path, and the alignment cannot reach the bottom-right corner.
+
+    Parameters
+    ----------
+    seq1_size : int
+        The size of the first sequence.
+
+    seq2_size : int
+        The size of the second sequence.
+
+    Returns
+    -------
+    int
+        The smallest number of columns on each side of the centre.
+    """
+
+    return math.ceil(seq2_size / max(seq1_size, 1)) + 1
+
+
+def band_limits(seq1_size, seq2_size, width):
+    """Gives the first and last column of the band on each row.
+
+    Parameters
+    ----------
+    seq1_size : int
+        The size of the first sequence.
+
+    seq2_size : int
+        The size of the second sequence.
+
+    width : int
+        The number of columns on each side of the centre of the band.
+
+    Returns
+    -------
+    tuple
+        Two arrays of seq1_size+1 integers: the first and the last column of
+        the band on each row.
+    """
+
+    centres = np.rint(np.arange(seq1_size+1) * seq2_size
+                      / max(seq1_size, 1)).astype(np.intp)
+    first_columns = np.clip(centres - width, 0, seq2_size)
+    last_columns = np.clip(centres + width, 0, seq2_size)
+
+    return first_columns, last_columns
+
+###############################################################################
+#                                                                             #
+#                                Band matrix                                  #
+#                                                                             #
+###############################################################################
+
+def banded_matrix_nw(embedding1, embedding2, width=None,
+                     block_size=BLOCK_SIZE):
+    """Creates the band of the Needleman and Wunsch alignment matrix.
+
+    The dot products are computed by blocks of rows, only for the columns of
+    the band of these rows. The recurrence is the one of
+    alignment_matrix_nw_numpy, restricted to the band: the cells outside of
+    the band are -inf.
+
+    Parameters
+    ----------
+    embedding1 : array
+        The embedding array of the first protein (rows).
+
+    embedding2 : array
+        The embedding array of the second protein (columns).
+
+    width : int
+        OPTIONAL, the number of columns on each side of the centre of the
+        band, at least 1. A band too narrow to join its rows is widened to
+        smallest_width, with a warning. By default, chosen by band_width.
+
+    block_size : int
+        OPTIONAL, the number of rows of dot products computed at once.
+
+    Returns
+    -------
+    tuple
+        The band (array of seq1_size+1 rows and 2*width+1 columns) and the
+        first column of the band on each row (array).
+    """
+
+    # The gap is fixed at 0.
+    gap = 0
+
+    seq1_size = embedding1.shape[0]
+    seq2_size = embedding2.shape[0]
+
+    if width is None:
+        width = band_width(seq1_size, seq2_size)
+    elif width < 1:
+        raise ValueError(f"The band width must be at least 1, not {width}.")
+    elif width < smallest_width(seq1_size, seq2_size):
+        warnings.warn(f"A band of width {width} cannot join its rows for "
+                      f"sequences of sizes {seq1_size} and {seq2_size}, it "
+                      f"is widened to "
+                      f"{smallest_width(seq1_size, seq2_size)}.")
+        width = smallest_width(seq1_size, seq2_size)
+
+    first_columns, last_columns = band_limits(seq1_size, seq2_size, width)
+
+    # The cells outside of the band are -inf.
+    band = np.full((seq1_size+1, 2*width+1), -np.inf)
+    offsets = np.arange(2*width+1)
+
+    # The first row and the first column of the alignment matrix.
+    band[0, :last_columns[0]+1] = np.arange(last_columns[0]+1) * gap
+
+    for start in range(1, seq1_size+1, block_size):
+        stop = min(start+block_size, seq1_size+1)
+
+        # Dot products of the block of rows with the columns of their band
+        # (column j of the alignment matrix uses residue j-1).
+        block_first = max(first_columns[start]-1, 0)
+        block_last = last_columns[stop-1]
+        scores = np.dot(embedding1[start-1:stop-1],
+                        embedding2[block_first:block_last].T)
+
+        for i in range(start, stop):
+
+            first = first_columns[i]
+            last = last_columns[i]
+            previous_first = first_columns[i-1]
+            previous_last = last_columns[i-1]
+            previous_row = band[i-1]
+            row = band[i]
+
+            # Columns of the band of this row.
+            columns = first + offsets[:last-first+1]
+
+            # Diagonal cells: (i-1, j-1) must be in the band of the previous
+            # row, and j must be > 0.
+            diagonal = np.full(len(columns), -np.inf)
+            inside = (columns-1 >= previous_first) \
+                & (columns-1 <= previous_last) & (columns >= 1)
+            diagonal[inside] = previous_row[columns[inside]-1-previous_first] \
+                + scores[i-start, columns[inside]-1-block_first]
+
+            # Top cells: (i-1, j) must be in the band of the previous row.
+            top = np.full(len(columns), -np.inf)
+            inside = (columns >= previous_first) & (columns <= previous_last)
+            top[inside] = previous_row[columns[inside]-previous_first] + gap
+
+            np.maximum(diagonal, top, out=row[:len(columns)])
+
+            # The first column of the alignment matrix.
+            if first == 0:
+                row[0] = i * gap
+
+            # Left cells, with a running maximum along the row.
+            np.maximum.accumulate(row[:len(columns)],
+                                  out=row[:len(columns)])
+
+    return band, first_columns
+
+###############################################################################
+#                                                                             #
+#                                 Traceback                                   #
+#                                                                             #
+###############################################################################
+
+def needleman_wunsch_banded(fasta1, fasta2, band, first_columns):
+    """Finds the global alignment in a band.
+
+    The traceback is the one of needleman_wunsch_alignment, reading the cells
+    in the band (the cells outside of the band are -inf).
+
+    Parameters
+    ----------
+    fasta1 : list of string
+        A list of string containing the first fasta sequence.
+
+    fasta2 : list of string
+        A list of string containing the second fasta sequence.
+
+    band : array
+        The band of the alignment matrix, as given by banded_matrix_nw.
+
+    first_columns : array
+        The first column of the band on each row.
+
+    Returns
+    -------
+    tuple
+        The alignment score, the two aligned sequences (str), the cells of
+        the path (see alignment_algorithm) and True if the path touched the
+        edge of the band.
+    """
+
+    seq1_size = band.shape[0]-1
+    seq2_size = len(fasta2)
+    band_size = band.shape[1]
+
+    def cell(i, j):
+        # Value of the cell (i, j) of the alignment matrix.
+        k = j - first_columns[i]
+        if 0 <= k < band_size:
+            return band[i][k]
+        return -np.inf
+
+    # Last column of the band on each row.
+    width = (band_size-1) // 2
+    last_columns = band_limits(seq1_size, seq2_size, width)[1]
+
+    def on_edge(i, j):
+        # True if the cell (i, j) is on the edge of the band, but not on the
+        # edge of the alignment matrix.
+        return (j == first_columns[i] and j > 0) \
+            or (j == last_columns[i] and j < seq2_size)
+
+    # result1 and result2 will contain the aligned sequences.
+    result1 = []
+    result2 = []
+    touched = False
+
+    i = seq1_size
+    j = seq2_size
+    alignment_score = cell(i, j)
+
+    while i > 0 and j > 0:
+
+        touched = touched or on_edge(i, j)
+
+        score_diagonal = cell(i-1, j-1)
+        score_left = cell(i, j-1)
+        score_top = cell(i-1, j)
+        max_score = max(score_diagonal, score_left, score_top)
+
+        # Same choices as needleman_wunsch_alignment.
+        if max_score == score_diagonal:
+            result1.append(fasta1[i-1])
+            result2.append(fasta2[j-1])
+            i -= 1
+            j -= 1
+        elif max_score == score_top:
+            result1.append(fasta1[i-1])
+            result2.append('-')
+            i -= 1
+        else:
+            result1.append('-')
+            result2.append(fasta2[j-1])
+            j -= 1
+
+    # The rest of the sequences is completed as in needleman_wunsch_alignment.
+    while j > 0:
+        result1.append(fasta1[i-1])
+        result2.append('-')
+        j -= 1
+    while i > 0:
+        result1.append('-')
+        result2.append(fasta2[j-1])
+        i -= 1
+
+    return (alignment_score, "".join(result1[::-1]), "".join(result2[::-1]),
+            ((i, j), (seq1_size, seq2_size)), touched)
+
+
+def banded_alignment(embedding1, embedding2, fasta1, fasta2, width=None,
+                     block_size=BLOCK_SIZE):
+    """Performs a global alignment in a band.
+
+    Parameters
+    ----------
+    embedding1 : array
+        The embedding array of the first protein.
+
+    embedding2 : array
+        The embedding array of the second protein.
+
+    fasta1 : list of string
+        A list of string containing the first fasta sequence.
+
+    fasta2 : list of string
+        A list of string containing the second fasta sequence.
+
+    width : int
+        OPTIONAL, the number of columns on each side of the centre of the
+        band. By default, chosen by band_width.
+
+    block_size : int
+        OPTIONAL, the number of rows of dot products computed at once.
+
+    Returns
+    -------
+    tuple
+        The alignment score, the two aligned sequences (str), the cells of
+        the path and True if the path touched the edge of the band (the
+        alignment should then be done again with a wider band).
+    """
+
+    band, first_columns = banded_matrix_nw(embedding1, embedding2, width,
+                                           block_size)
+
+    return needleman_wunsch_banded(fasta1, fasta2, band, first_columns)
@@ -0,0 +1,1224 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 08:15:16 2026
+
+@author: Jean Delhomme
+
+Batch program for the embedding_project.
+
+This program aligns a set of query proteins against a set of target proteins
+(one-vs-database), or every protein of a set against every other protein of
+the same set (all-vs-all). The pairs are spread over a pool of processes and
+the alignments are written in a single tab separated file, as soon as they
+are done.
+
+A protein set is either :
+    - a directory containing .t5emb files. The matching fasta file of each
+      embedding file is looked for in the fasta directory (--fasta-dir),
+      ignoring the case of the names. --fasta-dir can also be a multi-fasta
+      file: the sequence of each protein is then the record with the name
+      of its embedding file (see fasta_index).
+    - a single .t5emb file.
+    - an embedding database (.t5db, see embedding_database). The fasta file
+      of a protein is the one of the index, or else it is looked for in the
+      fasta directory.
+    - a manifest: a text file with, on each line, the path of an embedding
+      file and the path of its fasta file separated by spaces, and
+      optionally the name of its record in a multi-fasta file. Relative
+      paths are relative to the manifest. Empty lines and lines beginning
+      with "#" are ignored.
+
+Usage
+-----
+python3 batch.py QUERY [TARGET] [--mode nw|sw|gl]
+                 [--engine numpy|python|blocked|linear|directions|banded|
+                          tiled|batched|seed]
+                 [--band-width N] [--tile-size N] [--tile-memory BYTES]
+                 [--batch-size N] [--precision float64|float32|float16|int8]
+                 [--top-k K] [--min-score S]
+                 [--prefilter K] [--pooling mean|max|meanmax]
+                 [--clusters N] [--probes P] [--prefilter-index FILE]
+                 [--workers N] [--chunksize N] [--prefetch N]
+                 [--fasta-dir DIR] [--score-only] [--output FILE]
+                 [--format tsv|jsonl|text|npz]
+                 [--symmetric] [--matrix FILE.npy|FILE.npz]
+                 [--store DIR]
+                 [--profile FILE] [--profile-hook cprofile|sample]
+
+Without TARGET, the query set is aligned against itself (all-vs-all).
+With --symmetric, each unordered pair of the all-vs-all is aligned once (the
+upper triangle, see score_matrix), as the global and local scores do not
+depend on the order of the pair, and the glocal score of the reversed pair
+is given by the same alignment matrix (--score-only). The pairs are then cut
+in chunks of about --chunksize pairs of the mean length, by the product of
+their lengths, the longest proteins first. --matrix writes the scores of an
+all-vs-all (--score-only) in a dense (.npy) or sparse (.npz) score matrix.
+With --store DIR (--score-only), the scores are kept in a score store,
+found by the contents of the proteins (see score_store): the pairs already
+in the store are not aligned again, their scores are written directly, and
+the new scores are added to the store by checkpoints. An interrupted batch
+run again with the same store starts where it stopped.
+With --prefilter K, each query is only aligned against the K targets whose
+mean (or max) residue vectors are the most similar (see prefilter_index).
+With --score-only, only the alignment scores are computed (no traceback),
+keeping two rows of the alignment matrix. With the tiled engine, the whole
+dot matrix is not computed either. The batched engine (--score-only only)
+aligns the targets of a query together, by batches of similar lengths: it is
+much faster for short proteins. The pairs of a query are grouped within a
+chunk, so a large --chunksize (for instance 256) gives larger batches.
+With --top-k K (sw and gl), at most K alignments that never align the same
+pair of residues twice are written for each pair, the best first, instead of
+one alignment for each tied maximum (see topk_alignment). --min-score skips
+the alignments with a lower score.
+Each worker reads the proteins of its next --prefetch pairs (by default 4)
+on a thread while it aligns a pair, and the results are written by a writer
+thread while the workers align the next pairs (see prefetch_pipeline).
+With --profile FILE (or EMBEDDING_PROFILE=FILE), the time of each stage, the
+counters and the memory of the main process and of the workers are written
+in a JSON report (see profiling).
+
+Returns
+-------
+file.tsv
+    A tab separated file with one line for each alignment: query, target,
+    mode, rank (for tied maximums), score and the two aligned sequences.
+    With --score-only: query, target, mode and score for each pair.
+    With --format (or the extension of --output), a JSON lines file, the
+    text of main.py, or a columnar npz file of the scores, coordinates and
+    paths (see result_writer).
+
+"""
+
+# Importation of common modules.
+import argparse
+import concurrent.futures
+import contextlib
+import functools
+import itertools
+import os
+import warnings
+
+# Importation of the modules used for reading the data files.
+import embedding_reader as er
+import embedding_database as ed
+import embedding_precision as ep
+import fasta_reader as fr
+import fasta_index as fi
+
+# Importation of the modules used for the alignment.
+import alignment_matrix as am
+import alignment_algorithm as aa
+import alignment_score as asc
+import linear_alignment as la
+import banded_alignment as bd
+import tiled_alignment as ti
+import batched_alignment as bt
+import prefilter_index as pf
+import seed_alignment as sa
+import topk_alignment as tk
+
+# Importation of the output, of the prefetching and of the instrumentation.
+import result_writer as rw
+import score_matrix as sm
+import score_store as ss
+import prefetch_pipeline as pp
+import profiling as pr
+
+# Names of all the engines: the engines of alignment_matrix, the linear 
+# memory alignments, the direction matrices, the band alignments, the
+# tiled fill, the batches of targets (scores only) and the seed and extend
+# heuristic.
+ENGINE_NAMES = list(am.ENGINES) + ["linear", "directions", "banded", 
+                                  "tiled", "batched", "seed"]
+
+# Number of stored scores written at once.
+STORED_BLOCK = 1024
+
+###############################################################################
+#                                                                             #
+#                               protein sets                                  #
+#                                                                             #
+###############################################################################
+
+@functools.lru_cache(maxsize=None)
+def fasta_names(fasta_dir, modified):
+    """Gives the fasta files of a directory by their name in lower case.
+
+    The result is kept, so a directory is only listed once per process, and
+    again when it is modified.
+
+    Parameters
+    ----------
+    fasta_dir : str
+        The directory containing the fasta files.
+
+    modified : int
+        The time of the last modification of the directory, in nanoseconds.
+
+    Returns
+    -------
+    dict
+        The name of the fasta file of each lower case name without its
+        extension.
+    """
+
+    names = {}
+
+    for name in os.listdir(fasta_dir):
+        if name.endswith(".fasta"):
+            names.setdefault(os.path.splitext(name)[0].lower(), name)
+
+    return names
+
+
+def find_fasta(embedding_file, fasta_dir):
+    """Finds the fasta file matching an embedding file.
+
+    The names are compared without their extension and ignoring the case, as
+    in 6PF2K_1bif.t5emb and 6PF2K_1BIF.fasta.
+
+    Parameters
+    ----------
+    embedding_file : str
+        The name of an embedding file.
+
+    fasta_dir : str
+        The directory containing the fasta files, or a multi-fasta file.
+
+    Returns
+    -------
+    str or tuple
+        The name of the fasta file, or the name of the multi-fasta file and
+        the name of the record of the protein.
+    """
+
+    stem = os.path.splitext(os.path.basename(embedding_file))[0]
+
+    # The record with the same name in a multi-fasta file.
+    if os.path.isfile(fasta_dir):
+        return fasta_dir, fi.find_record(fasta_dir, stem)
+
+    name = fasta_names(fasta_dir,
+                       os.stat(fasta_dir).st_mtime_ns).get(stem.lower())
+
+    if name is None:
+        raise FileNotFoundError(f"No fasta file for {embedding_file} in "
+                                f"{fasta_dir}")
+
+    return os.path.join(fasta_dir, name)
+
+
+def read_protein_set(path, fasta_dir):
+    """Lists the proteins of a directory, a .t5emb file, a database or a
+    manifest.
+
+    Parameters
+    ----------
+    path : str
+        A directory of .t5emb files, a .t5emb file, a .t5db database or a
+        manifest.
+
+    fasta_dir : str
+        The directory containing the fasta files (or a multi-fasta file),
+        for directories, single .t5emb files and proteins of a database
+        without fasta file.
+
+    Returns
+    -------
+    list
+        A list of tuples, the embedding file and the fasta file of each
+        protein. For a database, the embedding file is replaced by a tuple:
+        the name of the database and the name of the protein. For a record
+        of a multi-fasta file, the fasta file is replaced by a tuple: the
+        name of the file and the name of the record.
+    """
+
+    # A directory of embedding files.
+    if os.path.isdir(path):
+        return [(os.path.join(path, name),
+                 find_fasta(name, fasta_dir))
+                for name in sorted(os.listdir(path))
+                if name.endswith(".t5emb")]
+
+    # An embedding database: the embedding of a protein is given by the name
+    # of the database and the name of the protein.
+    if path.endswith(ed.DATABASE_EXTENSION):
+        return [((path, name), fasta or find_fasta(name, fasta_dir))
+                for name, (_, _, fasta) in ed.read_index(path)[2].items()]
+
+    # A single embedding file.
+    if path.endswith(".t5emb"):
+        return [(path, find_fasta(path, fasta_dir))]
+
+    # A manifest.
+    proteins = []
+    directory = os.path.dirname(path)
+    with open(path, "r") as manifest:
+        for line in manifest:
+            if line.strip() and not line.startswith("#"):
+                embedding_file, fasta_file, *record = line.split()[:3]
+                fasta_file = os.path.join(directory, fasta_file)
+                # A record of a multi-fasta file.
+                if record:
+                    fasta_file = (fasta_file, record[0])
+                proteins.append((os.path.join(directory, embedding_file),
+                                 fasta_file))
+
+    return proteins
+
+
+def fasta_summary(fasta_file):
+    """Reads the name and the length of a protein from its fasta file.
+
+    Parameters
+    ----------
+    fasta_file : str or tuple
+        The name of a fasta file, or the name of a multi-fasta file and the
+        name of a record of this file.
+
+    Returns
+    -------
+    tuple
+        The name of the protein (as given by load_protein) and its number of
+        residues.
+    """
+
+    if isinstance(fasta_file, tuple):
+        return fasta_file[1], len(fi.fetch_sequence(*fasta_file))
+
+    return fr.fasta_name(fasta_file), len(fr.fasta_reader(fasta_file))
+
+
+def make_pairs(queries, targets=None):
+    """Generates the pairs of proteins to align.
+
+    Parameters
+    ----------
+    queries : list
+        The query proteins, as given by read_protein_set.
+
+    targets : list
+        OPTIONAL, the target proteins. By default, the queries are aligned
+        against themselves (all-vs-all).
+
+    Returns
+    -------
+    generator
+        The (query, target) pairs, grouped by query.
+    """
+
+    if targets is None:
+        targets = queries
+
+    return itertools.product(queries, targets)
+
+
+def prefilter_pairs(queries, targets=None, k=10, pooling="mean", clusters=0,
+                    probes=None, index_file=None, precision="float64"):
+    """Generates the pairs of each query with its K most similar targets.
+
+    The targets are compared to the query with the prefilter index (see
+    prefilter_index), only the K best ones are aligned.
+
+    Parameters
+    ----------
+    queries : list
+        The query proteins, as given by read_protein_set.
+
+    targets : list
+        OPTIONAL, the target proteins. By default, the queries.
+
+    k : int
+        OPTIONAL, the number of targets kept for each query. By default, 10.
+
+    pooling : str
+        OPTIONAL, mean, max or meanmax. By default, mean.
+
+    clusters : int
+        OPTIONAL, the number of clusters of the index, 0 for an exact
+        search. By default, 0.
+
+    probes : int
+        OPTIONAL, the number of clusters searched. By default, all.
+
+    index_file : str
+        OPTIONAL, a .npz file keeping the index of the targets. It is built
+        if it does not exist or does not match the targets and the pooling.
+
+    precision : str
+        OPTIONAL, the type of the binary copies of the embeddings (see
+        load_protein). By default, float64.
+
+    Returns
+    -------
+    generator
+        The (query, target) pairs, grouped by query, from the most similar
+        target.
+    """
+
+    if targets is None:
+        targets = queries
+
+    names = [str(embedding_file) for embedding_file, _ in targets]
+
+    index = None
+    if index_file is not None and os.path.exists(index_file):
+        index = pf.load_index(index_file)
+        if list(index["names"]) != names or index["pooling"] != pooling \
+                or len(index["centroids"]) != min(clusters, len(names)):
+            index = None
+
+    if index is None:
+        index = pf.build_index(
+            (ep.as_float(load_protein(*target, precision)[0])
+             for target in targets), names, pooling, clusters)
+        if index_file is not None:
+            pf.save_index(index, index_file)
+
+    for query in queries:
+        vector = pf.summary_vector(
+            ep.as_float(load_protein(*query, precision)[0]), pooling)
+        for position in pf.search(index, vector, k, probes)[0]:
+            yield query, targets[position]
+
+
+def new_pairs(pairs, store, names, output, reverse=False):
+    """Gives the pairs missing from a score store.
+
+    The scores of the pairs already in the store are given to output, by
+    blocks of STORED_BLOCK scores.
+
+    Parameters
+    ----------
+    pairs : iterable
+        The (query, target) pairs.
+
+    store : ScoreStore
+        The score store, where the proteins are registered (see
+        score_store).
+
+    names : dict
+        The name of each protein.
+
+    output : function
+        The function called with the stored scores, a list of tuples: the
+        name of the query, the name of the target and the score.
+
+    reverse : bool
+        OPTIONAL, True to also give the score of the reversed pair (the
+        glocal scores of a symmetric all-vs-all). A pair is then only
+        stored when both orders are. By default, False.
+
+    Returns
+    -------
+    generator
+        The pairs missing from the store.
+    """
+
+    stored = []
+
+    for query, target in pairs:
+        prot_name1, prot_name2 = names[query], names[target]
+        scores = [(prot_name1, prot_name2,
+                   store.lookup(prot_name1, prot_name2))]
+        # The glocal score of each order has its own key.
+        if reverse and prot_name1 != prot_name2:
+            scores.append((prot_name2, prot_name1,
+                           store.lookup(prot_name2, prot_name1)))
+        if any(score is None for _, _, score in scores):
+            yield query, target
+            continue
+
+        stored.extend(scores)
+        if len(stored) >= STORED_BLOCK:
+            output(stored)
+            stored = []
+
+    if stored:
+        output(stored)
+
+###############################################################################
+#                                                                             #
+#                                 workers                                     #
+#                                                                             #
+###############################################################################
+
+@functools.lru_cache(maxsize=None)
+def load_protein(embedding_file, fasta_file, precision="float64"):
+    """Reads the embedding, the sequence and the name of a protein.
+
+    The result is kept in memory, so each protein is only loaded once by
+    each worker.
+
+    Parameters
+    ----------
+    embedding_file : str or tuple
+        The name of an embedding file, or the name of a database and the
+        name of a protein of this database.
+
+    fasta_file : str or tuple
+        The name of a fasta file, or the name of a multi-fasta file and the
+        name of a record of this file.
+
+    precision : str
+        OPTIONAL, the type of the binary copy of an embedding file (see
+        embedding_precision). A database keeps the type it was built with.
+        By default, float64.
+
+    Returns
+    -------
+    tuple
+        The embedding (array, or tuple for int8), the fasta sequence (list)
+        and the name (str).
+    """
+
+    pr.count("proteins_loaded")
+
+    # A record of a multi-fasta file is read directly, with its index.
+    with pr.stage("fasta_reader"):
+        if isinstance(fasta_file, tuple):
+            fasta, prot_name = fi.fetch_sequence(*fasta_file), fasta_file[1]
+        else:
+            fasta = fr.fasta_reader(fasta_file)
+            prot_name = fr.fasta_name(fasta_file)
+
+    # The proteins of a database are views of its memory map.
+    with pr.stage("embedding_reader"):
+        if isinstance(embedding_file, tuple):
+            return ed.database_embedding(*embedding_file), fasta, prot_name
+
+        return (er.embedding_reader_cached(embedding_file, dtype=precision),
+                fasta, prot_name)
+
+
+def tile_size(options):
+    """Gives the shape of the tiles of the tiled engine.
+
+    Parameters
+    ----------
+    options : dict
+        The settings of the engine: tile_size, the number of rows and columns
+        of a tile, or tile_memory, the memory available for a tile in bytes.
+        By default, the shape of tiled_alignment.
+
+    Returns
+    -------
+    tuple
+        The number of rows and columns of a tile.
+    """
+
+    if options.get("tile_size"):
+        return options["tile_size"], options["tile_size"]
+    if options.get("tile_memory"):
+        return ti.tile_shape(options["tile_memory"])
+
+    return ti.TILE_ROWS, ti.TILE_COLUMNS
+
+
+def prefetch_depth(options):
+    """Gives the number of pairs whose proteins are read in advance.
+
+    Parameters
+    ----------
+    options : dict
+        The settings of the engine (see align).
+
+    Returns
+    -------
+    int
+        The prefetch option, by default prefetch_pipeline.DEPTH.
+    """
+
+    if options.get("prefetch") is None:
+        return pp.DEPTH
+
+    return options["prefetch"]
+
+
+def align(embedding1, embedding2, fasta1, fasta2, mode="nw", engine="numpy",
+          options=None):
+    """Aligns two proteins in memory.
+
+    Parameters
+    ----------
+    embedding1 : array
+        The embedding array of the first protein.
+
+    embedding2 : array
+        The embedding array of the second protein.
+
+    fasta1 : list of string
+        A list of string containing the first fasta sequence.
+
+    fasta2 : list of string
+        A list of string containing the second fasta sequence.
+
+    mode : str
+        OPTIONAL, nw (global), sw (local) or gl (glocal). By default, nw.
+
+    engine : str
+        OPTIONAL, the engine filling the alignment matrix, linear for the
+        linear memory alignments (nw and gl only) or directions for the 
+        direction matrices, banded for the alignments in a band (nw only).
+        By default, numpy.
+
+    options : dict
+        OPTIONAL, the settings of the engine: band_width for banded,
+        tile_size or tile_memory for tiled (see tile_size), batch_size for
+        batched, precision, the type of the stored embeddings (see
+        load_protein), top_k and min_score for the top-k alignments
+        (sw and gl, see topk_alignment), prefetch, the number of pairs
+        whose proteins are read in advance by the workers (see
+        prefetch_pipeline), and symmetric, True for the glocal scores of
+        both orders of each pair (see score_chunk).
+
+    Returns
+    -------
+    list
+        A list of tuples, the alignment score, the two aligned sequences
+        (str) of each alignment.
+    """
+
+    options = options or {}
+
+    if engine == "batched":
+        raise ValueError("The batched engine only computes scores.")
+
+    # The engines computing the dot products themselves need float
+    # embeddings.
+    if engine in ("banded", "tiled", "linear"):
+        embedding1 = ep.as_float(embedding1)
+        embedding2 = ep.as_float(embedding2)
+
+    # The band is computed directly from the embeddings.
+    if engine == "banded":
+        if mode != "nw":
+            raise ValueError("The banded engine is only available for nw.")
+        *alignment, touched = bd.banded_alignment(
+            embedding1, embedding2, fasta1, fasta2,
+            options.get("band_width"))
+        if touched:
+            warnings.warn("The alignment touched the edge of the band, a "
+                          "wider band may give a better alignment.")
+        return [tuple(alignment)]
+
+    # The dot products are computed tile by tile during the fill.
+    if engine == "tiled":
+        directions, last_column, maxima, best = ti.tiled_matrix(
+            embedding1, embedding2, mode != "nw", True, *tile_size(options))
+        if mode == "nw":
+            return [aa.needleman_wunsch_directions(fasta1, fasta2, directions,
+                                                   last_column)]
+        if mode == "sw":
+            return aa.smith_waterman_directions(fasta1, fasta2, directions,
+                                                maxima, best)
+        return aa.glocal_directions(fasta1, fasta2, directions, last_column)
+
+    # The linear engine works directly on the embeddings.
+    if engine == "linear":
+        if mode == "nw":
+            return [la.needleman_wunsch_linear(embedding1, embedding2,
+                                               fasta1, fasta2)]
+        if mode == "gl":
+            return la.glocal_linear(embedding1, embedding2, fasta1, fasta2)
+        raise ValueError("The linear engine is only available for nw and "
+                         "gl.")
+
+    # The top-k alignments fill the alignment matrix themselves.
+    if options.get("top_k") and mode != "nw" and engine != "numpy":
+        raise ValueError(f"The top-k alignments are not available with the "
+                         f"{engine} engine.")
+
+    # Calculation of the dot_product between each embedding at each position
+    # (in float32 for reduced precision embeddings).
+    with pr.stage("dot_matrix"):
+        dot_matrix = pr.array("dot_matrix",
+                              ep.dot_matrix(embedding1, embedding2))
+
+    # The k best alignments without shared pairs, instead of the ties.
+    if options.get("top_k") and mode != "nw":
+        top_alignments = tk.top_local_alignments if mode == "sw" \
+            else tk.top_glocal_alignments
+        return top_alignments(fasta1, fasta2, dot_matrix, options["top_k"],
+                              options.get("min_score") or 0)
+
+    # The Smith and Waterman matrix is only filled around the best seeds.
+    if engine == "seed":
+        if mode != "sw":
+            raise ValueError("The seed engine is only available for sw.")
+        return sa.seed_alignment(fasta1, fasta2, dot_matrix)
+
+    # Only the moves of the tracebacks are kept.
+    if engine == "directions":
+        if mode == "nw":
+            with pr.stage("fill_nw", cells=dot_matrix.size):
+                directions, last_column, _, _ = \
+                    am.direction_matrix_nw(dot_matrix)
+            with pr.stage("traceback_nw"):
+                return [aa.needleman_wunsch_directions(
+                    fasta1, fasta2, directions, last_column)]
+        with pr.stage("fill_sw", cells=dot_matrix.size):
+            directions, last_column, maxima, best = \
+                am.direction_matrix_sw(dot_matrix)
+        with pr.stage(f"traceback_{mode}"):
+            if mode == "sw":
+                return aa.smith_waterman_directions(fasta1, fasta2,
+                                                    directions, maxima, best)
+            return aa.glocal_directions(fasta1, fasta2, directions,
+                                        last_column)
+
+    if mode == "nw":
+        with pr.stage("fill_nw", cells=dot_matrix.size):
+            alignment_matrix = pr.array("alignment_matrix",
+                                        am.ENGINES[engine]["nw"](dot_matrix))
+        with pr.stage("traceback_nw"):
+            return [aa.needleman_wunsch_alignment(fasta1, fasta2,
+                                                  alignment_matrix)]
+
+    # Local and glocal alignments both use the Smith and Waterman matrix.
+    with pr.stage("fill_sw", cells=dot_matrix.size):
+        alignment_matrix = pr.array("alignment_matrix",
+                                    am.ENGINES[engine]["sw"](dot_matrix))
+    with pr.stage(f"traceback_{mode}"):
+        if mode == "sw":
+            return aa.smith_waterman_alignments(fasta1, fasta2,
+                                                alignment_matrix)
+        return aa.glocal_alignments(fasta1, fasta2, alignment_matrix)
+
+
+def align_chunk(pairs, mode, engine, options=None):
+    """Aligns a chunk of pairs in a worker.
+
+    Parameters
+    ----------
+    pairs : list
+        A list of (query, target) pairs, as given by make_pairs.
+
+    mode : str
+        nw (global), sw (local) or gl (glocal).
+
+    engine : str
+        The engine filling the alignment matrix.
+
+    options : dict
+        OPTIONAL, the settings of the engine (see align).
+
+    Returns
+    -------
+    list
+        A list of dictionaries, the records of the alignments of this chunk
+        (see result_writer.alignment_records).
+    """
+
+    options = options or {}
+    precision = options.get("precision") or "float64"
+    records = []
+
+    # The proteins of the next pairs are read while a pair is aligned.
+    load = functools.partial(pp.load_pair, load_protein=load_protein,
+                             precision=precision)
+
+    for _, ((embedding1, fasta1, prot_name1),
+            (embedding2, fasta2, prot_name2)) in pp.prefetch(
+                pairs, load, prefetch_depth(options)):
+
+        with pr.stage("align", cells=len(fasta1) * len(fasta2)):
+            alignments = align(embedding1, embedding2, fasta1, fasta2, mode,
+                               engine, options)
+        pr.count("pairs")
+        pr.count("cells", len(fasta1) * len(fasta2))
+        pr.count("traceback_steps",
+                 sum(len(result1) for _, result1, _, _ in alignments))
+
+        records.extend(rw.alignment_records(prot_name1, prot_name2, mode,
+                                            alignments, fasta1, fasta2))
+
+    return records
+
+def score_chunk(pairs, mode, engine="numpy", options=None):
+    """Computes the alignment scores of a chunk of pairs in a worker.
+
+    Parameters
+    ----------
+    pairs : list
+        A list of (query, target) pairs, as given by make_pairs.
+
+    mode : str
+        nw (global), sw (local) or gl (glocal).
+
+    engine : str
+        OPTIONAL, tiled to compute the scores tile by tile, batched to
+        compute the scores of the targets of a query together, seed for the
+        score of the seed and extend heuristic (sw only), otherwise the
+        whole dot matrix is computed first. By default, numpy.
+
+    options : dict
+        OPTIONAL, the settings of the engine (see align).
+
+    Returns
+    -------
+    list
+        A list of tuples, the name of the query, the name of the target and
+        the alignment score of each pair.
+    """
+
+    options = options or {}
+    precision = options.get("precision") or "float64"
+    scores = []
+
+    if engine == "batched":
+        # The pairs are grouped by query, the targets of a query are aligned
+        # together.
+        groups = ((query, [target for _, target in group])
+                  for query, group in itertools.groupby(pairs,
+                                                        lambda pair: pair[0]))
+
+        # The proteins of the next query are read and converted to floats
+        # while a query is aligned.
+        def load_group(group):
+            return [(ep.as_float(pp.read_embedding(embedding)), prot_name)
+                    for embedding, _, prot_name
+                    in (load_protein(*protein, precision)
+                        for protein in [group[0]] + group[1])]
+
+        for _, ((embedding1, prot_name1), *targets) in pp.prefetch(
+                groups, load_group, prefetch_depth(options)):
+            cells = len(embedding1) * sum(len(embedding2)
+                                          for embedding2, _ in targets)
+            with pr.stage("score", cells=cells):
+                target_scores = bt.query_scores(
+                    embedding1,
+                    [embedding2 for embedding2, _ in targets],
+                    mode,
+                    batch_size=options.get("batch_size") or bt.BATCH_SIZE)
+            pr.count("pairs", len(targets))
+            pr.count("cells", cells)
+            scores.extend((prot_name1, prot_name2, score)
+                          for (_, prot_name2), score
+                          in zip(targets, target_scores))
+        return scores
+
+    load = functools.partial(pp.load_pair, load_protein=load_protein,
+                             precision=precision)
+
+    for _, ((embedding1, fasta1, prot_name1),
+            (embedding2, fasta2, prot_name2)) in pp.prefetch(
+                pairs, load, prefetch_depth(options)):
+        cells = len(fasta1) * len(fasta2)
+        pr.count("pairs")
+        pr.count("cells", cells)
+
+        if engine == "tiled":
+            with pr.stage("score", cells=cells):
+                scores.append((prot_name1, prot_name2,
+                               ti.tiled_score(ep.as_float(embedding1),
+                                              ep.as_float(embedding2), mode,
+                                              *tile_size(options))))
+            continue
+
+        with pr.stage("dot_matrix"):
+            dot_matrix = pr.array("dot_matrix",
+                                  ep.dot_matrix(embedding1, embedding2))
+
+        with pr.stage("score", cells=cells):
+            if engine == "seed":
+                scores.append((prot_name1, prot_name2,
+                               sa.seed_alignment(fasta1, fasta2,
+                                                 dot_matrix)[0][0]))
+                continue
+
+            # The glocal score of the reversed pair of a symmetric
+            # all-vs-all is given by the same fill.
+            if options.get("symmetric") and mode == "gl":
+                score, reverse_score = asc.pair_scores(dot_matrix, mode)
+                scores.append((prot_name1, prot_name2, score))
+                if prot_name1 != prot_name2:
+                    scores.append((prot_name2, prot_name1, reverse_score))
+                continue
+
+            scores.append((prot_name1, prot_name2,
+                           asc.alignment_score(dot_matrix, mode)))
+
+    return scores
+
+###############################################################################
+#                                                                             #
+#                                  batch                                      #
+#                                                                             #
+###############################################################################
+
+def run_chunks(function, pairs, arguments, workers=None, chunksize=16):
+    """Runs a worker function on chunks of pairs, on a pool of processes.
+
+    At most four chunks per worker are waiting at the same time, so that the
+    pairs can be generated lazily. The results are given as soon as each
+    chunk is done, so they are not in the order of the pairs.
+
+    Parameters
+    ----------
+    function : function
+        The worker function, called with a chunk and the arguments.
+
+    pairs : iterable
+        The (query, target) pairs, as given by make_pairs, or the chunks of
+        pairs when chunksize is None (see score_matrix.balanced_chunks).
+
+    arguments : tuple
+        The other arguments of the worker function.
+
+    workers : int
+        OPTIONAL, the number of processes. By default, the number of CPUs.
+
+    chunksize : int
+        OPTIONAL, the number of pairs sent to a worker at once, None if the
+        pairs are already cut in chunks. By default, 16.
+
+    Returns
+    -------
+    generator
+        The result of the worker function for each chunk.
+    """
+
+    workers = workers or os.cpu_count()
+    pairs = iter(pairs)
+    chunks = pairs if chunksize is None \
+        else iter(lambda: list(itertools.islice(pairs, chunksize)), [])
+
+    # With the instrumentation on, the workers send the profile of each
+    # chunk with its result.
+    task = functools.partial(pr.call_profiled, function) if pr.ENABLED \
+        else function
+
+    with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+
+        pending = set()
+
+        while True:
+            # Keeps the pool busy without submitting every chunk at once.
+            while len(pending) < 4 * workers:
+                chunk = next(chunks, None)
+                if not chunk:
+                    break
+                pending.add(executor.submit(task, chunk, *arguments))
+
+            if not pending:
+                break
+
+            # Gives the results of the chunks as soon as they are finished.
+            finished, pending = concurrent.futures.wait(
+                pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in finished:
+                yield pr.merge_result(future.result()) if pr.ENABLED \
+                    else future.result()
+
+
+def score_pairs(pairs, mode="nw", workers=None, chunksize=16,
+                engine="numpy", options=None):
+    """Computes the alignment scores of pairs of proteins, in memory.
+
+    Parameters
+    ----------
+    pairs : iterable
+        The (query, target) pairs, as given by make_pairs.
+
+    mode : str
+        OPTIONAL, nw (global), sw (local) or gl (glocal). By default, nw.
+
+    workers : int
+        OPTIONAL, the number of processes. By default, the number of CPUs.
+
+    chunksize : int
+        OPTIONAL, the number of pairs sent to a worker at once. By default, 16.
+
+    engine : str
+        OPTIONAL, tiled to compute the scores tile by tile. By default, numpy.
+
+    options : dict
+        OPTIONAL, the settings of the engine (see align).
+
+    Returns
+    -------
+    generator
+        A tuple for each pair: the name of the query, the name of the target
+        and the alignment score.
+    """
+
+    for scores in run_chunks(score_chunk, pairs, (mode, engine, options),
+                             workers, chunksize):
+        yield from scores
+
+
+def run_batch(pairs, output, mode="nw", engine="numpy", workers=None,
+              chunksize=16, score_only=False, options=None, matrix=None,
+              store=None):
+    """Aligns pairs of proteins on a pool of processes.
+
+    The records of a chunk are given to the writer as soon as the chunk is
+    done, so they are not in the order of the pairs.
+
+    Parameters
+    ----------
+    pairs : iterable
+        The (query, target) pairs, as given by make_pairs.
+
+    output : ResultWriter
+        The writer of the results (see result_writer).
+
+    mode : str
+        OPTIONAL, nw (global), sw (local) or gl (glocal). By default, nw.
+
+    engine : str
+        OPTIONAL, the engine filling the alignment matrix. By default, numpy.
+
+    workers : int
+        OPTIONAL, the number of processes. By default, the number of CPUs.
+
+    chunksize : int
+        OPTIONAL, the number of pairs sent to a worker at once. By default, 16.
+
+    score_only : bool
+        OPTIONAL, if True only the scores are computed and written, without
+        the aligned sequences. By default, False.
+
+    options : dict
+        OPTIONAL, the settings of the engine (see align).
+
+    matrix : ScoreMatrix
+        OPTIONAL, a score matrix also receiving the scores (see
+        score_matrix).
+
+    store : ScoreStore
+        OPTIONAL, a score store receiving the new scores (see score_store).
+
+    Returns
+    -------
+    int
+        The number of records written.
+    """
+
+    count = 0
+
+    if score_only:
+        for scores in run_chunks(score_chunk, pairs, (mode, engine, options),
+                                 workers, chunksize):
+            output.write([rw.score_record(prot_name1, prot_name2, mode, score)
+                          for prot_name1, prot_name2, score in scores])
+            if matrix is not None:
+                matrix.add(scores)
+            if store is not None:
+                store.add(scores)
+            count += len(scores)
+
+        return count
+
+    for records in run_chunks(align_chunk, pairs, (mode, engine, options),
+                              workers, chunksize):
+        output.write(records)
+        count += len(records)
+
+    return count
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(
+        description="Aligns a query set against a target set of proteins.")
+    parser.add_argument("query",
+                        help="directory, .t5emb file, .t5db database or "
+                             "manifest")
+    parser.add_argument("target", nargs="?", default=None,
+                        help="directory, .t5emb file, .t5db database or "
+                             "manifest, by default all-vs-all on the query "
+                             "set")
+    parser.add_argument("--mode", choices=["nw", "sw", "gl"], default="nw")
+    parser.add_argument("--engine", choices=ENGINE_NAMES,
+                        default="numpy")
+    parser.add_argument("--band-width", type=int, default=None,
+                        help="columns on each side of the band (banded "
+                             "engine), by default 10 %% of the longest "
+                             "protein")
+    parser.add_argument("--tile-size", type=int, default=None,
+                        help="rows and columns of a tile (tiled engine), by "
+                             "default 256")
+    parser.add_argument("--tile-memory", type=int, default=None,
+                        help="bytes available for a tile (tiled engine), "
+                             "for instance the size of the L2 cache")
+    parser.add_argument("--batch-size", type=int, default=None,
+                        help="targets aligned at once (batched engine), by "
+                             "default 64")
+    parser.add_argument("--precision", choices=ep.PRECISIONS,
+                        default="float64",
+                        help="type of the binary copies of the embeddings, "
+                             "float32, float16 and int8 use 2 to 8 times "
+                             "less memory")
+    parser.add_argument("--top-k", type=int, default=None, metavar="K",
+                        help="at most K alignments without shared pairs of "
+                             "residues for each pair (sw and gl)")
+    parser.add_argument("--min-score", type=float, default=0,
+                        help="smallest score of the top-k alignments")
+    parser.add_argument("--prefilter", type=int, default=None, metavar="K",
+                        help="only align each query with its K most similar "
+                             "targets (see prefilter_index)")
+    parser.add_argument("--pooling", choices=pf.POOLINGS, default="mean",
+                        help="summary vector of the prefilter")
+    parser.add_argument("--clusters", type=int, default=0,
+                        help="number of clusters of the prefilter index, by "
+                             "default an exact search")
+    parser.add_argument("--probes", type=int, default=None,
+                        help="number of clusters searched by the prefilter")
+    parser.add_argument("--prefilter-index", default=None,
+                        help=".npz file keeping the prefilter index")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="number of processes, by default the number of "
+                             "CPUs")
+    parser.add_argument("--chunksize", type=int, default=16,
+                        help="number of pairs sent to a worker at once")
+    parser.add_argument("--prefetch", type=int, default=pp.DEPTH,
+                        help="number of pairs whose proteins are read in "
+                             "advance by each worker, 0 to read them when "
+                             "they are aligned")
+    parser.add_argument("--fasta-dir", default="../data/fasta/",
+                        help="directory containing the fasta files, or a "
+                             "multi-fasta file")
+    parser.add_argument("--score-only", action="store_true",
+                        help="only compute and write the alignment scores")
+    parser.add_argument("--output", default="../results/batch_results.tsv",
+                        help="output file, - for the standard output")
+    parser.add_argument("--format", choices=rw.FORMATS, default=None,
+                        help="format of the output, by default given by "
+                             "its extension (.jsonl, .txt, .npz), else tsv")
+    parser.add_argument("--symmetric", action="store_true",
+                        help="align each unordered pair of the all-vs-all "
+                             "once, in chunks balanced by length")
+    parser.add_argument("--matrix", default=None,
+                        help="score matrix of the all-vs-all (--score-only), "
+                             "dense (.npy) or sparse (.npz)")
+    parser.add_argument("--store", default=None,
+                        help="directory of a score store: the pairs already "
+                             "stored are not aligned again (--score-only)")
+    pr.add_arguments(parser)
+    arguments = parser.parse_args()
+    if arguments.engine == "linear" and arguments.mode == "sw":
+        parser.error("the linear engine is only available for nw and gl")
+    if arguments.engine == "banded" and arguments.mode != "nw":
+        parser.error("the banded engine is only available for nw")
+    if arguments.band_width is not None and arguments.band_width < 1:
+        parser.error("--band-width must be at least 1")
+    if arguments.engine == "seed" and arguments.mode != "sw":
+        parser.error("the seed engine is only available for sw")
+    if arguments.engine == "batched" and not arguments.score_only:
+        parser.error("the batched engine needs --score-only")
+    if arguments.output == "-" and arguments.format == "npz":
+        parser.error("an npz file cannot be written on the standard output")
+    if arguments.top_k and arguments.mode == "nw":
+        parser.error("--top-k is only available for sw and gl")
+    if arguments.top_k and arguments.engine != "numpy":
+        parser.error("--top-k fills the alignment matrix itself, it is not "
+                     f"available with the {arguments.engine} engine")
+    if arguments.top_k and arguments.score_only:
+        parser.error("--top-k gives alignments, not with --score-only")
+    if (arguments.symmetric or arguments.matrix) \
+            and arguments.target is not None:
+        parser.error("--symmetric and --matrix are for an all-vs-all, "
+                     "without TARGET")
+    if arguments.matrix and not arguments.score_only:
+        parser.error("--matrix needs --score-only")
+    if arguments.store and not arguments.score_only:
+        parser.error("--store needs --score-only")
+    if arguments.matrix and os.path.splitext(arguments.matrix)[1] \
+            not in (".npy", ".npz"):
+        parser.error("--matrix is a .npy (dense) or .npz (sparse) file")
+    if arguments.symmetric and arguments.mode == "gl":
+        # The reversed glocal score is given by the alignment matrix.
+        if not arguments.score_only:
+            parser.error("the glocal alignments depend on the order of the "
+                         "pair, --symmetric with gl needs --score-only")
+        if arguments.engine in ("tiled", "batched"):
+            parser.error("--symmetric with gl needs the dot matrix, not the "
+                         f"{arguments.engine} engine")
+    engine_options = {"band_width": arguments.band_width,
+                      "tile_size": arguments.tile_size,
+                      "tile_memory": arguments.tile_memory,
+                      "batch_size": arguments.batch_size,
+                      "precision": arguments.precision,
+                      "top_k": arguments.top_k,
+                      "min_score": arguments.min_score,
+                      "prefetch": arguments.prefetch,
+                      "symmetric": arguments.symmetric}
+
+    # The report is written at the end of the run.
+    pr.configure(arguments.profile, arguments.profile_hook)
+
+    query_set = read_protein_set(arguments.query, arguments.fasta_dir)
+    target_set = None
+    if arguments.target is not None:
+        target_set = read_protein_set(arguments.target, arguments.fasta_dir)
+
+    # The names and lengths of the proteins, for the matrix, the balanced
+    # chunks and the score store.
+    summaries = {}
+    if arguments.symmetric or arguments.matrix or arguments.store:
+        summaries = {protein: fasta_summary(protein[1])
+                     for protein in query_set + (target_set or [])}
+    names = {protein: name for protein, (name, _) in summaries.items()}
+    lengths = {protein: length for protein, (_, length) in summaries.items()}
+
+    if arguments.prefilter:
+        protein_pairs = prefilter_pairs(
+            query_set, target_set, arguments.prefilter, arguments.pooling,
+            arguments.clusters, arguments.probes, arguments.prefilter_index,
+            arguments.precision)
+        if arguments.symmetric:
+            protein_pairs = sm.unique_pairs(protein_pairs)
+    elif arguments.symmetric:
+        protein_pairs = sm.upper_pairs(query_set, lengths)
+    else:
+        protein_pairs = make_pairs(query_set, target_set)
+
+    # The scores of a symmetric all-vs-all are put in both halves of the
+    # matrix (the glocal scores of both orders are given by the workers).
+    score_file = contextlib.nullcontext()
+    if arguments.matrix:
+        score_file = sm.ScoreMatrix(
+            arguments.matrix, [names[protein] for protein in query_set],
+            arguments.symmetric and arguments.mode != "gl")
+
+    # The proteins of the store are found by their contents.
+    score_store = contextlib.nullcontext()
+    if arguments.store:
+        score_store = ss.ScoreStore(
+            arguments.store, arguments.mode,
+            ss.score_settings(arguments.engine, arguments.precision))
+        for protein, prot_name in names.items():
+            score_store.register(prot_name, *protein)
+
+    # A single thread writes all the results. Leaving the store writes its
+    # last checkpoint, even when the batch is interrupted.
+    with score_file as matrix, score_store as store, \
+            rw.ResultWriter(arguments.output, arguments.format,
+                            arguments.score_only) as writer:
+
+        # The scores already in the store are written directly.
+        if store is not None:
+            def write_stored(scores):
+                writer.write([rw.score_record(prot_name1, prot_name2,
+                                              arguments.mode, score)
+                              for prot_name1, prot_name2, score in scores])
+                if matrix is not None:
+                    matrix.add(scores)
+
+            protein_pairs = new_pairs(
+                protein_pairs, store, names, write_stored,
+                arguments.symmetric and arguments.mode == "gl")
+
+        # The chunks are cut by the product of the lengths of the pairs.
+        chunk_size = arguments.chunksize
+        if arguments.symmetric:
+            protein_pairs = sm.balanced_chunks(
+                protein_pairs, lengths, sm.chunk_cells(lengths, chunk_size))
+            chunk_size = None
+
+        run_batch(protein_pairs, writer,
+                  arguments.mode, arguments.engine, arguments.workers,
+                  chunk_size, arguments.score_only, engine_options, matrix,
+                  store)
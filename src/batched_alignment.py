@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 08:27:49 2026
+
+@author: Jean Delhomme
+
+This file contains three functions :
+    - length_buckets
+    - batched_scores
+    - query_scores
+
+Those functions compute the alignment scores of one query protein against
+many (short) target proteins at once. Filling the alignment matrix of a
+short pair uses numpy on rows of a few hundred cells, so most of the time is
+spent calling numpy. Here, the targets of a batch are padded to the same
+length and stacked: the rows of all their alignment matrices are computed
+together, with a leading batch axis on the dot products and on the rows.
+
+The padding columns are on the right of each matrix. The running maximum
+only goes from left to right, so they never change the cells of the target,
+they are only left out of the maximums. The targets are sorted by length
+before being cut in batches (length_buckets), so that little padding is
+needed.
+
+The recurrence is the one of alignment_score. The dot products of a batch
+may differ from the ones of np.dot in the last digits (they are not summed
+in the same order), so the scores are the same up to this rounding.
+
+"""
+
+import numpy as np
+
+# Number of rows of dot products computed at once.
+BLOCK_SIZE = 64
+
+# Number of targets aligned at once.
+BATCH_SIZE = 64
+
+###############################################################################
+#                                                                             #
+#                                 Buckets                                     #
+#                                                                             #
+###############################################################################
+
+def length_buckets(lengths, batch_size=BATCH_SIZE):
+    """Groups the targets in batches of similar lengths.
+
+    Parameters
+    ----------
+    lengths : list
+        The length of each target.
+
+    batch_size : int
+        OPTIONAL, the largest number of targets in a batch.
+
+    Returns
+    -------
+    list
+        A list of arrays, the indexes of the targets of each batch, from the
+        shortest targets to the longest ones.
+    """
+
+    order = np.argsort(lengths, kind="stable")
+
+    return [order[start:start+batch_size]
+            for start in range(0, len(order), batch_size)]
+
+###############################################################################
+#                                                                             #
+#                                  Scores                                     #
+#                                                                             #
+###############################################################################
+
+def batched_scores(embedding1, embeddings2, mode="sw", ends=False,
+                   block_size=BLOCK_SIZE):
+    """Computes the alignment scores of a query against a batch of targets.
+
+    Parameters
+    ----------
+    embedding1 : array
+        The embedding array of the query (rows).
+
+    embeddings2 : list of array
+        The embedding arrays of the targets (columns).
+
+    mode : str
+        OPTIONAL, nw (global), sw (local) or gl (glocal). By default, sw.
+
+    ends : bool
+        OPTIONAL, True to also give the cell where each alignment ends. By
+        default, False.
+
+    block_size : int
+        OPTIONAL, the number of rows of dot products computed at once.
+
+    Returns
+    -------
+    array or tuple
+        The alignment score of each target. With ends, also the row and the
+        column of the end cell of each target (two arrays): the bottom-right
+        corner for nw, the last maximum in reading order for sw and the
+        last maximum of the last column for gl (where the first alignment of
+        smith_waterman and glocal starts its traceback).
+    """
+
+    # The gap is fixed at 0.
+    gap = 0
+
+    seq1_size = embedding1.shape[0]
+    batch = len(embeddings2)
+    lengths = np.array([embedding.shape[0] for embedding in embeddings2],
+                       dtype=np.intp)
+    seq2_size = int(lengths.max()) if batch else 0
+    targets = np.arange(batch)
+
+    # The targets padded with 0s to the longest one: (batch, seq2_size, dim).
+    padded = np.zeros((batch, seq2_size, embedding1.shape[1]))
+    for k, embedding in enumerate(embeddings2):
+        padded[k, :lengths[k]] = embedding
+    padded = padded.transpose(0, 2, 1)
+
+    # 0 for the columns of each alignment matrix, -inf for the padding.
+    columns = np.arange(seq2_size+1)
+    padding = np.where(columns[np.newaxis, :] <= lengths[:, np.newaxis],
+                       0.0, -np.inf)
+    masked = np.empty((batch, seq2_size+1))
+
+    # The first row of each alignment matrix is filled with 0s.
+    row = np.zeros((batch, seq2_size+1))
+    new_row = np.zeros((batch, seq2_size+1))
+
+    # Running maximums and their cells, starting with the first row.
+    best = np.zeros(batch)
+    best_rows = np.zeros(batch, dtype=np.intp)
+    best_columns = np.zeros(batch, dtype=np.intp)
+    if mode == "gl":
+        best_columns = lengths.copy()
+
+    for start in range(0, seq1_size, block_size):
+
+        # Dot products of a block of rows with every target:
+        # (batch, rows of the block, seq2_size).
+        scores = np.matmul(embedding1[start:start+block_size], padded)
+
+        for k in range(scores.shape[1]):
+            i = start + k + 1
+
+            # Same recurrence as alignment_score, with a batch axis.
+            new_row[:, 0] = row[:, 0] + gap
+            np.maximum(row[:, :-1] + scores[:, k], row[:, 1:] + gap,
+                       out=new_row[:, 1:])
+            # In Smith and Waterman, the maximum needs to be > 0.
+            if mode != "nw":
+                np.maximum(new_row[:, 1:], 0, out=new_row[:, 1:])
+            np.maximum.accumulate(new_row, axis=1, out=new_row)
+
+            # The two rows are swapped instead of being allocated again.
+            row, new_row = new_row, row
+
+            if mode == "sw":
+                # Last maximum of the row, without the padding. An equal
+                # row moves the end too, so that the last maximum in
+                # reading order is kept.
+                np.add(row, padding, out=masked)
+                row_best = seq2_size - masked[:, ::-1].argmax(axis=1)
+                row_max = masked[targets, row_best]
+                better = row_max >= best
+            elif mode == "gl":
+                # Last column of each alignment matrix. The last maximum is
+                # kept.
+                row_max = row[targets, lengths]
+                row_best = lengths
+                better = row_max >= best
+            else:
+                continue
+
+            best = np.where(better, row_max, best)
+            best_rows = np.where(better, i, best_rows)
+            best_columns = np.where(better, row_best, best_columns)
+
+    if mode == "nw":
+        best = row[targets, lengths]
+        best_rows = np.full(batch, seq1_size, dtype=np.intp)
+        best_columns = lengths
+
+    if ends:
+        return best, (best_rows, best_columns)
+
+    return best
+
+
+def query_scores(embedding1, embeddings2, mode="sw", ends=False,
+                 batch_size=BATCH_SIZE, block_size=BLOCK_SIZE):
+    """Computes the alignment scores of a query against many targets.
+
+    The targets are cut in batches of similar lengths (length_buckets), each
+    batch is aligned with batched_scores.
+
+    Parameters
+    ----------
+    embedding1 : array
+        The embedding array of the query (rows).
+
+    embeddings2 : list of array
+        The embedding arrays of the targets (columns).
+
+    mode : str
+        OPTIONAL, nw (global), sw (local) or gl (glocal). By default, sw.
+
+    ends : bool
+        OPTIONAL, True to also give the cell where each alignment ends (see
+        batched_scores). By default, False.
+
+    batch_size : int
+        OPTIONAL, the largest number of targets aligned at once.
+
+    block_size : int
+        OPTIONAL, the number of rows of dot products computed at once.
+
+    Returns
+    -------
+    array or tuple
+        The alignment score of each target, in the order of embeddings2.
+        With ends, also the row and the column of the end cell of each
+        target.
+    """
+
+    scores = np.zeros(len(embeddings2))
+    end_rows = np.zeros(len(embeddings2), dtype=np.intp)
+    end_columns = np.zeros(len(embeddings2), dtype=np.intp)
+
+    for indexes in length_buckets([embedding.shape[0]
+                                   for embedding in embeddings2],
+                                  batch_size):
+        batch_scores, (rows, columns) = batched_scores(
+            embedding1, [embeddings2[k] for k in indexes], mode, True,
+            block_size)
+        scores[indexes] = batch_scores
+        end_rows[indexes] = rows
+        end_columns[indexes] = columns
+
+    if ends:
+        return scores, (end_rows, end_columns)
+
+    return scores
@@ -0,0 +1,554 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 08:47:50 2026
+
+@author: Jean Delhomme
+
+This file contains the benchmark of the alignment of a pair :
+    - synthetic_pair, write_protein, generate_pairs
+    - time_stage
+    - run_benchmark
+    - compare_runs
+
+generate_pairs writes synthetic proteins, a fasta file and a .t5emb file for
+each one, for a grid of lengths (50 to 5000 residues by default). For each
+length, the target is a mutated copy of the query (substitutions, insertions
+and deletions), and the vector of a residue is the vector of its amino acid
+plus some noise: the two proteins have a real alignment, as two related
+proteins, instead of a random one.
+
+run_benchmark times each stage of main.py separately on these pairs :
+    - embedding_reader: the parsing of the two .t5emb files.
+    - embedding_parser: the same, with the bulk parser (see
+      embedding_parser).
+    - fasta_reader: the reading of the two fasta files.
+    - dot_matrix: the dot products of all the pairs of residues.
+    - fill_nw, fill_sw: the Needleman and Wunsch and the Smith and Waterman
+      matrices (alignment_matrix, with the chosen engine).
+    - traceback_nw, traceback_sw, traceback_gl: the tracebacks of
+      alignment_algorithm.
+
+Each stage is run --repeat times and the best time is kept, then once more
+under tracemalloc, for the peak of memory allocated by the stage (the numpy
+arrays included). The results are saved in a JSON file, and compare_runs
+compares two of these files: a stage is a regression when it is slower than
+in the baseline by more than a threshold (10 % by default).
+
+    python3 benchmark.py run [--lengths 50 100 ...] [--engine numpy]
+                             [--repeat N] [--output FILE] [--baseline FILE]
+    python3 benchmark.py compare BASELINE CURRENT [--threshold 0.1]
+    python3 benchmark.py generate DIRECTORY [--lengths 50 100 ...]
+
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+import alignment_matrix as am
+import alignment_algorithm as aa
+import embedding_parser as ps
+import embedding_reader as er
+import fasta_reader as fr
+
+# Lengths of the synthetic proteins, in residues.
+LENGTHS = (50, 100, 200, 500, 1000, 2000, 5000)
+
+# Number of values of a residue vector, as in the T5 embeddings.
+DIMENSION = 1024
+
+# Amino acids of the synthetic sequences.
+AMINO_ACIDS = "ACDEFGHIKLMNPQRSTVWY"
+
+# Standard deviations of the values of an amino acid vector and of the
+# noise added for each residue. The dot product of a residue with itself is
+# then close to the one of the real embeddings (about 45).
+PROTOTYPE_SIGMA = 0.18
+NOISE_SIGMA = 0.1
+
+# Probabilities of a substitution, an insertion and a deletion at each
+# residue of the target.
+MUTATIONS = (0.2, 0.03, 0.03)
+
+# Stages of the benchmark, in the order they are run.
+STAGES = ("embedding_reader", "embedding_parser", "fasta_reader",
+          "dot_matrix", "fill_nw", "fill_sw", "traceback_nw", "traceback_sw",
+          "traceback_gl")
+
+# Version of the format of the JSON files.
+FORMAT_VERSION = 1
+
+# Relative slow down above which a stage is a regression.
+THRESHOLD = 0.1
+
+# Stages faster than this in both runs (in seconds) are never regressions,
+# their times being mostly noise.
+MIN_SECONDS = 1e-3
+
+###############################################################################
+#                                                                             #
+#                                Generator                                    #
+#                                                                             #
+###############################################################################
+
+def synthetic_pair(length, rng, dimension=DIMENSION):
+    """Generates two related synthetic proteins.
+
+    Parameters
+    ----------
+    length : int
+        The number of residues of the query.
+
+    rng : Generator
+        The numpy random generator.
+
+    dimension : int
+        OPTIONAL, the number of values of a residue vector.
+
+    Returns
+    -------
+    tuple
+        The sequence (str) and the embedding array of the query, then of the
+        target, a mutated copy of the query of about the same length.
+    """
+
+    prototypes = rng.normal(0, PROTOTYPE_SIGMA,
+                            (len(AMINO_ACIDS), dimension))
+
+    query = rng.integers(len(AMINO_ACIDS), size=length)
+
+    substitution, insertion, deletion = MUTATIONS
+    target = []
+    for residue in query:
+        draw = rng.random()
+        if draw < deletion:
+            continue
+        if draw < deletion + substitution:
+            residue = rng.integers(len(AMINO_ACIDS))
+        target.append(residue)
+        if rng.random() < insertion:
+            target.append(rng.integers(len(AMINO_ACIDS)))
+    target = np.array(target)
+
+    def embedding(residues):
+        return prototypes[residues] + rng.normal(0, NOISE_SIGMA,
+                                                 (len(residues), dimension))
+
+    def sequence(residues):
+        return "".join(AMINO_ACIDS[residue] for residue in residues)
+
+    return sequence(query), embedding(query), sequence(target), \
+        embedding(target)
+
+
+def write_protein(directory, name, sequence, embedding):
+    """Writes a protein as a fasta file and a .t5emb file.
+
+    Parameters
+    ----------
+    directory : str
+        The directory of the files.
+
+    name : str
+        The name of the protein, and of its files.
+
+    sequence : str
+        The sequence of the protein.
+
+    embedding : array
+        The embedding array of the protein.
+
+    Returns
+    -------
+    tuple
+        The names of the .t5emb file and of the fasta file.
+    """
+
+    embedding_file = os.path.join(directory, name + ".t5emb")
+    fasta_file = os.path.join(directory, name + ".fasta")
+
+    # The values are written as in the T5 files, one residue per line.
+    np.savetxt(embedding_file, embedding, fmt="%.8g")
+
+    with open(fasta_file, "w") as fasta:
+        fasta.write(f">{name}\n")
+        for start in range(0, len(sequence), 60):
+            fasta.write(sequence[start:start+60] + "\n")
+
+    return embedding_file, fasta_file
+
+
+def generate_pairs(directory, lengths=LENGTHS, seed=0):
+    """Writes a pair of synthetic proteins for each length.
+
+    The same seed gives the same files.
+
+    Parameters
+    ----------
+    directory : str
+        The directory of the files, created if needed.
+
+    lengths : tuple
+        OPTIONAL, the lengths of the queries.
+
+    seed : int
+        OPTIONAL, the seed of the random generator.
+
+    Returns
+    -------
+    dict
+        For each length, the embedding file and the fasta file of the query,
+        then of the target.
+    """
+
+    os.makedirs(directory, exist_ok=True)
+    pairs = {}
+
+    for length in lengths:
+        rng = np.random.default_rng([seed, length])
+        query, query_embedding, target, target_embedding = \
+            synthetic_pair(length, rng)
+        pairs[length] = \
+            write_protein(directory, f"query_{length}", query,
+                          query_embedding) \
+            + write_protein(directory, f"target_{length}", target,
+                            target_embedding)
+
+    return pairs
+
+###############################################################################
+#                                                                             #
+#                                Benchmark                                    #
+#                                                                             #
+###############################################################################
+
+def time_stage(function, repeat=3, memory=True):
+    """Times a stage, and measures the memory it allocates.
+
+    Parameters
+    ----------
+    function : function
+        The stage, called without arguments.
+
+    repeat : int
+        OPTIONAL, the number of timed runs.
+
+    memory : bool
+        OPTIONAL, True to run the stage once more under tracemalloc. By
+        default, True.
+
+    Returns
+    -------
+    tuple
+        The result of the stage, the time of each run (in seconds) and the
+        peak of memory allocated by the stage (in bytes, None without
+        memory).
+    """
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+
+    # tracemalloc slows the stage down, so it is not timed.
+    peak = None
+    if memory:
+        tracemalloc.start()
+        try:
+            function()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    return result, times, peak
+
+
+def run_benchmark(pairs, engine="numpy", repeat=3, memory=True,
+                  verbose=False):
+    """Times the stages of the alignment of each pair.
+
+    Parameters
+    ----------
+    pairs : dict
+        The files of each length, as given by generate_pairs.
+
+    engine : str
+        OPTIONAL, the engine filling the matrices: numpy, python or blocked.
+        By default, numpy.
+
+    repeat : int
+        OPTIONAL, the number of timed runs of each stage.
+
+    memory : bool
+        OPTIONAL, True to measure the memory allocated by each stage. By
+        default, True.
+
+    verbose : bool
+        OPTIONAL, True to print each result as it is measured.
+
+    Returns
+    -------
+    dict
+        The settings of the run, the machine and a list of results: the
+        length of the query and of the target, the stage, the best time and
+        all the times (in seconds) and the peak of memory (in bytes).
+    """
+
+    results = []
+
+    for length, (embedding_file1, fasta_file1, embedding_file2,
+                 fasta_file2) in pairs.items():
+
+        # Each stage gets the results of the previous ones.
+        stages = {
+            "embedding_reader": lambda: (er.embedding_reader(embedding_file1),
+                                         er.embedding_reader(embedding_file2)),
+            "embedding_parser": lambda: (ps.parse_embedding(embedding_file1),
+                                         ps.parse_embedding(embedding_file2)),
+            "fasta_reader": lambda: (fr.fasta_reader(fasta_file1),
+                                     fr.fasta_reader(fasta_file2)),
+            "dot_matrix": lambda: np.dot(values["embedding_reader"][0],
+                                         values["embedding_reader"][1].T),
+            "fill_nw": lambda: am.ENGINES[engine]["nw"](
+                values["dot_matrix"]),
+            "fill_sw": lambda: am.ENGINES[engine]["sw"](
+                values["dot_matrix"]),
+            "traceback_nw": lambda: aa.needleman_wunsch_alignment(
+                *values["fasta_reader"], values["fill_nw"]),
+            "traceback_sw": lambda: aa.smith_waterman_alignments(
+                *values["fasta_reader"], values["fill_sw"]),
+            "traceback_gl": lambda: aa.glocal_alignments(
+                *values["fasta_reader"], values["fill_sw"]),
+        }
+        values = {}
+
+        for stage in STAGES:
+            values[stage], times, peak = time_stage(stages[stage], repeat,
+                                                    memory)
+            result = {"length": length,
+                      "target_length": len(values["embedding_reader"][1]),
+                      "stage": stage, "seconds": min(times), "times": times,
+                      "peak_bytes": peak}
+            results.append(result)
+            if verbose:
+                print_result(result)
+
+    return {"version": FORMAT_VERSION,
+            "date": datetime.datetime.now().isoformat(timespec="seconds"),
+            "engine": engine, "repeat": repeat,
+            "machine": {"python": platform.python_version(),
+                        "numpy": np.__version__,
+                        "platform": platform.platform(),
+                        "processor": platform.machine(),
+                        "cpus": os.cpu_count()},
+            # Largest memory used by the process, in kiB on Linux.
+            "max_rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            "results": results}
+
+
+def print_result(result):
+    """Prints a result of run_benchmark as a line of a table.
+
+    Parameters
+    ----------
+    result : dict
+        A result of run_benchmark.
+    """
+
+    peak = "-" if result["peak_bytes"] is None \
+        else f"{result['peak_bytes'] / 2**20:.1f}"
+    print(f"{result['length']}\t{result['stage']}\t"
+          f"{result['seconds']:.4f}\t{peak}", flush=True)
+
+###############################################################################
+#                                                                             #
+#                                Comparison                                   #
+#                                                                             #
+###############################################################################
+
+def compare_runs(baseline, current, threshold=THRESHOLD):
+    """Compares the times of two runs of the benchmark.
+
+    Only the stages measured for the same length in both runs are compared.
+
+    Parameters
+    ----------
+    baseline : dict
+        The reference run, as given by run_benchmark.
+
+    current : dict
+        The new run.
+
+    threshold : float
+        OPTIONAL, the relative slow down above which a stage is a
+        regression. By default, 0.1 (10 %).
+
+    Returns
+    -------
+    list
+        A dictionary for each stage: its length and name, its times in both
+        runs (in seconds), their ratio (current / baseline) and True if it
+        is a regression.
+    """
+
+    reference = {(result["length"], result["stage"]): result
+                 for result in baseline["results"]}
+    comparison = []
+
+    for result in current["results"]:
+        key = (result["length"], result["stage"])
+        if key not in reference:
+            continue
+        before, after = reference[key]["seconds"], result["seconds"]
+        ratio = after / before if before > 0 else float("inf")
+        comparison.append({
+            "length": result["length"], "stage": result["stage"],
+            "baseline": before, "current": after, "ratio": ratio,
+            "regression": ratio > 1 + threshold
+                          and max(before, after) >= MIN_SECONDS})
+
+    return comparison
+
+
+def read_run(file):
+    """Reads a run of the benchmark from a JSON file.
+
+    Parameters
+    ----------
+    file : str
+        The name of the JSON file.
+
+    Returns
+    -------
+    dict
+        The run, as given by run_benchmark.
+    """
+
+    with open(file, "r") as run:
+        return json.load(run)
+
+
+def print_comparison(baseline, current, threshold=THRESHOLD):
+    """Prints the comparison of two runs.
+
+    Parameters
+    ----------
+    baseline : dict
+        The reference run.
+
+    current : dict
+        The new run.
+
+    threshold : float
+        OPTIONAL, the relative slow down above which a stage is a
+        regression.
+
+    Returns
+    -------
+    int
+        The number of regressions.
+    """
+
+    # Times are only comparable with the same engine on the same machine.
+    for setting in ("engine", "machine"):
+        if baseline.get(setting) != current.get(setting):
+            print(f"Warning: the runs do not have the same {setting}.",
+                  file=sys.stderr)
+
+    comparison = compare_runs(baseline, current, threshold)
+
+    print("length\tstage\tbaseline\tcurrent\tratio")
+    for row in comparison:
+        flag = "\tREGRESSION" if row["regression"] else ""
+        print(f"{row['length']}\t{row['stage']}\t{row['baseline']:.4f}\t"
+              f"{row['current']:.4f}\t{row['ratio']:.2f}{flag}")
+
+    regressions = sum(row["regression"] for row in comparison)
+    print(f"{regressions} regression(s) in {len(comparison)} stages "
+          f"(threshold {threshold:.0%}).")
+
+    return regressions
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(
+        description="Benchmarks the stages of an alignment on synthetic "
+                    "proteins.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run the benchmark")
+    run_parser.add_argument("--lengths", type=int, nargs="+",
+                            default=list(LENGTHS),
+                            help="lengths of the synthetic proteins")
+    run_parser.add_argument("--engine", choices=list(am.ENGINES),
+                            default="numpy")
+    run_parser.add_argument("--repeat", type=int, default=3,
+                            help="number of timed runs of each stage")
+    run_parser.add_argument("--no-memory", action="store_true",
+                            help="do not measure the memory of the stages")
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--data-dir", default=None,
+                            help="directory of the synthetic files, kept "
+                                 "after the run (by default a temporary "
+                                 "directory)")
+    run_parser.add_argument("--output", default="../results/benchmark.json",
+                            help="JSON file of the results")
+    run_parser.add_argument("--baseline", default=None,
+                            help="JSON file of a previous run to compare "
+                                 "with")
+    run_parser.add_argument("--threshold", type=float, default=THRESHOLD)
+
+    compare_parser = commands.add_parser("compare",
+                                         help="compare two runs")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float,
+                                default=THRESHOLD)
+
+    generate_parser = commands.add_parser(
+        "generate", help="only write the synthetic proteins")
+    generate_parser.add_argument("directory")
+    generate_parser.add_argument("--lengths", type=int, nargs="+",
+                                 default=list(LENGTHS))
+    generate_parser.add_argument("--seed", type=int, default=0)
+
+    arguments = parser.parse_args()
+
+    if arguments.command == "generate":
+        for files in generate_pairs(arguments.directory, arguments.lengths,
+                                    arguments.seed).values():
+            print("\t".join(files))
+
+    elif arguments.command == "compare":
+        sys.exit(1 if print_comparison(read_run(arguments.baseline),
+                                       read_run(arguments.current),
+                                       arguments.threshold) else 0)
+
+    else:
+        with tempfile.TemporaryDirectory() as temporary_directory:
+            protein_pairs = generate_pairs(
+                arguments.data_dir or temporary_directory, arguments.lengths,
+                arguments.seed)
+            print("length\tstage\tseconds\tpeak_MiB")
+            run = run_benchmark(protein_pairs, arguments.engine,
+                                arguments.repeat, not arguments.no_memory,
+                                verbose=True)
+
+        with open(arguments.output, "w") as output:
+            json.dump(run, output, indent=1)
+        print(f"Results written in {arguments.output}.")
+
+        if arguments.baseline is not None:
+            sys.exit(1 if print_comparison(read_run(arguments.baseline), run,
+                                           arguments.threshold) else 0)
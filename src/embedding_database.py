@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 08:28:52 2026
+
+@author: Jean Delhomme
+
+This file contains four functions :
+    - build_database
+    - read_index
+    - open_database
+    - database_embedding
+
+Those functions pack many .t5emb files into a single embedding database, so
+that a large set of proteins is not read one text file at a time.
+
+A database is made of two files :
+    - NAME.t5db: the vectors of all the proteins, one after the other, as
+      raw binary values (one row of dim values for each residue). For int8
+      databases, the float32 scales of all the residues follow the values
+      (see embedding_precision).
+    - NAME.t5db.idx: the index, a text file. Its first line gives the type
+      of the values and the size of the vectors, then each line gives the
+      name of a protein, its first row in NAME.t5db, its number of residues
+      and its fasta file (relative to the index, - if unknown or in a
+      multi-fasta file), separated by tabulations.
+
+open_database memory-maps NAME.t5db: the embedding of a protein is a view of
+its rows, nothing is copied or parsed. All the processes reading the same
+database share the same pages of the system cache.
+
+A database is built with :
+
+    python3 embedding_database.py SET OUTPUT [--fasta-dir DIR]
+                                  [--dtype float64|float32|float16|int8]
+                                  [--workers N]
+
+where SET is a protein set of batch.py (a directory of .t5emb files, a
+.t5emb file or a manifest).
+
+"""
+
+import argparse
+import functools
+import os
+
+import numpy as np
+
+import embedding_parser as ps
+import embedding_precision as ep
+
+# Extensions of the two files of a database.
+DATABASE_EXTENSION = ".t5db"
+INDEX_EXTENSION = ".idx"
+
+###############################################################################
+#                                                                             #
+#                                  Build                                      #
+#                                                                             #
+###############################################################################
+
+def build_database(proteins, output, dtype="float64", workers=1):
+    """Packs embedding files into a database.
+
+    The embedding files are parsed by embedding_parser, on several processes
+    (one file per process), and their vectors are appended to the database
+    in the order of the proteins, so only a few proteins are in memory. Both
+    files are written under temporary names and then renamed, the index
+    last.
+
+    Parameters
+    ----------
+    proteins : list
+        A list of tuples, the embedding file and the fasta file (or None) of
+        each protein, as given by batch.read_protein_set.
+
+    output : str
+        The name of the database (NAME.t5db).
+
+    dtype : str
+        OPTIONAL, the type of the stored values, float64, float32, float16
+        or int8. By default, float64 (same values as embedding_reader).
+
+    workers : int
+        OPTIONAL, the number of processes parsing the files. By default, 1.
+
+    Returns
+    -------
+    int
+        The number of proteins in the database.
+    """
+
+    index_file = output + INDEX_EXTENSION
+    directory = os.path.dirname(os.path.abspath(index_file))
+    temporary_output = f"{output}.{os.getpid()}.tmp"
+    temporary_index = f"{index_file}.{os.getpid()}.tmp"
+
+    lines = []
+    scales = []
+    names = set()
+    offset = 0
+    dimension = 0
+
+    proteins = list(proteins)
+    arrays = ps.parse_files((embedding_file for embedding_file, _ in proteins),
+                            workers)
+
+    with open(temporary_output, "wb") as database:
+        for (embedding_file, fasta_file), array in zip(proteins, arrays):
+
+            # The name of a protein is the name of its embedding file.
+            name = os.path.splitext(os.path.basename(embedding_file))[0]
+            if name in names:
+                raise ValueError(f"Two proteins are named {name}.")
+            names.add(name)
+
+            if np.dtype(dtype) == np.int8:
+                array, array_scales = ep.quantize_int8(array)
+                scales.append(array_scales)
+            array = np.ascontiguousarray(array, dtype=dtype)
+            if dimension and array.shape[1] != dimension:
+                raise ValueError(f"{embedding_file} has vectors of size "
+                                 f"{array.shape[1]} instead of {dimension}.")
+            dimension = array.shape[1]
+            database.write(array.tobytes())
+
+            # A record of a multi-fasta file is found again by its name.
+            fasta = "-"
+            if fasta_file is not None and not isinstance(fasta_file, tuple):
+                fasta = os.path.relpath(os.path.abspath(fasta_file),
+                                        directory)
+            lines.append(f"{name}\t{offset}\t{array.shape[0]}\t{fasta}\n")
+            offset += array.shape[0]
+
+        # The scales of an int8 database follow the values.
+        if scales:
+            database.write(np.concatenate(scales).tobytes())
+
+    with open(temporary_index, "w") as index:
+        index.write(f"# {np.dtype(dtype).name} {dimension}\n")
+        index.writelines(lines)
+
+    os.replace(temporary_output, output)
+    os.replace(temporary_index, index_file)
+
+    return len(lines)
+
+###############################################################################
+#                                                                             #
+#                                  Read                                       #
+#                                                                             #
+###############################################################################
+
+def read_index(database):
+    """Reads the index of a database.
+
+    Parameters
+    ----------
+    database : str
+        The name of the database (NAME.t5db).
+
+    Returns
+    -------
+    tuple
+        The type of the values (str), the size of the vectors (int) and a
+        dictionary giving, for the name of each protein, its first row, its
+        number of residues and its fasta file (str, or None), in the order
+        of the database.
+    """
+
+    index_file = database + INDEX_EXTENSION
+    directory = os.path.dirname(index_file)
+    proteins = {}
+
+    with open(index_file, "r") as index:
+        dtype, dimension = index.readline()[1:].split()
+        for line in index:
+            name, offset, length, fasta = line.rstrip("\n").split("\t")
+            fasta = None if fasta == "-" else os.path.join(directory, fasta)
+            proteins[name] = (int(offset), int(length), fasta)
+
+    return dtype, int(dimension), proteins
+
+
+@functools.lru_cache(maxsize=None)
+def open_database(database):
+    """Memory-maps a database.
+
+    The result is kept, so each process maps a database only once.
+
+    Parameters
+    ----------
+    database : str
+        The name of the database (NAME.t5db).
+
+    Returns
+    -------
+    tuple
+        The read-only memory map of all the vectors (array of one row per
+        residue, or tuple of the values and the scales for int8) and the
+        index, as given by read_index.
+    """
+
+    dtype, dimension, proteins = read_index(database)
+    rows = sum(length for _, length, _ in proteins.values())
+
+    # np.memmap cannot map an empty file.
+    if rows == 0:
+        vectors = np.zeros((0, dimension), dtype=dtype)
+    else:
+        vectors = np.memmap(database, dtype=dtype, mode="r",
+                            shape=(rows, dimension))
+
+    if np.dtype(dtype) == np.int8:
+        scales = np.zeros(0, dtype=np.float32)
+        if rows:
+            scales = np.memmap(database, dtype=np.float32, mode="r",
+                               offset=rows*dimension, shape=(rows,))
+        vectors = (vectors, scales)
+
+    return vectors, proteins
+
+
+def database_embedding(database, name):
+    """Gives the embedding of a protein of a database, without copy.
+
+    Parameters
+    ----------
+    database : str
+        The name of the database (NAME.t5db).
+
+    name : str
+        The name of the protein (the name of its embedding file).
+
+    Returns
+    -------
+    memmap or tuple
+        A read-only view of the vectors of the protein, one for each residue
+        (for int8, a tuple of the values and the scales).
+    """
+
+    vectors, proteins = open_database(database)
+    offset, length, _ = proteins[name]
+
+    if isinstance(vectors, tuple):
+        return tuple(array[offset:offset+length] for array in vectors)
+
+    return vectors[offset:offset+length]
+
+
+if __name__ == "__main__":
+
+    # batch reads the protein sets, it imports this module itself.
+    import batch as ba
+
+    parser = argparse.ArgumentParser(
+        description="Packs the embedding files of a protein set into a "
+                    "database.")
+    parser.add_argument("set",
+                        help="directory, .t5emb file or manifest")
+    parser.add_argument("output", help="name of the database (.t5db)")
+    parser.add_argument("--fasta-dir", default="../data/fasta/",
+                        help="directory containing the fasta files, or a "
+                             "multi-fasta file")
+    parser.add_argument("--dtype", choices=ep.PRECISIONS,
+                        default="float64")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="number of processes parsing the embedding "
+                             "files, by default the number of CPUs")
+    arguments = parser.parse_args()
+
+    count = build_database(ba.read_protein_set(arguments.set,
+                                               arguments.fasta_dir),
+                           arguments.output, arguments.dtype,
+                           arguments.workers or os.cpu_count())
+    print(f"{count} proteins written in {arguments.output}")
@@ -0,0 +1,411 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 08:54:48 2026
+
+@author: Jean Delhomme
+
+This file contains the bulk parser of the .t5emb files :
+    - scan_embedding
+    - parse_range
+    - parse_embedding
+    - write_binary_copy
+    - parse_files
+
+embedding_reader parses a .t5emb file line by line, with a float() call and
+a Python object for each value: a large dump of embeddings takes hours to
+convert. This parser cuts a file in blocks of whole lines (8 MiB by
+default), and each block is parsed at once by the C parser of numpy
+(numpy.loadtxt), into an array, without a Python object for each value. The
+values are exactly the ones of embedding_reader. Every line must have the
+same number of values, an error gives the line where it changes.
+
+The blocks of a file can be parsed on several processes. write_binary_copy
+writes them directly in the binary copy of embedding_reader_cached (a .npy
+file, in the type of the copy), each process filling its own rows, so the
+whole array is never in memory. parse_files parses many files on several
+processes, one file per process, for the embedding databases.
+
+The speed against embedding_reader is given by :
+
+    python3 embedding_parser.py FILE [WORKERS]
+
+"""
+
+import concurrent.futures
+import io
+import itertools
+import os
+import sys
+import time
+
+import numpy as np
+
+import embedding_precision as ep
+import profiling as pr
+
+# Size of a block of lines parsed at once, in bytes.
+BLOCK_SIZE = 8 * 2**20
+
+# Number of files parsed at the same time by each process of parse_files.
+FILES_PER_WORKER = 2
+
+###############################################################################
+#                                                                             #
+#                                  Blocks                                     #
+#                                                                             #
+###############################################################################
+
+def scan_embedding(file, block_size=BLOCK_SIZE):
+    """Cuts a .t5emb file in blocks of whole lines.
+
+    Only the ends of lines are counted, the values are not parsed.
+
+    Parameters
+    ----------
+    file : str
+        The name of an embedding file.
+
+    block_size : int
+        OPTIONAL, the size of a block in bytes (a block is extended to the
+        end of its last line).
+
+    Returns
+    -------
+    tuple
+        The number of values of the first line, and a list of blocks: the
+        position and the size of each block in the file (in bytes), its
+        first row and its number of rows.
+    """
+
+    columns = None
+    blocks = []
+    offset = 0
+    rows = 0
+
+    with open(file, "rb") as embedding:
+        while True:
+            data = embedding.read(block_size)
+            if not data:
+                break
+            # A block ends at the end of a line.
+            if not data.endswith(b"\n"):
+                data += embedding.readline()
+            if columns is None:
+                columns = len(data.split(b"\n", 1)[0].split())
+            count = data.count(b"\n") + (not data.endswith(b"\n"))
+            blocks.append((offset, len(data), rows, count))
+            offset += len(data)
+            rows += count
+
+    if not columns:
+        raise ValueError(f"{file} does not contain any vector.")
+
+    return columns, blocks
+
+
+def parse_range(file, offset, size, first_row, rows, columns):
+    """Parses a block of lines of a .t5emb file.
+
+    Parameters
+    ----------
+    file : str
+        The name of an embedding file.
+
+    offset : int
+        The position of the block in the file, in bytes.
+
+    size : int
+        The size of the block, in bytes.
+
+    first_row : int
+        The number of the first row of the block, for the errors.
+
+    rows : int
+        The number of lines of the block.
+
+    columns : int
+        The number of values of each line.
+
+    Returns
+    -------
+    array
+        An array containing a vector for each line, in float64.
+    """
+
+    with open(file, "rb") as embedding:
+        embedding.seek(offset)
+        data = embedding.read(size)
+    pr.count("bytes_read", size)
+
+    try:
+        array = np.loadtxt(io.BytesIO(data), dtype=np.float64, ndmin=2)
+    except ValueError as error:
+        raise ValueError(f"{file}, block starting at line {first_row + 1}: "
+                         f"{error}") from None
+
+    if array.shape[1] != columns:
+        raise ValueError(f"{file}: line {first_row + 1} has "
+                         f"{array.shape[1]} values instead of {columns}.")
+    # numpy skips the empty lines, embedding_reader does not accept them.
+    if len(array) != rows:
+        raise ValueError(f"{file}: empty line between lines {first_row + 1} "
+                         f"and {first_row + rows}.")
+
+    return array
+
+
+def run_blocks(function, blocks, arguments, workers=1):
+    """Runs a function on each block, on a pool of processes if workers > 1.
+
+    Parameters
+    ----------
+    function : function
+        The function, called with the block and the arguments.
+
+    blocks : list
+        The blocks, as given by scan_embedding.
+
+    arguments : tuple
+        The other arguments of the function.
+
+    workers : int
+        OPTIONAL, the number of processes. By default, 1 (no pool).
+
+    Returns
+    -------
+    list
+        The result of the function for each block.
+    """
+
+    if workers <= 1 or len(blocks) == 1:
+        return [function(*block, *arguments) for block in blocks]
+
+    with concurrent.futures.ProcessPoolExecutor(
+            min(workers, len(blocks))) as executor:
+        futures = [executor.submit(function, *block, *arguments)
+                   for block in blocks]
+        return [future.result() for future in futures]
+
+###############################################################################
+#                                                                             #
+#                                  Parser                                     #
+#                                                                             #
+###############################################################################
+
+def parse_block(offset, size, first_row, rows, file, columns):
+    """Parses a block in a process of run_blocks (see parse_range)."""
+
+    return parse_range(file, offset, size, first_row, rows, columns)
+
+
+def parse_embedding(file, workers=1, block_size=BLOCK_SIZE):
+    """Transforms a .t5emb file into an array of vectors.
+
+    The result is the one of embedding_reader.
+
+    Parameters
+    ----------
+    file : str
+        The name of an embedding file.
+
+    workers : int
+        OPTIONAL, the number of processes parsing the blocks. By default, 1.
+
+    block_size : int
+        OPTIONAL, the size of a block in bytes.
+
+    Returns
+    -------
+    array
+        An array containing a vector for each residue.
+    """
+
+    columns, blocks = scan_embedding(file, block_size)
+
+    if len(blocks) == 1:
+        return parse_range(file, *blocks[0], columns)
+
+    array = np.empty((sum(block[3] for block in blocks), columns))
+    for (_, _, first_row, rows), values in zip(
+            blocks, run_blocks(parse_block, blocks, (file, columns), workers)):
+        array[first_row:first_row+rows] = values
+
+    return array
+
+
+def fill_block(offset, size, first_row, rows, file, columns, output_file,
+               dtype, scales_file):
+    """Parses a block and writes it in the rows of a binary copy.
+
+    Parameters
+    ----------
+    offset, size, first_row, rows : int
+        The block, as given by scan_embedding.
+
+    file : str
+        The name of the embedding file.
+
+    columns : int
+        The number of values of each line.
+
+    output_file : str
+        The .npy file receiving the values.
+
+    dtype : str
+        The type of the values of the copy.
+
+    scales_file : str
+        The .npy file receiving the scales of an int8 copy, or None.
+    """
+
+    array = parse_range(file, offset, size, first_row, rows, columns)
+
+    # The int8 values have one scale per residue, so the blocks are
+    # quantized separately.
+    if scales_file is not None:
+        array, scales = ep.quantize_int8(array)
+        output = np.load(scales_file, mmap_mode="r+")
+        output[first_row:first_row+rows] = scales
+        output.flush()
+
+    output = np.load(output_file, mmap_mode="r+")
+    output[first_row:first_row+rows] = array.astype(dtype)
+    output.flush()
+
+
+def write_binary_copy(file, cache_file, scales_file=None, dtype="float64",
+                      workers=1, block_size=BLOCK_SIZE):
+    """Writes the binary copy of a .t5emb file, block by block.
+
+    The copy is written under a temporary name and then renamed. The scales
+    of an int8 copy are renamed first, the values file is the last one to
+    appear, as in embedding_reader_cached.
+
+    Parameters
+    ----------
+    file : str
+        The name of an embedding file.
+
+    cache_file : str
+        The .npy file of the copy.
+
+    scales_file : str
+        OPTIONAL, the .npy file of the scales of an int8 copy.
+
+    dtype : str
+        OPTIONAL, the type of the stored values, float64, float32, float16
+        or int8. By default, float64.
+
+    workers : int
+        OPTIONAL, the number of processes parsing the blocks. By default, 1.
+
+    block_size : int
+        OPTIONAL, the size of a block in bytes.
+
+    Returns
+    -------
+    tuple
+        The number of rows and of columns of the copy.
+    """
+
+    columns, blocks = scan_embedding(file, block_size)
+    shape = (sum(block[3] for block in blocks), columns)
+    int8 = np.dtype(dtype) == np.int8
+
+    temporary_file = f"{cache_file}.{os.getpid()}.tmp"
+    temporary_scales = f"{scales_file}.{os.getpid()}.tmp" if int8 else None
+
+    try:
+        # The files are created with their final size, then filled.
+        np.lib.format.open_memmap(temporary_file, "w+", dtype, shape).flush()
+        if int8:
+            np.lib.format.open_memmap(temporary_scales, "w+", np.float32,
+                                      shape[:1]).flush()
+
+        run_blocks(fill_block, blocks,
+                   (file, columns, temporary_file, dtype, temporary_scales),
+                   workers)
+
+        if int8:
+            os.replace(temporary_scales, scales_file)
+        os.replace(temporary_file, cache_file)
+
+    except BaseException:
+        for temporary in (temporary_file, temporary_scales):
+            if temporary is not None and os.path.exists(temporary):
+                os.remove(temporary)
+        raise
+
+    return shape
+
+###############################################################################
+#                                                                             #
+#                                  Files                                      #
+#                                                                             #
+###############################################################################
+
+def parse_files(files, workers=1):
+    """Parses many .t5emb files, one file per process.
+
+    At most FILES_PER_WORKER files per process are parsed in advance, so
+    that only a few arrays are in memory.
+
+    Parameters
+    ----------
+    files : iterable
+        The names of the embedding files.
+
+    workers : int
+        OPTIONAL, the number of processes. By default, 1 (no pool).
+
+    Returns
+    -------
+    generator
+        The array of each file, in the order of the files.
+    """
+
+    if workers <= 1:
+        for file in files:
+            yield parse_embedding(file)
+        return
+
+    files = iter(files)
+
+    with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+        pending = [executor.submit(parse_embedding, file)
+                   for file in itertools.islice(files,
+                                                FILES_PER_WORKER * workers)]
+        while pending:
+            array = pending.pop(0).result()
+            # A new file is started for each file given.
+            for file in files:
+                pending.append(executor.submit(parse_embedding, file))
+                break
+            yield array
+
+
+if __name__ == "__main__":
+
+    # Speed against embedding_reader: python3 embedding_parser.py FILE
+    # [WORKERS]
+    import embedding_reader as er
+
+    embedding_file = sys.argv[1]
+    process_count = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+
+    start = time.perf_counter()
+    expected = er.embedding_reader(embedding_file)
+    reader_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    parsed = parse_embedding(embedding_file, process_count)
+    parser_time = time.perf_counter() - start
+
+    if not np.array_equal(parsed, expected):
+        raise AssertionError("The parser does not give the values of "
+                             "embedding_reader.")
+    print(f"{expected.shape[0]} x {expected.shape[1]} values, "
+          f"{os.path.getsize(embedding_file) / 2**20:.1f} MiB")
+    print(f"embedding_reader\t{reader_time:.3f} s")
+    print(f"embedding_parser\t{parser_time:.3f} s\t"
+          f"{reader_time / parser_time:.1f} x")
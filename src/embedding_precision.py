@@ -0,0 +1,295 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 08:30:32 2026
+
+@author: Jean Delhomme
+
+This file contains five functions :
+    - quantize_int8
+    - as_float
+    - dot_matrix
+    - embedding_bytes
+    - precision_report
+
+Those functions handle embeddings stored with less precision than float64,
+to save memory and disk for large sets of proteins :
+    - float32: 4 bytes per value.
+    - float16: 2 bytes per value.
+    - int8: 1 byte per value, plus one float32 scale per residue. Each
+      vector is divided by its scale (its largest absolute value / 127) and
+      rounded. An int8 embedding is a tuple of the two arrays (values,
+      scales).
+
+dot_matrix computes the dot matrix from embeddings of any of these types,
+in float32 except for two float64 embeddings. float16 values are converted
+to float32 by blocks of rows, as BLAS does not compute in float16. The dot
+products of two int8 embeddings are computed on the integer values in
+float32, which is exact (1024 * 127 * 127 is below 2**24), then multiplied
+by the scales.
+
+precision_report compares the alignment scores of each type with the ones
+of float64, it can be run as a script :
+
+    python3 embedding_precision.py SET [TARGET] [--mode nw|sw|gl]
+                                   [--fasta-dir DIR]
+
+"""
+
+import argparse
+
+import numpy as np
+
+import alignment_score as asc
+
+# Types of the stored embeddings, from the most to the least precise.
+PRECISIONS = ("float64", "float32", "float16", "int8")
+
+# Number of rows converted to float32 at once.
+BLOCK_SIZE = 256
+
+###############################################################################
+#                                                                             #
+#                                Conversion                                   #
+#                                                                             #
+###############################################################################
+
+def quantize_int8(array):
+    """Quantizes an embedding to int8, with one scale per residue.
+
+    Parameters
+    ----------
+    array : array
+        An array containing a vector for each residue.
+
+    Returns
+    -------
+    tuple
+        The int8 values (array) and the float32 scale of each residue
+        (array): the vector of a residue is about values * scale.
+    """
+
+    scales = np.abs(array).max(axis=1, initial=0.0) / 127
+    # A vector of 0s keeps a scale of 1, to avoid dividing by 0.
+    scales[scales == 0] = 1
+    scales = scales.astype(np.float32)
+
+    values = np.rint(array / scales[:, np.newaxis])
+    values = np.clip(values, -127, 127).astype(np.int8)
+
+    return values, scales
+
+
+def as_float(embedding, dtype=np.float32):
+    """Converts an embedding of any type to floats.
+
+    float64 and float32 embeddings are given as they are.
+
+    Parameters
+    ----------
+    embedding : array or tuple
+        An embedding array, or the values and scales of an int8 embedding.
+
+    dtype : type
+        OPTIONAL, the type of float16 and int8 embeddings once converted.
+        By default, float32.
+
+    Returns
+    -------
+    array
+        An array containing a vector for each residue.
+    """
+
+    if isinstance(embedding, tuple):
+        values, scales = embedding
+        return values.astype(dtype) * scales[:, np.newaxis].astype(dtype)
+    if embedding.dtype == np.float16:
+        return embedding.astype(dtype)
+
+    return embedding
+
+
+def embedding_bytes(embedding):
+    """Gives the memory used by an embedding of any type.
+
+    Parameters
+    ----------
+    embedding : array or tuple
+        An embedding array, or the values and scales of an int8 embedding.
+
+    Returns
+    -------
+    int
+        The number of bytes.
+    """
+
+    if isinstance(embedding, tuple):
+        return sum(array.nbytes for array in embedding)
+
+    return embedding.nbytes
+
+###############################################################################
+#                                                                             #
+#                                Dot matrix                                   #
+#                                                                             #
+###############################################################################
+
+def dot_matrix(embedding1, embedding2):
+    """Computes the dot matrix of two embeddings of any type.
+
+    Parameters
+    ----------
+    embedding1 : array or tuple
+        The embedding of the first protein (rows).
+
+    embedding2 : array or tuple
+        The embedding of the second protein (columns).
+
+    Returns
+    -------
+    array
+        An array containing the dot product of each pair of residues, in
+        float64 for two float64 embeddings and in float32 otherwise.
+    """
+
+    # Two int8 embeddings: the dot products of the integer values are exact
+    # in float32.
+    if isinstance(embedding1, tuple) and isinstance(embedding2, tuple):
+        values1, scales1 = embedding1
+        values2, scales2 = embedding2
+        dots = np.dot(values1.astype(np.float32), values2.astype(np.float32).T)
+        dots *= scales1[:, np.newaxis]
+        dots *= scales2[np.newaxis, :]
+        return dots
+
+    if isinstance(embedding1, tuple):
+        embedding1 = as_float(embedding1)
+    if isinstance(embedding2, tuple):
+        embedding2 = as_float(embedding2)
+
+    if embedding1.dtype == np.float64 and embedding2.dtype == np.float64:
+        return np.dot(embedding1, embedding2.T)
+
+    # float16 is converted by blocks of rows, the columns only once.
+    columns = embedding2.astype(np.float32).T
+    dots = np.empty((embedding1.shape[0], embedding2.shape[0]),
+                    dtype=np.float32)
+    for start in range(0, embedding1.shape[0], BLOCK_SIZE):
+        rows = embedding1[start:start+BLOCK_SIZE].astype(np.float32)
+        np.dot(rows, columns, out=dots[start:start+BLOCK_SIZE])
+
+    return dots
+
+###############################################################################
+#                                                                             #
+#                                  Report                                     #
+#                                                                             #
+###############################################################################
+
+def precision_report(pairs, mode="nw", precisions=PRECISIONS[1:]):
+    """Compares the alignment scores of each type with the float64 ones.
+
+    Parameters
+    ----------
+    pairs : iterable
+        Pairs of float64 embedding arrays.
+
+    mode : str
+        OPTIONAL, nw (global), sw (local) or gl (glocal). By default, nw.
+
+    precisions : tuple
+        OPTIONAL, the types to compare. By default, all but float64.
+
+    Returns
+    -------
+    dict
+        For each type: the number of pairs, the largest and the mean
+        absolute difference of the scores, the largest relative difference
+        and the memory used by the embeddings compared to float64.
+    """
+
+    converters = {"float32": lambda array: array.astype(np.float32),
+                  "float16": lambda array: array.astype(np.float16),
+                  "int8": quantize_int8}
+
+    drifts = {precision: [] for precision in precisions}
+    memory = {precision: 0 for precision in precisions}
+    reference_memory = 0
+
+    for embedding1, embedding2 in pairs:
+        reference = asc.alignment_score(np.dot(embedding1, embedding2.T),
+                                        mode)
+        reference_memory += embedding1.nbytes + embedding2.nbytes
+
+        for precision in precisions:
+            stored1 = converters[precision](embedding1)
+            stored2 = converters[precision](embedding2)
+            score = asc.alignment_score(dot_matrix(stored1, stored2), mode)
+            drifts[precision].append((abs(score - reference),
+                                      abs(score - reference)
+                                      / max(abs(reference), 1e-12)))
+            memory[precision] += embedding_bytes(stored1) \
+                + embedding_bytes(stored2)
+
+    report = {}
+    for precision, drift in drifts.items():
+        drift = np.array(drift).reshape(-1, 2)
+        report[precision] = {
+            "pairs": len(drift),
+            "max_abs": float(drift[:, 0].max(initial=0)),
+            "mean_abs": float(drift[:, 0].mean()) if len(drift) else 0.0,
+            "max_rel": float(drift[:, 1].max(initial=0)),
+            "memory": memory[precision] / max(reference_memory, 1)}
+
+    return report
+
+
+if __name__ == "__main__":
+
+    # batch reads the protein sets.
+    import batch as ba
+    import embedding_database as ed
+
+    parser = argparse.ArgumentParser(
+        description="Compares the alignment scores of the reduced precision "
+                    "embeddings with the float64 ones.")
+    parser.add_argument("query",
+                        help="directory, .t5emb file, float64 database or "
+                             "manifest")
+    parser.add_argument("target", nargs="?", default=None,
+                        help="directory, .t5emb file, float64 database or "
+                             "manifest, by default all-vs-all on the query "
+                             "set")
+    parser.add_argument("--mode", choices=["nw", "sw", "gl"], default="nw")
+    parser.add_argument("--fasta-dir", default="../data/fasta/",
+                        help="directory containing the fasta files, or a "
+                             "multi-fasta file")
+    arguments = parser.parse_args()
+
+    query_set = ba.read_protein_set(arguments.query, arguments.fasta_dir)
+    target_set = None
+    if arguments.target is not None:
+        target_set = ba.read_protein_set(arguments.target,
+                                         arguments.fasta_dir)
+
+    # The reference scores need the float64 embeddings, a database keeps the
+    # type it was built with.
+    databases = {embedding_file[0]
+                 for embedding_file, _ in query_set + (target_set or [])
+                 if isinstance(embedding_file, tuple)}
+    for database in sorted(databases):
+        dtype = ed.read_index(database)[0]
+        if dtype != "float64":
+            parser.error(f"{database} stores {dtype} embeddings, the "
+                         f"reference scores need a float64 database.")
+
+    embedding_pairs = ((ba.load_protein(*query)[0],
+                        ba.load_protein(*target)[0])
+                       for query, target in ba.make_pairs(query_set,
+                                                          target_set))
+
+    print("precision\tpairs\tmax_abs\tmean_abs\tmax_rel\tmemory")
+    for name, row in precision_report(embedding_pairs,
+                                      arguments.mode).items():
+        print(f"{name}\t{row['pairs']}\t{row['max_abs']:.3g}\t"
+              f"{row['mean_abs']:.3g}\t{row['max_rel']:.3g}\t"
+              f"{row['memory']:.3f}")
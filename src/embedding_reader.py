@@ -4,12 +4,47 @@ Created on Thu Sep  8 14:44:59 2022
 
 @author: Jean Delhomme
 
-This file contains the function embeding_reader.
+This file contains four functions :
+    - embedding_reader
+    - embedding_cache_path
+    - embedding_reader_cached
+    - build_embedding_cache
+    
+embedding_reader parses a .t5emb text file.
+embedding_reader_cached keeps a binary copy (.npy) of each parsed file, so
+that the text is only parsed once. Later reads are memory-mapped. The copy
+can be stored with less precision (float32, float16 or int8, see
+embedding_precision). It is written by the bulk parser of embedding_parser,
+block by block, with the same values as embedding_reader.
+build_embedding_cache prebuilds the binary copies for a whole directory, on
+several processes, it can also be run as a script :
+
+    python3 embedding_reader.py ../data/emb/ [float64|float32|float16|int8]
+                                [WORKERS]
 
 """
 
+import concurrent.futures
+import hashlib
+import os
+import re
+import sys
+
 import numpy as np
 
+import embedding_parser as ps
+import profiling as pr
+
+# Name of the directory, next to the .t5emb files, containing the binary 
+# copies.
+CACHE_DIRECTORY = ".t5emb_cache"
+
+###############################################################################
+#                                                                             #
+#                             embedding_reader                                #
+#                                                                             #
+###############################################################################
+
 def embedding_reader(file):
     """Transforms a .t5emb file into an array of vectors.
     
@@ -33,6 +68,8 @@ def embedding_reader(file):
     
     # Sequence is the final list containing the vector. We are initiating it.
     sequence = []
+    if pr.ENABLED:
+        pr.count("bytes_read", os.path.getsize(file))
     
     # Opens the file in the function argument.
     with open(file, "r") as embedding:
@@ -49,4 +86,204 @@ def embedding_reader(file):
             sequence.append(vector)
        
     # The function returns sequence as an array.
-    return np.array(sequence)
\ No newline at end of file
+    return np.array(sequence)
+
+###############################################################################
+#                                                                             #
+#                           embedding_cache_path                              #
+#                                                                             #
+###############################################################################
+
+def embedding_cache_path(file, cache_dir=None, dtype="float64"):
+    """Gives the path of the binary copy of a .t5emb file.
+    
+    The name of the binary copy contains a key built from the absolute path
+    (its first 8 digits), then from the size and the modification time of
+    the .t5emb file. A modified file thus gets a new binary copy instead of
+    an outdated one, and the copies of files with the same name in other
+    directories have other keys.
+
+    Parameters
+    ----------
+    file : str 
+        The name of an embedding file.
+        
+    cache_dir : str
+        OPTIONAL, the directory containing the binary copies.
+        By default, a .t5emb_cache directory next to the embedding file.
+        
+    dtype : str
+        OPTIONAL, the type of the stored values, float64, float32, float16
+        or int8. By default, float64 (same values as embedding_reader).
+
+    Returns
+    -------
+    str
+        The path of the binary copy.
+    """
+    
+    # By default, the binary copies are stored next to the embedding files.
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(file)), 
+                                 CACHE_DIRECTORY)
+    
+    # The key identifies the file, then its content without reading it.
+    status = os.stat(file)
+    path = os.path.abspath(file)
+    identity = f"{path}|{status.st_size}|{status.st_mtime_ns}"
+    key = hashlib.sha1(path.encode()).hexdigest()[:8] \
+        + hashlib.sha1(identity.encode()).hexdigest()[:8]
+    
+    stem = os.path.splitext(os.path.basename(file))[0]
+    
+    return os.path.join(cache_dir, f"{stem}.{key}.{np.dtype(dtype).name}.npy")
+
+###############################################################################
+#                                                                             #
+#                          embedding_reader_cached                            #
+#                                                                             #
+###############################################################################
+
+def embedding_reader_cached(file, cache_dir=None, dtype="float64", 
+                            workers=1):
+    """Transforms a .t5emb file into an array of vectors, using a binary copy.
+    
+    The first call parses the text file with embedding_parser and saves the 
+    array as a .npy file. The next calls load this .npy file as a read-only 
+    memory map: no parsing and no copy, the values are read from the disk
+    when they are used.
+
+    Parameters
+    ----------
+    file : str 
+        The name of an embedding file.
+        
+    cache_dir : str
+        OPTIONAL, the directory containing the binary copies.
+        By default, a .t5emb_cache directory next to the embedding file.
+        
+    dtype : str
+        OPTIONAL, the type of the stored values, float64, float32, float16
+        or int8. By default, float64 (same values as embedding_reader).
+        
+    workers : int
+        OPTIONAL, the number of processes parsing the blocks of the file
+        when the copy is created. By default, 1.
+
+    Returns
+    -------
+    memmap or tuple
+        A read-only array containing a vector for each residue. For int8,
+        a tuple of the values and of the scale of each residue (see
+        embedding_precision), the scales being stored in a second file 
+        (.scales.npy).
+    """
+    
+    cache_file = embedding_cache_path(file, cache_dir, dtype)
+    scales_file = cache_file[:-len(".npy")] + ".scales.npy"
+    
+    # The binary copy is created on the first read only.
+    if not os.path.exists(cache_file):
+        
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        
+        # Removes the outdated copies of the same file (same name and same
+        # path key), with the same type. The current copy may have been
+        # written by another process in the meantime, it is kept, and a
+        # copy may be removed by another process at the same time.
+        stem = os.path.splitext(os.path.basename(file))[0]
+        path_key = os.path.basename(cache_file)[len(stem)+1:][:8]
+        outdated = re.compile(re.escape(f"{stem}.{path_key}") 
+                              + r"[0-9a-f]{8}\." + np.dtype(dtype).name 
+                              + r"(\.scales)?\.npy")
+        current = {os.path.basename(cache_file), 
+                   os.path.basename(scales_file)}
+        for old_file in os.listdir(os.path.dirname(cache_file)):
+            if outdated.fullmatch(old_file) and old_file not in current:
+                try:
+                    os.remove(os.path.join(os.path.dirname(cache_file), 
+                                           old_file))
+                except FileNotFoundError:
+                    pass
+        
+        # The copy is written under a temporary name and then renamed, so 
+        # that a process reading it at the same time never sees half a file.
+        # The scales of an int8 copy are written first: the values file is
+        # the last one to appear. The blocks of the text are parsed and 
+        # written one after the other, the whole array is never in memory.
+        ps.write_binary_copy(file, cache_file, scales_file, dtype, workers)
+    
+    # The values of the copy are read when they are used, by the dot 
+    # product.
+    if pr.ENABLED:
+        pr.count("bytes_read", os.path.getsize(cache_file))
+    
+    if np.dtype(dtype) == np.int8:
+        return (np.load(cache_file, mmap_mode="r"), 
+                np.load(scales_file, mmap_mode="r"))
+    
+    return np.load(cache_file, mmap_mode="r")
+
+###############################################################################
+#                                                                             #
+#                          build_embedding_cache                              #
+#                                                                             #
+###############################################################################
+
+def build_embedding_cache(directory, cache_dir=None, dtype="float64", 
+                          workers=1):
+    """Creates the binary copies of all the .t5emb files of a directory.
+    
+    With several workers, the files are spread on the processes, or the 
+    blocks of each file when there are fewer files than processes.
+
+    Parameters
+    ----------
+    directory : str 
+        The directory containing the embedding files.
+        
+    cache_dir : str
+        OPTIONAL, the directory containing the binary copies.
+        By default, a .t5emb_cache directory next to the embedding files.
+        
+    dtype : str
+        OPTIONAL, the type of the stored values, float64, float32, float16
+        or int8. By default, float64.
+        
+    workers : int
+        OPTIONAL, the number of processes. By default, 1.
+
+    Returns
+    -------
+    list
+        A list of strings containing the path of each binary copy.
+    """
+    
+    files = [os.path.join(directory, name) 
+             for name in sorted(os.listdir(directory)) 
+             if name.endswith(".t5emb")]
+    
+    # Reading a file creates its binary copy if needed.
+    if workers > 1 and len(files) >= workers:
+        with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+            for future in [executor.submit(embedding_reader_cached, file, 
+                                           cache_dir, dtype) 
+                           for file in files]:
+                future.result()
+    else:
+        for file in files:
+            embedding_reader_cached(file, cache_dir, dtype, workers)
+    
+    return [embedding_cache_path(file, cache_dir, dtype) for file in files]
+
+
+if __name__ == "__main__":
+    
+    # argv[1] is the directory containing the embedding files, argv[2] the
+    # optional type of the stored values and argv[3] the optional number of
+    # processes.
+    data_type = sys.argv[2] if len(sys.argv) > 2 else "float64"
+    process_count = int(sys.argv[3]) if len(sys.argv) > 3 else os.cpu_count()
+    for path in build_embedding_cache(sys.argv[1], dtype=data_type, 
+                                      workers=process_count):
+        print(path)
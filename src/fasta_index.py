@@ -0,0 +1,343 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 08:43:16 2026
+
+@author: Jean Delhomme
+
+This file contains the functions of the multi-fasta files :
+    - index_fasta, write_index, read_fasta_index, load_index
+    - find_record
+    - fetch_sequence
+    - iter_records
+
+fasta_reader and fasta_name read a file holding a single protein. A
+multi-fasta file holds many proteins (records), each one starting with a
+header line ">NAME description". The name of a record is the first word of
+its header.
+
+index_fasta reads a multi-fasta file once and gives, for each record, where
+its sequence starts in the file. The index is saved next to the file, as a
+.fai file (the format of samtools faidx): one line per record with its name,
+its number of residues, the position of its first residue in the file (in
+bytes), the number of residues of each line and the number of bytes of each
+line, separated by tabulations. All the lines of a record but its last one
+must have the same length.
+
+With the index, fetch_sequence reads a record directly, with a single seek,
+without reading the rest of the file. iter_records reads the records one
+after the other, keeping only one in memory.
+
+A file is indexed with :
+
+    python3 fasta_index.py FILE [NAME ...]
+
+which also prints the sequence of the records NAME.
+
+"""
+
+import argparse
+import functools
+import os
+
+import profiling as pr
+
+# Extension of the index of a multi-fasta file.
+INDEX_EXTENSION = ".fai"
+
+###############################################################################
+#                                                                             #
+#                                  Index                                      #
+#                                                                             #
+###############################################################################
+
+def index_fasta(fasta_file):
+    """Indexes the records of a multi-fasta file, in a single pass.
+
+    Parameters
+    ----------
+    fasta_file : str
+        The name of a multi-fasta file.
+
+    Returns
+    -------
+    dict
+        For the name of each record, in the order of the file: its number of
+        residues, the position of its first residue, the number of residues
+        of each line and the number of bytes of each line (with the end of
+        line).
+    """
+
+    records = {}
+    name = None
+    offset = 0
+
+    # The file is read in bytes, to count the positions exactly.
+    with open(fasta_file, "rb") as fasta:
+        for line in fasta:
+
+            if line.startswith(b">"):
+                words = line[1:].split()
+                name = words[0].decode() if words else ""
+                if name in records:
+                    raise ValueError(f"Two records are named {name} in "
+                                     f"{fasta_file}.")
+                # Number of residues, first residue, residues and bytes of a
+                # line, last line found.
+                records[name] = [0, offset + len(line), 0, 0, False]
+
+            elif name is not None:
+                record = records[name]
+                residues = len(line.rstrip(b"\r\n"))
+                if residues:
+                    # Only the last line can be shorter than the others.
+                    if record[4] or (record[2] and residues > record[2]):
+                        raise ValueError(f"The lines of {name} do not all "
+                                         f"have the same length in "
+                                         f"{fasta_file}.")
+                    if not record[2]:
+                        record[2], record[3] = residues, len(line)
+                    elif residues < record[2] or len(line) != record[3]:
+                        record[4] = True
+                    record[0] += residues
+                else:
+                    record[4] = True
+
+            offset += len(line)
+
+    return {name: tuple(record[:4]) for name, record in records.items()}
+
+
+def write_index(records, fasta_file):
+    """Saves the index of a multi-fasta file in FILE.fai.
+
+    The index is written under a temporary name and then renamed.
+
+    Parameters
+    ----------
+    records : dict
+        The index, as given by index_fasta.
+
+    fasta_file : str
+        The name of the multi-fasta file.
+    """
+
+    index_file = fasta_file + INDEX_EXTENSION
+    temporary_index = f"{index_file}.{os.getpid()}.tmp"
+
+    with open(temporary_index, "w") as index:
+        for name, (length, offset, line_residues, line_bytes) \
+                in records.items():
+            index.write(f"{name}\t{length}\t{offset}\t{line_residues}\t"
+                        f"{line_bytes}\n")
+
+    os.replace(temporary_index, index_file)
+
+
+def read_fasta_index(fasta_file):
+    """Reads the index of a multi-fasta file from FILE.fai.
+
+    Parameters
+    ----------
+    fasta_file : str
+        The name of the multi-fasta file.
+
+    Returns
+    -------
+    dict
+        The index, as given by index_fasta.
+    """
+
+    records = {}
+
+    with open(fasta_file + INDEX_EXTENSION, "r") as index:
+        for line in index:
+            name, *numbers = line.rstrip("\n").split("\t")
+            records[name] = tuple(int(number) for number in numbers[:4])
+
+    return records
+
+
+@functools.lru_cache(maxsize=None)
+def load_index(fasta_file):
+    """Gives the index of a multi-fasta file.
+
+    The .fai file is read if it is newer than the multi-fasta file,
+    otherwise the file is indexed and the .fai file is written (if the
+    directory can be written). The result is kept, so each process reads an
+    index only once.
+
+    Parameters
+    ----------
+    fasta_file : str
+        The name of the multi-fasta file.
+
+    Returns
+    -------
+    dict
+        The index, as given by index_fasta.
+    """
+
+    index_file = fasta_file + INDEX_EXTENSION
+
+    if os.path.exists(index_file) \
+            and os.path.getmtime(index_file) >= os.path.getmtime(fasta_file):
+        return read_fasta_index(fasta_file)
+
+    records = index_fasta(fasta_file)
+    try:
+        write_index(records, fasta_file)
+    except OSError:
+        pass
+
+    return records
+
+
+@functools.lru_cache(maxsize=None)
+def record_names(fasta_file):
+    """Gives the records of a multi-fasta file by their name in lower case.
+
+    For the UniProt names (db|accession|entry), the accession is a name of
+    the record as well.
+
+    Parameters
+    ----------
+    fasta_file : str
+        The name of the multi-fasta file.
+
+    Returns
+    -------
+    dict
+        The name of the record of each lower case name.
+    """
+
+    names = {}
+
+    for name in load_index(fasta_file):
+        fields = name.split("|")
+        if len(fields) > 2:
+            names.setdefault(fields[1].lower(), name)
+        names.setdefault(name.lower(), name)
+
+    return names
+
+
+def find_record(fasta_file, name):
+    """Finds the record of a protein in a multi-fasta file.
+
+    The names are compared ignoring the case, as in batch.find_fasta.
+
+    Parameters
+    ----------
+    fasta_file : str
+        The name of the multi-fasta file.
+
+    name : str
+        The name of the protein, for instance the name of its embedding file
+        without extension.
+
+    Returns
+    -------
+    str
+        The name of the record.
+    """
+
+    if name in load_index(fasta_file):
+        return name
+
+    try:
+        return record_names(fasta_file)[name.lower()]
+    except KeyError:
+        raise FileNotFoundError(f"No fasta record for {name} in "
+                                f"{fasta_file}") from None
+
+###############################################################################
+#                                                                             #
+#                                  Read                                       #
+#                                                                             #
+###############################################################################
+
+def fetch_sequence(fasta_file, name):
+    """Reads the sequence of a record of a multi-fasta file.
+
+    Only the lines of the record are read, after a single seek.
+
+    Parameters
+    ----------
+    fasta_file : str
+        The name of the multi-fasta file.
+
+    name : str
+        The name of the record.
+
+    Returns
+    -------
+    list
+        A list of strings containing the sequence, as given by
+        fasta_reader.
+    """
+
+    length, offset, line_residues, line_bytes = load_index(fasta_file)[name]
+    if length == 0:
+        return []
+
+    # The ends of the lines before the last one are read as well.
+    size = length + (length - 1) // line_residues * (line_bytes
+                                                     - line_residues)
+
+    with open(fasta_file, "rb") as fasta:
+        fasta.seek(offset)
+        data = fasta.read(size)
+    pr.count("bytes_read", size)
+
+    return list(data.translate(None, b"\r\n").decode())
+
+
+def iter_records(fasta_file):
+    """Reads the records of a multi-fasta file one after the other.
+
+    Only one record is in memory at a time, the index is not used.
+
+    Parameters
+    ----------
+    fasta_file : str
+        The name of the multi-fasta file.
+
+    Returns
+    -------
+    generator
+        The name and the sequence (list of strings) of each record.
+    """
+
+    name = None
+    lines = []
+
+    with open(fasta_file, "r") as fasta:
+        for line in fasta:
+            if line.startswith(">"):
+                if name is not None:
+                    yield name, list("".join(lines))
+                words = line[1:].split()
+                name = words[0] if words else ""
+                lines = []
+            elif name is not None:
+                lines.append(line.strip())
+
+    if name is not None:
+        yield name, list("".join(lines))
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(
+        description="Indexes a multi-fasta file and prints some records.")
+    parser.add_argument("fasta", help="multi-fasta file")
+    parser.add_argument("names", nargs="*", help="records to print")
+    arguments = parser.parse_args()
+
+    fasta_records = load_index(arguments.fasta)
+    print(f"{len(fasta_records)} records in {arguments.fasta}")
+
+    for record_name in arguments.names:
+        record = find_record(arguments.fasta, record_name)
+        print(f">{record}")
+        print("".join(fetch_sequence(arguments.fasta, record)))
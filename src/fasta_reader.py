@@ -13,6 +13,10 @@ fasta_reader takes the sequence of a protein from a fasta file.
 
 """
 
+import os
+
+import profiling as pr
+
 ###############################################################################
 #                                                                             #
 #                                fasta_name                                   #
@@ -73,6 +77,8 @@ def fasta_reader(file):
     # sequence will be the fasta sequence in form of a list. We initiating it
     # as an empty string.
     sequence = ""
+    if pr.ENABLED:
+        pr.count("bytes_read", os.path.getsize(file))
     
     # Opens the FASTA file.
     with open(file, "r") as fasta:
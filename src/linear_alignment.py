@@ -0,0 +1,413 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 08:17:15 2026
+
+@author: Jean Delhomme
+
+This file contains two functions :
+    - needleman_wunsch_linear
+    - glocal_linear
+
+Those functions find the same kind of alignments as needleman_wunsch and
+glocal, but in linear memory (Hirschberg's divide and conquer). Neither the
+dot matrix nor the alignment matrix is stored: the rows of the alignment
+matrix are computed on demand from the embeddings, a block of dot products
+at a time, and only the last row is kept.
+
+The scores are the ones of the alignment matrix, up to the rounding of the
+dot products (which are computed by blocks). When several paths give the
+best score, the path returned may differ from the one of the full matrix
+tracebacks.
+
+"""
+
+import numpy as np
+
+import alignment_matrix as am
+
+# Number of rows of dot products computed at once.
+BLOCK_SIZE = 64
+
+# Above this number of cells, a sub-problem is divided again instead of being
+# solved with a full alignment matrix.
+BASE_CELLS = 1 << 16
+
+###############################################################################
+#                                                                             #
+#                                 Rows                                        #
+#                                                                             #
+###############################################################################
+
+def last_row(embedding1, embedding2, block_size=BLOCK_SIZE):
+    """Computes the last row of the Needleman and Wunsch alignment matrix.
+
+    Only two rows and one block of dot products are in memory at a time.
+
+    Parameters
+    ----------
+    embedding1 : array
+        The embedding array of the first protein (rows).
+
+    embedding2 : array
+        The embedding array of the second protein (columns).
+
+    block_size : int
+        OPTIONAL, the number of rows of dot products computed at once.
+
+    Returns
+    -------
+    array
+        The last row of the alignment matrix.
+    """
+
+    # The gap is fixed at 0, so the first row and column are 0s.
+    row = np.zeros(embedding2.shape[0]+1)
+
+    for start in range(0, embedding1.shape[0], block_size):
+
+        # Dot products of a block of rows with all the columns.
+        scores = np.dot(embedding1[start:start+block_size], embedding2.T)
+
+        for score_row in scores:
+            # Same recurrence as alignment_matrix_nw_numpy.
+            new_row = np.empty_like(row)
+            new_row[0] = 0
+            np.maximum(row[:-1] + score_row, row[1:], out=new_row[1:])
+            np.maximum.accumulate(new_row, out=new_row)
+            row = new_row
+
+    return row
+
+
+def best_cell(embedding1, embedding2, block_size=BLOCK_SIZE):
+    """Finds the best cell of the Needleman and Wunsch alignment matrix.
+
+    The rows are computed as in last_row, keeping the position of the
+    maximum. The last maximum found in reading order is kept.
+
+    Parameters
+    ----------
+    embedding1 : array
+        The embedding array of the first protein (rows).
+
+    embedding2 : array
+        The embedding array of the second protein (columns).
+
+    block_size : int
+        OPTIONAL, the number of rows of dot products computed at once.
+
+    Returns
+    -------
+    tuple
+        The row and column of the best cell.
+    """
+
+    row = np.zeros(embedding2.shape[0]+1)
+    best = (0, 0)
+    best_score = 0
+    i = 0
+
+    for start in range(0, embedding1.shape[0], block_size):
+
+        scores = np.dot(embedding1[start:start+block_size], embedding2.T)
+
+        for score_row in scores:
+            new_row = np.empty_like(row)
+            new_row[0] = 0
+            np.maximum(row[:-1] + score_row, row[1:], out=new_row[1:])
+            np.maximum.accumulate(new_row, out=new_row)
+            row = new_row
+            i += 1
+
+            # Last maximum of the row.
+            j = len(row) - 1 - int(np.argmax(row[::-1]))
+            if row[j] >= best_score:
+                best = (i, j)
+                best_score = row[j]
+
+    return best
+
+###############################################################################
+#                                                                             #
+#                              Divide and conquer                             #
+#                                                                             #
+###############################################################################
+
+def small_path(embedding1, embedding2):
+    """Finds the best global path of a small sub-problem.
+
+    The full alignment matrix of the sub-problem is computed, then the path
+    is traced back, preferring the diagonal, then the top, then the left.
+
+    Parameters
+    ----------
+    embedding1 : array
+        The embedding array of the first protein (rows).
+
+    embedding2 : array
+        The embedding array of the second protein (columns).
+
+    Returns
+    -------
+    list
+        A list of moves from the top-left corner: "M" for a pair of residues,
+        "I" for a residue of the first protein against a gap and "D" for a
+        residue of the second protein against a gap.
+    """
+
+    dot_matrix = np.dot(embedding1, embedding2.T)
+    alignment_matrix = am.alignment_matrix_nw_numpy(dot_matrix)
+
+    moves = []
+    i, j = dot_matrix.shape
+
+    while i > 0 and j > 0:
+        if alignment_matrix[i][j] == alignment_matrix[i-1][j-1] \
+                                     + dot_matrix[i-1][j-1]:
+            moves.append("M")
+            i -= 1
+            j -= 1
+        elif alignment_matrix[i][j] == alignment_matrix[i-1][j]:
+            moves.append("I")
+            i -= 1
+        else:
+            moves.append("D")
+            j -= 1
+
+    # The rest of the sequences is aligned against gaps.
+    moves.extend("I" * i)
+    moves.extend("D" * j)
+
+    return moves[::-1]
+
+
+def linear_path(embedding1, embedding2, block_size=BLOCK_SIZE):
+    """Finds the best global path in linear memory.
+
+    The first protein is cut in two halves. The last row of the top half and
+    the last row of the bottom half, read backwards, give the column where
+    the best path crosses the middle row. Both halves are then solved the
+    same way.
+
+    Parameters
+    ----------
+    embedding1 : array
+        The embedding array of the first protein (rows).
+
+    embedding2 : array
+        The embedding array of the second protein (columns).
+
+    block_size : int
+        OPTIONAL, the number of rows of dot products computed at once.
+
+    Returns
+    -------
+    tuple
+        The score of the path and the list of moves (see small_path).
+    """
+
+    seq1_size = embedding1.shape[0]
+    seq2_size = embedding2.shape[0]
+
+    # Empty sequences are aligned against gaps.
+    if seq1_size == 0 or seq2_size == 0:
+        return 0.0, ["I"] * seq1_size + ["D"] * seq2_size
+
+    middle = seq1_size // 2
+
+    # Best scores from the top-left corner to each cell of the middle row,
+    # and from each cell of the middle row to the bottom-right corner.
+    top = last_row(embedding1[:middle], embedding2, block_size)
+    bottom = last_row(embedding1[middle:][::-1], embedding2[::-1],
+                      block_size)[::-1]
+
+    total = top + bottom
+    column = int(np.argmax(total))
+
+    moves = []
+    for part1, part2 in ((embedding1[:middle], embedding2[:column]),
+                         (embedding1[middle:], embedding2[column:])):
+        # Small sub-problems are solved with their full matrix.
+        if part1.shape[0] <= 1 \
+                or (part1.shape[0]+1) * (part2.shape[0]+1) <= BASE_CELLS:
+            moves.extend(small_path(part1, part2))
+        else:
+            moves.extend(linear_path(part1, part2, block_size)[1])
+
+    return total[column], moves
+
+
+def moves_to_alignment(fasta1, fasta2, moves, start1=0, start2=0):
+    """Writes the aligned sequences from a list of moves.
+
+    Parameters
+    ----------
+    fasta1 : list of string
+        A list of string containing the first fasta sequence.
+
+    fasta2 : list of string
+        A list of string containing the second fasta sequence.
+
+    moves : list
+        The list of moves (see small_path).
+
+    start1 : int
+        OPTIONAL, the position of the first move in the first sequence.
+
+    start2 : int
+        OPTIONAL, the position of the first move in the second sequence.
+
+    Returns
+    -------
+    tuple
+        The two aligned sequences (str).
+    """
+
+    result1 = []
+    result2 = []
+    i = start1
+    j = start2
+
+    for move in moves:
+        if move == "M":
+            result1.append(fasta1[i])
+            result2.append(fasta2[j])
+            i += 1
+            j += 1
+        elif move == "I":
+            result1.append(fasta1[i])
+            result2.append("-")
+            i += 1
+        else:
+            result1.append("-")
+            result2.append(fasta2[j])
+            j += 1
+
+    return "".join(result1), "".join(result2)
+
+###############################################################################
+#                                                                             #
+#                           Needleman and Wunsch                              #
+#                                                                             #
+###############################################################################
+
+def needleman_wunsch_linear(embedding1, embedding2, fasta1, fasta2,
+                            block_size=BLOCK_SIZE):
+    """Performs a global alignment in linear memory.
+
+    Parameters
+    ----------
+    embedding1 : array
+        The embedding array of the first protein.
+
+    embedding2 : array
+        The embedding array of the second protein.
+
+    fasta1 : list of string
+        A list of string containing the first fasta sequence.
+
+    fasta2 : list of string
+        A list of string containing the second fasta sequence.
+
+    block_size : int
+        OPTIONAL, the number of rows of dot products computed at once.
+
+    Returns
+    -------
+    tuple
+        The alignment score, the two aligned sequences (str) and the cells of
+        the path, as needleman_wunsch_alignment.
+    """
+
+    alignment_score, moves = linear_path(embedding1, embedding2, block_size)
+    result1, result2 = moves_to_alignment(fasta1, fasta2, moves)
+
+    return (alignment_score, result1, result2,
+            ((0, 0), (len(embedding1), len(embedding2))))
+
+###############################################################################
+#                                                                             #
+#                                   Glocal                                    #
+#                                                                             #
+###############################################################################
+
+def glocal_linear(embedding1, embedding2, fasta1, fasta2,
+                  block_size=BLOCK_SIZE):
+    """Performs a glocal alignment in linear memory.
+
+    As in glocal, there is one alignment for each maximum of the last column
+    of the Smith and Waterman matrix, starting from the last one. For each
+    of them, the start of the alignment is found with a backward pass, the
+    path between the start and the end is found with linear_path, and the
+    path is completed to the first column with gaps.
+
+    Parameters
+    ----------
+    embedding1 : array
+        The embedding array of the first protein.
+
+    embedding2 : array
+        The embedding array of the second protein.
+
+    fasta1 : list of string
+        A list of string containing the first fasta sequence.
+
+    fasta2 : list of string
+        A list of string containing the second fasta sequence.
+
+    block_size : int
+        OPTIONAL, the number of rows of dot products computed at once.
+
+    Returns
+    -------
+    list
+        A list of tuples, the alignment score, the two aligned sequences
+        (str) and the cells of the path of each alignment, as
+        glocal_alignments.
+    """
+
+    seq2_size = embedding2.shape[0]
+
+    # Forward pass keeping only the last column of each row of the Smith and
+    # Waterman matrix.
+    last_column = [0.0]
+    row = np.zeros(seq2_size+1)
+    for start in range(0, embedding1.shape[0], block_size):
+        scores = np.dot(embedding1[start:start+block_size], embedding2.T)
+        for score_row in scores:
+            new_row = np.empty_like(row)
+            new_row[0] = 0
+            np.maximum(row[:-1] + score_row, row[1:], out=new_row[1:])
+            # In Smith and Waterman, the maximum needs to be > 0.
+            np.maximum(new_row[1:], 0, out=new_row[1:])
+            np.maximum.accumulate(new_row, out=new_row)
+            row = new_row
+            last_column.append(row[-1])
+    last_column = np.array(last_column)
+
+    # The maximums of the last column, from the last one, as in glocal.
+    ends = np.where(last_column == np.amax(last_column))[0][::-1]
+
+    alignments = []
+
+    for end in ends:
+
+        # The start of the local path is the best cell of the matrix of the
+        # reversed sequences, starting from the end.
+        back_i, back_j = best_cell(embedding1[:end][::-1],
+                                   embedding2[::-1], block_size)
+        start1 = end - back_i
+        start2 = seq2_size - back_j
+
+        _, moves = linear_path(embedding1[start1:end], embedding2[start2:],
+                               block_size)
+
+        # The path is completed to the first column with gaps.
+        result1, result2 = moves_to_alignment(fasta1, fasta2,
+                                              ["D"] * start2 + moves,
+                                              start1, 0)
+
+        alignments.append((last_column[end], result1, result2,
+                           ((int(start1), 0), (int(end), seq2_size))))
+
+    return alignments
@@ -33,12 +33,46 @@ argv[5] : str
     nw : Needleman and Wunsch (global).
     sw : Smith and Waterman (local).
     gl : Glocal.    
+    Several modes can be given, separated by commas (nw,sw,gl), or all for 
+    the three of them: the dot matrix and each alignment matrix are then 
+    only computed once (see matrix_cache). The modes an engine does not 
+    offer are skipped, with a warning.
+
+argv[6] : str
+    OPTIONAL, the name of the engine filling the alignment matrix.
+    By default, numpy.
+    
+    numpy : the matrix is filled one row at a time with array operations.
+    python : the matrix is filled cell by cell (original version).
+    blocked : the matrix is filled by tiles, on all the cores.
+    The three engines give exactly the same alignment matrix.
+    linear : no matrix is stored, the alignment is found in linear memory 
+    (nw and gl only).
+    directions : only the moves of the traceback are stored (one byte per 
+    cell), the alignment is the same as with numpy.
+    banded : only a band around the diagonal is computed, for closely 
+    related proteins of similar sizes (nw only).
+    tiled : the dot products are computed by tiles during the fill, and 
+    only the moves of the traceback are stored.
+    seed : the matrix is only filled in small windows around the best 
+    diagonals of high dot products, as in BLAST (sw only).
+
+argv[7] : str
+    OPTIONAL, a result file shared by several runs: the alignments are added
+    at its end, as tab separated lines (.tsv), JSON lines (.jsonl) or text
+    (.txt), see result_writer. By default, each mode has its own text file
+    in the result repository.
+
+--profile FILE, --profile-hook cprofile|sample
+    OPTIONAL, anywhere in the arguments: writes a JSON report of the time of
+    each stage, the counters and the memory of the run in FILE, as the
+    environment variable EMBEDDING_PROFILE=FILE (see profiling).
 
 Returns
 -------
 file.txt
     A text file containing the alignment result. The file is created in the
-    result repository.
+    result repository, replacing the one of a previous run of the same pair.
 
 """
 
@@ -53,6 +87,10 @@ import fasta_reader as fr
 # Importation of the modules used for the alignment.
 import alignment_matrix as am
 import alignment_algorithm as aa
+import batch as ba
+import matrix_cache as mc
+import result_writer as rw
+import profiling as pr
 
 
 
@@ -64,6 +102,9 @@ if __name__ == "__main__":
 #                                                                             #
 ###############################################################################
 
+    # The profiling options are taken out of the arguments.
+    sys.argv = pr.parse_flags(sys.argv)
+    
     # Variables for the path of the data files.
     path_embedding = "../data/emb/"
     path_fasta = "../data/fasta/"
@@ -74,13 +115,54 @@ if __name__ == "__main__":
     embedding_file2 = path_embedding + sys.argv[3]
     fasta_file2 = path_fasta + sys.argv[4]
     
+    # Variables for the alignment modes, several modes are separated by 
+    # commas.
+    mode = sys.argv[5] if len(sys.argv) > 5 else "nw"
+    modes = list(aa.KINDS) if mode == "all" else mode.split(",")
+    for name in modes:
+        if name not in aa.KINDS:
+            sys.exit(f"Unknown mode {name}, use nw, sw, gl or all.")
+    
+    # Variable for the engine filling the alignment matrix.
+    engine = sys.argv[6] if len(sys.argv) > 6 else "numpy"
+    if engine not in ba.ENGINE_NAMES:
+        sys.exit(f"Unknown engine {engine}, use one of: "
+                 f"{', '.join(ba.ENGINE_NAMES)}.")
+    
+    # The engines only available for some modes skip the other ones.
+    engine_modes = {"linear": ["nw", "gl"], "banded": ["nw"], 
+                    "seed": ["sw"]}.get(engine, modes)
+    skipped = [name for name in modes if name not in engine_modes]
+    if skipped == modes:
+        sys.exit(f"The {engine} engine is only available for "
+                 f"{' and '.join(engine_modes)}.")
+    if skipped:
+        print(f"The {engine} engine is only available for "
+              f"{' and '.join(engine_modes)}, {', '.join(skipped)} skipped.",
+              file=sys.stderr)
+        modes = [name for name in modes if name not in skipped]
+    if engine == "batched":
+        sys.exit("The batched engine only computes scores, use batch.py "
+                 "--score-only.")
+    
+    # Variable for a result file shared by several runs.
+    output_file = sys.argv[7] if len(sys.argv) > 7 else None
+    if output_file is not None and rw.path_format(output_file) == "npz":
+        sys.exit("The results of several runs cannot be added to an npz "
+                 "file, use .tsv, .jsonl or .txt.")
+    
     # Creation of embedding array for each protein.
-    embedding1 = er.embedding_reader(embedding_file1)
-    embedding2 = er.embedding_reader(embedding_file2)
+    # The text files are parsed once, then read from their binary copies.
+    with pr.stage("embedding_reader"):
+        embedding1 = er.embedding_reader_cached(embedding_file1)
+        embedding2 = er.embedding_reader_cached(embedding_file2)
     
     # Creation of fasta sequences for each protein.
-    fasta1 = fr.fasta_reader(fasta_file1)
-    fasta2 = fr.fasta_reader(fasta_file2)
+    with pr.stage("fasta_reader"):
+        fasta1 = fr.fasta_reader(fasta_file1)
+        fasta2 = fr.fasta_reader(fasta_file2)
+    pr.count("pairs")
+    pr.count("cells", len(fasta1) * len(fasta2))
     
     # Creation of names for each protein.
     prot_name1 = fr.fasta_name(fasta_file1)
@@ -88,7 +170,11 @@ if __name__ == "__main__":
     
     # Calculation of the dot_product between each embedding at each position
     # and construction of an array with those dot_products.
-    dot_matrix = np.dot(embedding1, embedding2.T)
+    # The other engines compute them themselves, as align_modes.
+    if engine in am.ENGINES and len(modes) == 1:
+        with pr.stage("dot_matrix"):
+            dot_matrix = pr.array("dot_matrix", 
+                                  np.dot(embedding1, embedding2.T))
   
 ###############################################################################
 #                                                                             #
@@ -96,28 +182,79 @@ if __name__ == "__main__":
 #                                                                             #
 ###############################################################################
     
+    # Several modes share the dot matrix and the alignment matrices.
+    if len(modes) > 1 and engine in am.ENGINES:
+        
+        results = mc.align_modes(embedding1, embedding2, fasta1, fasta2, 
+                                 modes, engine)
+    
+    # The other engines do not use the full alignment matrix, the alignments
+    # are found by batch.align.
+    elif engine not in am.ENGINES:
+        
+        results = {mode: ba.align(embedding1, embedding2, fasta1, fasta2, 
+                                  mode, engine)
+                   for mode in modes}
+    
     # For Needleman and Wunsch (global alignment).
-    if len(sys.argv) < 6 or sys.argv[5] == "nw":
+    elif mode == "nw":
         
         # Produces the alignment matrix needed to find the best path.
-        alignment_matrix = am.alignment_matrix_nw(dot_matrix) 
+        with pr.stage("fill_nw", cells=dot_matrix.size):
+            alignment_matrix = pr.array("alignment_matrix", 
+                                        am.ENGINES[engine]["nw"](dot_matrix))
         # Finds the best path and thus, the sequence alignment.
-        aa.needleman_wunsch(fasta1, fasta2, prot_name1, prot_name2, \
-                            alignment_matrix)
+        with pr.stage("traceback_nw"):
+            results = {mode: [aa.needleman_wunsch_alignment(
+                fasta1, fasta2, alignment_matrix)]}
 
     # For Smith and Waterman (local alignment).
-    elif sys.argv[5] == "sw":
+    elif mode == "sw":
         
         # Produces the alignment matrix needed to find the best path.
-        alignment_matrix = am.alignment_matrix_sw(dot_matrix)  
+        with pr.stage("fill_sw", cells=dot_matrix.size):
+            alignment_matrix = pr.array("alignment_matrix", 
+                                        am.ENGINES[engine]["sw"](dot_matrix))
         # Finds the best path and thus, the sequence alignment.
-        aa.smith_waterman(fasta1, fasta2, prot_name1, prot_name2, \
-                            alignment_matrix)
+        with pr.stage("traceback_sw"):
+            results = {mode: aa.smith_waterman_alignments(fasta1, fasta2, 
+                                                          alignment_matrix)}
     
     # For a glocal alignment.
-    elif sys.argv[5] == "gl":
+    elif mode == "gl":
         
         # Produces the alignment matrix needed to find the best path.
-        alignment_matrix = am.alignment_matrix_sw(dot_matrix)  
+        with pr.stage("fill_sw", cells=dot_matrix.size):
+            alignment_matrix = pr.array("alignment_matrix", 
+                                        am.ENGINES[engine]["sw"](dot_matrix))
         # Finds the best path and thus, the sequence alignment.
-        aa.glocal(fasta1, fasta2, prot_name1, prot_name2, alignment_matrix)
\ No newline at end of file
+        with pr.stage("traceback_gl"):
+            results = {mode: aa.glocal_alignments(fasta1, fasta2, 
+                                                  alignment_matrix)}
+
+###############################################################################
+#                                                                             #
+#                                  results                                    #
+#                                                                             #
+###############################################################################
+
+    pr.count("traceback_steps", sum(len(result1) 
+                                    for alignments in results.values() 
+                                    for _, result1, _, _ in alignments))
+
+    # The alignments are added to a result file shared by several runs.
+    if output_file is not None:
+        
+        with rw.ResultWriter(output_file, append=True) as writer:
+            for mode, alignments in results.items():
+                writer.write(rw.alignment_records(prot_name1, prot_name2, 
+                                                  mode, alignments, fasta1, 
+                                                  fasta2))
+    
+    # Creates a text file for each mode as output and writes the results in 
+    # it, replacing the results of a previous run.
+    else:
+        
+        for mode, alignments in results.items():
+            aa.write_alignments(aa.KINDS[mode], prot_name1, prot_name2, 
+                                alignments, "w")
@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 08:41:34 2026
+
+@author: Jean Delhomme
+
+This file contains the memoization of the alignments :
+    - content_hash
+    - MatrixCache
+    - align_modes
+
+The three modes of a pair share most of their work: the dot matrix is the
+same for nw, sw and gl, and sw and gl both trace back the Smith and Waterman
+matrix. align_modes computes the dot matrix once, each alignment matrix
+once, and traces back each mode from them.
+
+The results are kept in a MatrixCache, keyed on the content of the
+embeddings (see content_hash), not on the names of the files: the same pair
+aligned again in a session (by the alignment server, or by main.py with
+several modes) is not computed again. The cache keeps the results used last,
+up to a number of bytes.
+
+"""
+
+import collections
+import hashlib
+
+import numpy as np
+
+import alignment_matrix as am
+import alignment_algorithm as aa
+import embedding_precision as ep
+import profiling as pr
+
+# Default size of a cache, in bytes.
+MAX_BYTES = 512 * 2**20
+
+###############################################################################
+#                                                                             #
+#                                  Cache                                      #
+#                                                                             #
+###############################################################################
+
+def content_hash(embedding):
+    """Computes a hash of the content of an embedding.
+
+    Two embeddings with the same type, shape and values have the same hash,
+    whatever the file they were read from.
+
+    Parameters
+    ----------
+    embedding : array or tuple
+        An embedding array, or the values and scales of an int8 embedding.
+
+    Returns
+    -------
+    str
+        The hash (32 hexadecimal digits).
+    """
+
+    digest = hashlib.blake2b(digest_size=16)
+    arrays = embedding if isinstance(embedding, tuple) else (embedding,)
+
+    for array in arrays:
+        digest.update(f"{array.dtype.str}{array.shape}".encode())
+        digest.update(np.ascontiguousarray(array).data)
+
+    return digest.hexdigest()
+
+
+class MatrixCache:
+    """Keeps the matrices and alignments used last, up to a number of bytes.
+
+    Parameters
+    ----------
+    max_bytes : int
+        OPTIONAL, the size of the cache. By default, 512 MiB.
+    """
+
+    def __init__(self, max_bytes=MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.entries = collections.OrderedDict()
+
+    def get(self, key, compute):
+        """Gives the value of a key, computing it if it is not kept.
+
+        The arrays kept are read-only, as they are shared by all the users
+        of the cache.
+
+        Parameters
+        ----------
+        key : tuple
+            The key of the value.
+
+        compute : function
+            Computes the value, called without arguments.
+
+        Returns
+        -------
+        object
+            The value.
+        """
+
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key][0]
+
+        self.misses += 1
+        value = compute()
+        if isinstance(value, np.ndarray):
+            value.setflags(write=False)
+        size = value_bytes(value)
+
+        # A value larger than the cache is not kept.
+        if size <= self.max_bytes:
+            self.entries[key] = (value, size)
+            self.size += size
+            # The values used last are kept.
+            while self.size > self.max_bytes:
+                _, (_, removed) = self.entries.popitem(last=False)
+                self.size -= removed
+
+        return value
+
+    def info(self):
+        """Gives the statistics of the cache.
+
+        Returns
+        -------
+        dict
+            The number of hits and misses, of values kept and of bytes used.
+        """
+
+        return {"hits": self.hits, "misses": self.misses,
+                "entries": len(self.entries), "bytes": self.size,
+                "max_bytes": self.max_bytes}
+
+
+def value_bytes(value):
+    """Gives the approximate memory used by a value of the cache.
+
+    Parameters
+    ----------
+    value : array or list
+        A matrix, or a list of alignments.
+
+    Returns
+    -------
+    int
+        The number of bytes.
+    """
+
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+
+    return sum(len(result1) + len(result2) + 40
+               for _, result1, result2, _ in value)
+
+
+# Cache of the process.
+CACHE = MatrixCache()
+
+###############################################################################
+#                                                                             #
+#                                  Modes                                      #
+#                                                                             #
+###############################################################################
+
+def align_modes(embedding1, embedding2, fasta1, fasta2,
+                modes=("nw", "sw", "gl"), engine="numpy", cache=None):
+    """Aligns two proteins in several modes, sharing the matrices.
+
+    The alignments are the same as the ones of batch.align with each mode.
+
+    Parameters
+    ----------
+    embedding1 : array
+        The embedding array of the first protein.
+
+    embedding2 : array
+        The embedding array of the second protein.
+
+    fasta1 : list of string
+        A list of string containing the first fasta sequence.
+
+    fasta2 : list of string
+        A list of string containing the second fasta sequence.
+
+    modes : tuple
+        OPTIONAL, the modes: nw (global), sw (local) and/or gl (glocal). By
+        default, the three of them.
+
+    engine : str
+        OPTIONAL, an engine of alignment_matrix (numpy, python or blocked),
+        they all give the same alignment matrix. By default, numpy.
+
+    cache : MatrixCache
+        OPTIONAL, the cache of the results. By default, the cache of the
+        process.
+
+    Returns
+    -------
+    dict
+        The alignments of each mode: a list of tuples, the alignment score,
+        the two aligned sequences (str) and the cells of the path of each
+        alignment.
+    """
+
+    cache = cache or CACHE
+    pair = (content_hash(embedding1), content_hash(embedding2))
+    sequences = ("".join(fasta1), "".join(fasta2))
+
+    # Calculation of the dot_product between each embedding at each position
+    # (in float32 for reduced precision embeddings), only if a matrix is
+    # needed.
+    def dots():
+        def compute():
+            with pr.stage("dot_matrix"):
+                return pr.array("dot_matrix",
+                                ep.dot_matrix(embedding1, embedding2))
+        return cache.get(pair + ("dot",), compute)
+
+    # nw uses the Needleman and Wunsch matrix, sw and gl the Smith and
+    # Waterman one, filled only once.
+    def matrix(kind):
+        def compute():
+            dot_matrix = dots()
+            with pr.stage(f"fill_{kind}", cells=dot_matrix.size):
+                return pr.array("alignment_matrix",
+                                am.ENGINES[engine][kind](dot_matrix))
+        return cache.get(pair + (kind,), compute)
+
+    tracebacks = {"nw": lambda alignment_matrix: [
+                      aa.needleman_wunsch_alignment(fasta1, fasta2,
+                                                    alignment_matrix)],
+                  "sw": lambda alignment_matrix: aa.smith_waterman_alignments(
+                      fasta1, fasta2, alignment_matrix),
+                  "gl": lambda alignment_matrix: aa.glocal_alignments(
+                      fasta1, fasta2, alignment_matrix)}
+
+    def traceback(mode):
+        alignment_matrix = matrix("nw" if mode == "nw" else "sw")
+        with pr.stage(f"traceback_{mode}"):
+            return tracebacks[mode](alignment_matrix)
+
+    return {mode: cache.get(pair + sequences + (mode,),
+                            lambda: traceback(mode))
+            for mode in modes}
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 08:57:01 2026
+
+@author: Jean Delhomme
+
+This file contains the prefetching of the proteins :
+    - prefetch
+    - read_embedding
+    - load_pair
+
+A loop over pairs is sequential: the proteins of a pair are read from the
+disk and parsed, then aligned, then the proteins of the next pair are read.
+The disk is idle during the alignment, and the processor during the reading.
+
+prefetch loads the next items of a loop on threads while the current one is
+used: the proteins of the next pairs are read (their fasta files parsed and
+their embeddings read in memory, instead of being read page by page during
+the dot product) while the current pair is aligned. The loads are given in
+the order of the items, and at most depth of them are loaded in advance: a
+slow consumer stops the loaders (backpressure), so the memory used by the
+proteins waiting stays bounded.
+
+The results are written by a third stage, the writer thread of
+result_writer, fed by a bounded queue as well.
+
+"""
+
+import collections
+import concurrent.futures
+import itertools
+
+import numpy as np
+
+import profiling as pr
+
+# Number of items loaded in advance.
+DEPTH = 4
+
+# Number of loader threads.
+THREADS = 1
+
+###############################################################################
+#                                                                             #
+#                                 Prefetch                                    #
+#                                                                             #
+###############################################################################
+
+def prefetch(items, load, depth=DEPTH, threads=THREADS):
+    """Loads the next items on threads while the current one is used.
+
+    The items are taken from the iterable by the consumer thread only, so
+    a generator does not need to be thread safe.
+
+    Parameters
+    ----------
+    items : iterable
+        The items.
+
+    load : function
+        Loads an item, called with the item on a loader thread.
+
+    depth : int
+        OPTIONAL, the largest number of items loaded in advance. 0 loads
+        each item when it is used, without thread. By default, 4.
+
+    threads : int
+        OPTIONAL, the number of loader threads. By default, 1.
+
+    Returns
+    -------
+    generator
+        The item and its load, in the order of the items. An error of a
+        load is raised when its item is reached.
+    """
+
+    if depth <= 0:
+        for item in items:
+            yield item, load(item)
+        return
+
+    items = iter(items)
+
+    with concurrent.futures.ThreadPoolExecutor(threads) as executor:
+        pending = collections.deque(
+            (item, executor.submit(load, item))
+            for item in itertools.islice(items, depth))
+
+        try:
+            while pending:
+                item, future = pending.popleft()
+                # A new load starts for each load used.
+                for next_item in itertools.islice(items, 1):
+                    pending.append((next_item,
+                                    executor.submit(load, next_item)))
+                # Time spent waiting for the loaders.
+                with pr.stage("prefetch_wait"):
+                    loaded = future.result()
+                yield item, loaded
+
+        # The loads not started are cancelled when the loop is left early.
+        finally:
+            for _, future in pending:
+                future.cancel()
+
+
+def read_embedding(embedding):
+    """Reads a memory-mapped embedding in memory.
+
+    The values are the same, only read from the disk at once.
+
+    Parameters
+    ----------
+    embedding : array or tuple
+        An embedding array, or the values and scales of an int8 embedding.
+
+    Returns
+    -------
+    array or tuple
+        The embedding, in memory.
+    """
+
+    if isinstance(embedding, tuple):
+        return tuple(np.array(part) for part in embedding)
+
+    return np.array(embedding)
+
+
+def load_pair(pair, load_protein, precision="float64"):
+    """Loads the two proteins of a pair.
+
+    Parameters
+    ----------
+    pair : tuple
+        A (query, target) pair, as given by batch.make_pairs.
+
+    load_protein : function
+        The function loading a protein (batch.load_protein).
+
+    precision : str
+        OPTIONAL, the type of the binary copies of the embedding files.
+
+    Returns
+    -------
+    tuple
+        The embedding (in memory), the fasta sequence and the name of each
+        protein.
+    """
+
+    proteins = {}
+
+    # A protein aligned with itself is read once: numpy computes the dot
+    # products of an array with itself as a symmetric product, as without
+    # prefetching.
+    for protein in pair:
+        if protein not in proteins:
+            embedding, fasta, prot_name = load_protein(*protein, precision)
+            proteins[protein] = (read_embedding(embedding), fasta, prot_name)
+
+    return tuple(proteins[protein] for protein in pair)
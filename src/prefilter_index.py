@@ -0,0 +1,392 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 08:31:44 2026
+
+@author: Jean Delhomme
+
+This file contains the functions of the prefilter :
+    - summary_vector
+    - build_index, save_index, load_index
+    - search
+    - recall_report
+
+Aligning a query against every target of a large database is mostly spent on
+unrelated proteins. The prefilter summarizes each protein by a single vector
+(the mean and/or the maximum of its residue vectors, normalized) and keeps,
+for each query, the K targets whose summary vectors are the most similar
+(cosine similarity). Only those candidates are aligned.
+
+The search is exact (one matrix product against all the targets), or, with
+clusters, only looks at the targets of the clusters closest to the query
+(inverted file): the targets are grouped by k-means on their summary
+vectors, and only the targets of the probes closest clusters are compared.
+
+An index is a dictionary :
+    - pooling: mean, max or meanmax (both, concatenated).
+    - names: the name of each target (array of str).
+    - vectors: the summary vector of each target (array, one row each).
+    - centroids: the centre of each cluster (array, no rows without
+      clusters).
+    - clusters: the cluster of each target (array).
+
+recall_report measures how many of the best targets according to the
+alignment scores are kept by the prefilter, and how long it takes. It can be
+run as a script :
+
+    python3 prefilter_index.py SET [TARGET] [--k K] [--mode nw|sw|gl]
+                               [--pooling mean|max|meanmax]
+                               [--clusters N] [--probes P [P ...]]
+                               [--fasta-dir DIR]
+
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+import alignment_score as asc
+
+# Ways of summarizing the residue vectors of a protein.
+POOLINGS = ("mean", "max", "meanmax")
+
+# Number of iterations of the k-means.
+ITERATIONS = 10
+
+###############################################################################
+#                                                                             #
+#                                  Index                                      #
+#                                                                             #
+###############################################################################
+
+def summary_vector(embedding, pooling="mean"):
+    """Summarizes the residue vectors of a protein by a single vector.
+
+    Parameters
+    ----------
+    embedding : array
+        An array containing a vector for each residue.
+
+    pooling : str
+        OPTIONAL, mean, max or meanmax (both, concatenated). By default,
+        mean.
+
+    Returns
+    -------
+    array
+        The summary vector, normalized (norm 1).
+    """
+
+    embedding = np.asarray(embedding, dtype=np.float64)
+
+    if pooling == "mean":
+        vector = embedding.mean(axis=0)
+    elif pooling == "max":
+        vector = embedding.max(axis=0)
+    else:
+        vector = np.concatenate([embedding.mean(axis=0),
+                                 embedding.max(axis=0)])
+
+    norm = np.linalg.norm(vector)
+
+    return vector / norm if norm > 0 else vector
+
+
+def kmeans(vectors, clusters, iterations=ITERATIONS, seed=0):
+    """Groups normalized vectors in clusters (spherical k-means).
+
+    Parameters
+    ----------
+    vectors : array
+        The normalized vectors, one row each.
+
+    clusters : int
+        The number of clusters.
+
+    iterations : int
+        OPTIONAL, the number of iterations.
+
+    seed : int
+        OPTIONAL, the seed of the random choice of the first centres.
+
+    Returns
+    -------
+    tuple
+        The centre of each cluster (array) and the cluster of each vector
+        (array).
+    """
+
+    clusters = min(clusters, len(vectors))
+    generator = np.random.default_rng(seed)
+    centroids = vectors[generator.choice(len(vectors), clusters,
+                                         replace=False)]
+
+    for _ in range(iterations):
+        assignments = np.argmax(vectors @ centroids.T, axis=1)
+        for cluster in range(clusters):
+            members = vectors[assignments == cluster]
+            # An empty cluster keeps its centre.
+            if len(members):
+                centre = members.sum(axis=0)
+                centroids[cluster] = centre / max(np.linalg.norm(centre),
+                                                  1e-12)
+
+    return centroids, np.argmax(vectors @ centroids.T, axis=1)
+
+
+def build_index(embeddings, names, pooling="mean", clusters=0):
+    """Builds the prefilter index of a set of targets.
+
+    Parameters
+    ----------
+    embeddings : iterable
+        The embedding array of each target.
+
+    names : list
+        The name of each target.
+
+    pooling : str
+        OPTIONAL, mean, max or meanmax. By default, mean.
+
+    clusters : int
+        OPTIONAL, the number of clusters of the inverted file, 0 for an
+        exact search only. By default, 0.
+
+    Returns
+    -------
+    dict
+        The index.
+    """
+
+    vectors = np.array([summary_vector(embedding, pooling)
+                        for embedding in embeddings])
+    centroids = np.zeros((0, vectors.shape[1] if vectors.ndim == 2 else 0))
+    assignments = np.zeros(len(vectors), dtype=np.intp)
+
+    if clusters and len(vectors):
+        centroids, assignments = kmeans(vectors, clusters)
+
+    return {"pooling": pooling,
+            "names": np.array(names, dtype=str),
+            "vectors": vectors,
+            "centroids": centroids,
+            "clusters": assignments}
+
+
+def save_index(index, file):
+    """Saves an index in a .npz file.
+
+    Parameters
+    ----------
+    index : dict
+        The index, as given by build_index.
+
+    file : str
+        The name of the file.
+    """
+
+    with open(file, "wb") as output:
+        np.savez(output, **index)
+
+
+def load_index(file):
+    """Loads an index saved by save_index.
+
+    Parameters
+    ----------
+    file : str
+        The name of the file.
+
+    Returns
+    -------
+    dict
+        The index.
+    """
+
+    with np.load(file) as saved:
+        index = {key: saved[key] for key in saved.files}
+    index["pooling"] = str(index["pooling"])
+
+    return index
+
+###############################################################################
+#                                                                             #
+#                                  Search                                     #
+#                                                                             #
+###############################################################################
+
+def search(index, vector, k, probes=None):
+    """Finds the K targets most similar to a query.
+
+    Parameters
+    ----------
+    index : dict
+        The index, as given by build_index.
+
+    vector : array
+        The summary vector of the query (same pooling as the index).
+
+    k : int
+        The number of targets to keep.
+
+    probes : int
+        OPTIONAL, the number of clusters searched, for an index with
+        clusters. By default, all the targets are compared.
+
+    Returns
+    -------
+    tuple
+        The positions of the targets in the index (array), from the most to
+        the least similar, and their cosine similarities (array).
+    """
+
+    candidates = np.arange(len(index["vectors"]))
+
+    # Only the targets of the closest clusters.
+    if probes and len(index["centroids"]):
+        closest = np.argsort(-(index["centroids"] @ vector),
+                             kind="stable")[:probes]
+        candidates = np.flatnonzero(np.isin(index["clusters"], closest))
+
+    similarities = index["vectors"][candidates] @ vector
+
+    # The K best, then sorted (the first target wins the ties).
+    if k < len(candidates):
+        best = np.argpartition(-similarities, k-1)[:k]
+    else:
+        best = np.arange(len(candidates))
+    best = best[np.lexsort((best, -similarities[best]))]
+
+    return candidates[best], similarities[best]
+
+###############################################################################
+#                                                                             #
+#                                  Report                                     #
+#                                                                             #
+###############################################################################
+
+def recall_report(queries, targets, k=10, mode="sw", pooling="mean",
+                  clusters=0, probes=(1,)):
+    """Measures the recall and the speed of the prefilter.
+
+    The reference is the K best targets of each query according to the
+    alignment scores of all the pairs. The recall is the part of them kept
+    by the prefilter.
+
+    Parameters
+    ----------
+    queries : list of array
+        The embedding array of each query.
+
+    targets : list of array
+        The embedding array of each target.
+
+    k : int
+        OPTIONAL, the number of targets kept for each query. By default, 10.
+
+    mode : str
+        OPTIONAL, nw (global), sw (local) or gl (glocal). By default, sw.
+
+    pooling : str
+        OPTIONAL, mean, max or meanmax. By default, mean.
+
+    clusters : int
+        OPTIONAL, the number of clusters of the index, 0 for an exact search
+        only. By default, 0.
+
+    probes : tuple
+        OPTIONAL, the numbers of clusters searched to compare. By default,
+        1.
+
+    Returns
+    -------
+    list
+        A list of dictionaries, one for the alignment of all the pairs, one
+        for the exact search and one for each number of probes: the name of
+        the method, the recall, the time per query in seconds and the time
+        to build the index in seconds.
+    """
+
+    k = min(k, len(targets))
+
+    # The reference: all the alignments.
+    start = time.perf_counter()
+    reference = []
+    for query in queries:
+        scores = np.array([asc.alignment_score(np.dot(query, target.T), mode)
+                           for target in targets])
+        reference.append(set(np.argsort(-scores, kind="stable")[:k]))
+    align_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    index = build_index(targets, [str(n) for n in range(len(targets))],
+                        pooling, clusters)
+    build_time = time.perf_counter() - start
+    vectors = [summary_vector(query, pooling) for query in queries]
+
+    report = [{"method": "alignment", "recall": 1.0,
+               "seconds": align_time / max(len(queries), 1),
+               "build_seconds": 0.0}]
+
+    settings = [("exact", None)]
+    if clusters:
+        settings += [(f"ivf{clusters}/probes{probe}", probe)
+                     for probe in probes]
+
+    for method, probe in settings:
+        start = time.perf_counter()
+        found = [set(search(index, vector, k, probe)[0])
+                 for vector in vectors]
+        elapsed = time.perf_counter() - start
+        kept = sum(len(best & candidates)
+                   for best, candidates in zip(reference, found))
+        report.append({"method": method,
+                       "recall": kept / max(k * len(queries), 1),
+                       "seconds": elapsed / max(len(queries), 1),
+                       "build_seconds": build_time})
+
+    return report
+
+
+if __name__ == "__main__":
+
+    # batch reads the protein sets.
+    import batch as ba
+    import embedding_precision as ep
+
+    parser = argparse.ArgumentParser(
+        description="Measures the recall and the speed of the prefilter.")
+    parser.add_argument("query",
+                        help="directory, .t5emb file, .t5db database or "
+                             "manifest")
+    parser.add_argument("target", nargs="?", default=None,
+                        help="directory, .t5emb file, .t5db database or "
+                             "manifest, by default the query set")
+    parser.add_argument("--k", type=int, default=10,
+                        help="number of targets kept for each query")
+    parser.add_argument("--mode", choices=["nw", "sw", "gl"], default="sw")
+    parser.add_argument("--pooling", choices=POOLINGS, default="mean")
+    parser.add_argument("--clusters", type=int, default=0,
+                        help="number of clusters of the inverted file")
+    parser.add_argument("--probes", type=int, nargs="+", default=[1],
+                        help="numbers of clusters searched")
+    parser.add_argument("--fasta-dir", default="../data/fasta/",
+                        help="directory containing the fasta files, or a "
+                             "multi-fasta file")
+    arguments = parser.parse_args()
+
+    query_set = ba.read_protein_set(arguments.query, arguments.fasta_dir)
+    target_set = query_set
+    if arguments.target is not None:
+        target_set = ba.read_protein_set(arguments.target,
+                                         arguments.fasta_dir)
+
+    print("method\trecall\tseconds_per_query\tbuild_seconds")
+    for row in recall_report(
+            [ep.as_float(ba.load_protein(*query)[0]) for query in query_set],
+            [ep.as_float(ba.load_protein(*target)[0])
+             for target in target_set],
+            arguments.k, arguments.mode, arguments.pooling,
+            arguments.clusters, arguments.probes):
+        print(f"{row['method']}\t{row['recall']:.3f}\t"
+              f"{row['seconds']:.6f}\t{row['build_seconds']:.3f}")
@@ -0,0 +1,676 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 08:51:44 2026
+
+@author: Jean Delhomme
+
+This file contains the instrumentation of the alignments :
+    - Profile
+    - stage, count, array
+    - Sampler, start_hook, collect_hook
+    - enable, configure, add_arguments, parse_flags
+    - call_profiled, merge_result
+    - report, write_report
+
+The instrumentation is off by default and costs nothing but a test. It is
+turned on by the environment variable EMBEDDING_PROFILE=FILE, or by the
+option --profile FILE of main.py and batch.py, and a JSON report is written
+in FILE at the end of the run. It holds :
+    - stages: the number of calls, the total and the longest time (in
+      seconds) of each stage (embedding_reader, fasta_reader, dot_matrix,
+      fill_nw, fill_sw, traceback_nw, traceback_sw, traceback_gl, align,
+      score, write), with their counters (cells for the fills). The stages
+      can be nested: align includes the dot_matrix, fill and traceback
+      stages of the pair.
+    - counters: pairs, cells, traceback_steps (aligned columns),
+      bytes_read, bytes_written, proteins_loaded.
+    - arrays: the number, the total and the largest size (in bytes) of the
+      matrices allocated (dot_matrix, alignment_matrix).
+    - peak_rss_kib, total_rss_kib: the largest resident memory of a process
+      and the sum over the processes (the workers of a batch).
+    - functions or samples, with a hook (--profile-hook or
+      EMBEDDING_PROFILE_HOOK): cprofile gives the calls, the own time and
+      the cumulative time of the slowest functions, sample counts the line
+      run every 5 ms (without the slow down of cProfile).
+
+The workers of a batch send their profile back with the results of each
+chunk (see call_profiled), so the report covers the whole run. The reports
+of several runs are added with :
+
+    python3 profiling.py REPORT [REPORT ...] [--output FILE]
+
+which prints a summary.
+
+"""
+
+import argparse
+import atexit
+import collections
+import contextlib
+import cProfile
+import datetime
+import json
+import os
+import pstats
+import resource
+import sys
+import threading
+import time
+
+# Environment variables turning the instrumentation on (the name of the
+# report) and choosing the hook.
+ENVIRONMENT_VARIABLE = "EMBEDDING_PROFILE"
+HOOK_VARIABLE = "EMBEDDING_PROFILE_HOOK"
+
+# Hooks, in addition to the stage timers.
+HOOKS = ("cprofile", "sample")
+
+# Time between two samples of the sample hook, in seconds.
+SAMPLE_INTERVAL = 0.005
+
+# Number of functions or lines kept in a report.
+TOP = 30
+
+# Version of the format of the reports.
+FORMAT_VERSION = 1
+
+# True when the instrumentation is on. The workers started by a process
+# inherit it from the environment.
+ENABLED = bool(os.environ.get(ENVIRONMENT_VARIABLE))
+
+# Hook of the process, None, cprofile or sample.
+HOOK = os.environ.get(HOOK_VARIABLE) or None
+
+# Start of the run.
+START = time.perf_counter()
+
+###############################################################################
+#                                                                             #
+#                                 Profile                                     #
+#                                                                             #
+###############################################################################
+
+class Profile:
+    """Gathers the timers and the counters of a process.
+
+    The stages may be timed by several threads (the writer of the results),
+    the updates are made under a lock.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Forgets everything measured."""
+
+        self.stages = {}
+        self.counters = collections.Counter()
+        self.arrays = {}
+        self.functions = {}
+        self.samples = collections.Counter()
+        self.rss = {}
+
+    def add_stage(self, name, seconds, counters=None):
+        """Adds a call to a stage.
+
+        Parameters
+        ----------
+        name : str
+            The name of the stage.
+
+        seconds : float
+            The time of the call.
+
+        counters : dict
+            OPTIONAL, the counters of the call, added to the stage.
+        """
+
+        with self.lock:
+            stage = self.stages.setdefault(
+                name, {"calls": 0, "seconds": 0.0, "max_seconds": 0.0})
+            stage["calls"] += 1
+            stage["seconds"] += seconds
+            stage["max_seconds"] = max(stage["max_seconds"], seconds)
+            for counter, value in (counters or {}).items():
+                stage[counter] = stage.get(counter, 0) + value
+
+    def count(self, name, value=1):
+        """Adds a value to a counter."""
+
+        with self.lock:
+            self.counters[name] += value
+
+    def add_array(self, name, size):
+        """Adds an array of size bytes to the arrays of a name."""
+
+        with self.lock:
+            array = self.arrays.setdefault(
+                name, {"count": 0, "total_bytes": 0, "max_bytes": 0})
+            array["count"] += 1
+            array["total_bytes"] += size
+            array["max_bytes"] = max(array["max_bytes"], size)
+
+    def snapshot(self):
+        """Gives what was measured, as a JSON object.
+
+        Returns
+        -------
+        dict
+            The stages, the counters, the arrays, the functions and samples
+            of the hooks and the largest resident memory of each process
+            (in kiB, by process id).
+        """
+
+        self.rss[str(os.getpid())] = \
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+        with self.lock:
+            return {"stages": {name: dict(stage)
+                               for name, stage in self.stages.items()},
+                    "counters": dict(self.counters),
+                    "arrays": {name: dict(array)
+                               for name, array in self.arrays.items()},
+                    "functions": {name: list(function)
+                                  for name, function
+                                  in self.functions.items()},
+                    "samples": dict(self.samples),
+                    "rss": dict(self.rss)}
+
+    def merge(self, snapshot):
+        """Adds a snapshot (of a worker, or a report) to the profile.
+
+        Parameters
+        ----------
+        snapshot : dict
+            A snapshot, as given by Profile.snapshot, or a report.
+        """
+
+        with self.lock:
+            for name, other in snapshot.get("stages", {}).items():
+                stage = self.stages.setdefault(
+                    name, {"calls": 0, "seconds": 0.0, "max_seconds": 0.0})
+                for key, value in other.items():
+                    stage[key] = max(stage[key], value) \
+                        if key == "max_seconds" else stage.get(key, 0) + value
+            self.counters.update(snapshot.get("counters", {}))
+            for name, other in snapshot.get("arrays", {}).items():
+                array = self.arrays.setdefault(
+                    name, {"count": 0, "total_bytes": 0, "max_bytes": 0})
+                array["count"] += other["count"]
+                array["total_bytes"] += other["total_bytes"]
+                array["max_bytes"] = max(array["max_bytes"],
+                                         other["max_bytes"])
+            for name, (calls, own, cumulative) \
+                    in snapshot.get("functions", {}).items():
+                function = self.functions.setdefault(name, [0, 0.0, 0.0])
+                function[0] += calls
+                function[1] += own
+                function[2] += cumulative
+            self.samples.update(snapshot.get("samples", {}))
+            for pid, rss in snapshot.get("rss", {}).items():
+                self.rss[pid] = max(self.rss.get(pid, 0), rss)
+
+
+# Profile of the process.
+PROFILE = Profile()
+
+
+@contextlib.contextmanager
+def stage(name, **counters):
+    """Times a stage, used as a context manager.
+
+    Parameters
+    ----------
+    name : str
+        The name of the stage.
+
+    **counters : int
+        The counters of the stage, for instance cells=n*m.
+    """
+
+    if not ENABLED:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        PROFILE.add_stage(name, time.perf_counter() - start, counters)
+
+
+def count(name, value=1):
+    """Adds a value to a counter, if the instrumentation is on.
+
+    Parameters
+    ----------
+    name : str
+        The name of the counter.
+
+    value : int
+        OPTIONAL, the value added. By default, 1.
+    """
+
+    if ENABLED:
+        PROFILE.count(name, value)
+
+
+def array(name, value):
+    """Records the size of an array, if the instrumentation is on.
+
+    Parameters
+    ----------
+    name : str
+        The name of the array.
+
+    value : array or tuple
+        The array, or the arrays of an int8 embedding.
+
+    Returns
+    -------
+    array or tuple
+        The value, unchanged.
+    """
+
+    if ENABLED:
+        arrays = value if isinstance(value, tuple) else (value,)
+        PROFILE.add_array(name, sum(part.nbytes for part in arrays))
+
+    return value
+
+###############################################################################
+#                                                                             #
+#                                  Hooks                                      #
+#                                                                             #
+###############################################################################
+
+class Sampler(threading.Thread):
+    """Counts the line run by a thread at regular intervals.
+
+    Parameters
+    ----------
+    thread_id : int
+        The identifier of the sampled thread.
+
+    interval : float
+        OPTIONAL, the time between two samples, in seconds.
+    """
+
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stopping = threading.Event()
+
+    def run(self):
+        while not self.stopping.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                code = frame.f_code
+                location = (f"{os.path.basename(code.co_filename)}:"
+                            f"{frame.f_lineno}({code.co_name})")
+                with PROFILE.lock:
+                    PROFILE.samples[location] += 1
+
+    def stop(self):
+        """Stops the sampling."""
+
+        self.stopping.set()
+
+
+# cProfile profiler and sampler of the process, and the process they were
+# started in (a worker inherits the ones of its parent).
+PROFILER = None
+SAMPLER = None
+HOOK_PID = None
+
+
+def start_hook(hook):
+    """Starts the hook of the process, stopping the previous one.
+
+    Parameters
+    ----------
+    hook : str
+        None, cprofile or sample.
+    """
+
+    global PROFILER, SAMPLER, HOOK_PID
+
+    if PROFILER is not None:
+        PROFILER.disable()
+    if SAMPLER is not None:
+        SAMPLER.stop()
+    PROFILER = SAMPLER = None
+    HOOK_PID = os.getpid()
+
+    if hook == "cprofile":
+        PROFILER = cProfile.Profile()
+        PROFILER.enable()
+    elif hook == "sample":
+        SAMPLER = Sampler(threading.main_thread().ident)
+        SAMPLER.start()
+
+
+def collect_hook():
+    """Adds the functions measured by cProfile to the profile."""
+
+    if PROFILER is None:
+        return
+
+    # pstats stops the profiler, which is started again afterwards.
+    statistics = pstats.Stats(PROFILER).stats
+    for (file, line, function), (_, calls, own, cumulative, _) \
+            in statistics.items():
+        entry = PROFILE.functions.setdefault(
+            f"{os.path.basename(file)}:{line}({function})", [0, 0.0, 0.0])
+        entry[0] += calls
+        entry[1] += own
+        entry[2] += cumulative
+    PROFILER.clear()
+    PROFILER.enable()
+
+###############################################################################
+#                                                                             #
+#                                 Workers                                     #
+#                                                                             #
+###############################################################################
+
+def call_profiled(function, *arguments):
+    """Runs a function in a worker and gives the profile of the call.
+
+    The first call in a process forgets the profile inherited from the
+    parent and starts the hook.
+
+    Parameters
+    ----------
+    function : function
+        The function run by the worker.
+
+    *arguments
+        Its arguments.
+
+    Returns
+    -------
+    tuple
+        The result of the function and the snapshot of the profile of the
+        call.
+    """
+
+    if HOOK_PID != os.getpid():
+        PROFILE.reset()
+        start_hook(HOOK)
+
+    result = function(*arguments)
+
+    collect_hook()
+    snapshot = PROFILE.snapshot()
+    PROFILE.reset()
+
+    return result, snapshot
+
+
+def merge_result(result):
+    """Adds the profile given by call_profiled to the profile of the process.
+
+    Parameters
+    ----------
+    result : tuple
+        The result of call_profiled.
+
+    Returns
+    -------
+    object
+        The result of the function.
+    """
+
+    result, snapshot = result
+    PROFILE.merge(snapshot)
+
+    return result
+
+###############################################################################
+#                                                                             #
+#                                 Reports                                     #
+#                                                                             #
+###############################################################################
+
+def report(profile=None):
+    """Gives the report of a run.
+
+    Parameters
+    ----------
+    profile : Profile
+        OPTIONAL, the profile. By default, the one of the process.
+
+    Returns
+    -------
+    dict
+        The report, see the description of the module.
+    """
+
+    profile = profile or PROFILE
+    if profile is PROFILE:
+        collect_hook()
+    snapshot = profile.snapshot()
+
+    # Only the slowest functions and the most sampled lines are kept.
+    functions = sorted(snapshot["functions"].items(),
+                       key=lambda item: item[1][2], reverse=True)[:TOP]
+    samples = collections.Counter(snapshot["samples"]).most_common(TOP)
+
+    return dict(snapshot, version=FORMAT_VERSION, runs=1,
+                date=datetime.datetime.now().isoformat(timespec="seconds"),
+                argv=sys.argv, hook=HOOK,
+                wall_seconds=time.perf_counter() - START,
+                peak_rss_kib=max(snapshot["rss"].values()),
+                total_rss_kib=sum(snapshot["rss"].values()),
+                functions=dict(functions), samples=dict(samples))
+
+
+def write_report(file):
+    """Writes the report of the run in a JSON file.
+
+    Parameters
+    ----------
+    file : str
+        The name of the report.
+    """
+
+    with open(file, "w") as output:
+        json.dump(report(), output, indent=1)
+
+
+def merge_reports(reports):
+    """Adds the reports of several runs.
+
+    Parameters
+    ----------
+    reports : list
+        The reports, as given by report.
+
+    Returns
+    -------
+    dict
+        A report of all the runs.
+    """
+
+    profile = Profile()
+    for run in reports:
+        profile.merge(dict(run, rss={}))
+    merged = report(profile)
+
+    merged.update(runs=sum(run.get("runs", 1) for run in reports),
+                  argv=[run.get("argv") for run in reports],
+                  wall_seconds=sum(run["wall_seconds"] for run in reports),
+                  peak_rss_kib=max(run["peak_rss_kib"] for run in reports),
+                  total_rss_kib=max(run["total_rss_kib"] for run in reports),
+                  hook=reports[0].get("hook"), rss={})
+
+    return merged
+
+
+def print_report(run):
+    """Prints the summary of a report.
+
+    Parameters
+    ----------
+    run : dict
+        The report.
+    """
+
+    print(f"{run['runs']} run(s), {run['wall_seconds']:.3f} s, peak RSS "
+          f"{run['peak_rss_kib'] / 1024:.1f} MiB")
+
+    print("\nstage\tcalls\tseconds\tmax_seconds")
+    for name, item in sorted(run["stages"].items(),
+                             key=lambda item: item[1]["seconds"],
+                             reverse=True):
+        print(f"{name}\t{item['calls']}\t{item['seconds']:.4f}\t"
+              f"{item['max_seconds']:.4f}")
+
+    print("\ncounter\tvalue")
+    for name, value in sorted(run["counters"].items()):
+        print(f"{name}\t{value}")
+
+    print("\narray\tcount\ttotal_MiB\tmax_MiB")
+    for name, item in sorted(run["arrays"].items()):
+        print(f"{name}\t{item['count']}\t"
+              f"{item['total_bytes'] / 2**20:.1f}\t"
+              f"{item['max_bytes'] / 2**20:.1f}")
+
+    if run["functions"]:
+        print("\nfunction\tcalls\town_seconds\tcumulative_seconds")
+        for name, (calls, own, cumulative) in run["functions"].items():
+            print(f"{name}\t{calls}\t{own:.4f}\t{cumulative:.4f}")
+
+    if run["samples"]:
+        total = sum(run["samples"].values())
+        print("\nline\tsamples\tshare")
+        for name, samples in run["samples"].items():
+            print(f"{name}\t{samples}\t{samples / total:.1%}")
+
+###############################################################################
+#                                                                             #
+#                                 Settings                                    #
+#                                                                             #
+###############################################################################
+
+def enable(file, hook=None):
+    """Turns the instrumentation on, and writes the report at exit.
+
+    The environment variables are set as well, for the workers.
+
+    Parameters
+    ----------
+    file : str
+        The name of the report.
+
+    hook : str
+        OPTIONAL, None, cprofile or sample.
+    """
+
+    global ENABLED, HOOK
+
+    if hook is not None and hook not in HOOKS:
+        raise ValueError(f"Unknown profiling hook {hook}, use "
+                         f"{' or '.join(HOOKS)}.")
+
+    ENABLED, HOOK = True, hook
+    os.environ[ENVIRONMENT_VARIABLE] = file
+    if hook is not None:
+        os.environ[HOOK_VARIABLE] = hook
+    start_hook(hook)
+
+    # Only the process which turned the instrumentation on writes the
+    # report.
+    pid = os.getpid()
+    atexit.register(lambda: os.getpid() == pid and write_report(file))
+
+
+def configure(file=None, hook=None):
+    """Turns the instrumentation on from an option or the environment.
+
+    Parameters
+    ----------
+    file : str
+        OPTIONAL, the name of the report given by --profile. By default,
+        the one of EMBEDDING_PROFILE, or nothing is done.
+
+    hook : str
+        OPTIONAL, the hook given by --profile-hook. By default, the one of
+        EMBEDDING_PROFILE_HOOK.
+    """
+
+    file = file or os.environ.get(ENVIRONMENT_VARIABLE)
+    if file:
+        enable(file, hook or os.environ.get(HOOK_VARIABLE) or None)
+
+
+def add_arguments(parser):
+    """Adds --profile and --profile-hook to an argument parser.
+
+    Parameters
+    ----------
+    parser : ArgumentParser
+        The parser.
+    """
+
+    parser.add_argument("--profile", default=None, metavar="FILE",
+                        help="write a JSON report of the time and memory "
+                             f"of each stage in FILE (or set "
+                             f"{ENVIRONMENT_VARIABLE})")
+    parser.add_argument("--profile-hook", choices=HOOKS, default=None,
+                        help="also profile the functions (cprofile) or "
+                             "sample the lines run (sample)")
+
+
+def parse_flags(argv):
+    """Removes --profile FILE and --profile-hook HOOK from the arguments of
+    a script, and configures the instrumentation.
+
+    Parameters
+    ----------
+    argv : list
+        The arguments, as sys.argv.
+
+    Returns
+    -------
+    list
+        The other arguments.
+    """
+
+    arguments = list(argv)
+    values = {}
+
+    for flag in ("--profile", "--profile-hook"):
+        if flag in arguments[:-1]:
+            position = arguments.index(flag)
+            values[flag] = arguments[position + 1]
+            del arguments[position:position + 2]
+
+    configure(values.get("--profile"), values.get("--profile-hook"))
+
+    return arguments
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(
+        description="Adds the profiling reports of several runs and prints "
+                    "a summary.")
+    parser.add_argument("reports", nargs="+")
+    parser.add_argument("--output", default=None,
+                        help="JSON file of the merged report")
+    arguments = parser.parse_args()
+
+    runs = []
+    for name in arguments.reports:
+        with open(name, "r") as report_file:
+            runs.append(json.load(report_file))
+
+    merged_report = merge_reports(runs) if len(runs) > 1 else runs[0]
+    if arguments.output is not None:
+        with open(arguments.output, "w") as output_file:
+            json.dump(merged_report, output_file, indent=1)
+    print_report(merged_report)
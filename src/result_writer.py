@@ -0,0 +1,405 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 08:46:21 2026
+
+@author: Jean Delhomme
+
+This file contains the output of the alignments :
+    - alignment_path
+    - alignment_records, score_record
+    - ResultWriter
+
+The workers give their results as records (dictionaries), and a single
+ResultWriter writes them in one file, in one of the formats :
+    - tsv: a tab separated file, one line per alignment (FIELDS) or per
+      score (SCORE_FIELDS).
+    - jsonl: one JSON object per line, with all the fields of the records.
+    - text: the text of the result files of main.py (see
+      alignment_algorithm.alignment_text), all in the same file.
+    - npz: a numpy file with one array per field (columnar), without the
+      aligned sequences: the scores, the coordinates and the paths. It is
+      written when the writer is closed.
+
+The records are put in a queue and written by a thread, so the program
+giving them does not wait for the file. The file is written by large blocks
+and flushed when the queue is empty.
+
+The path of an alignment is written as in a CIGAR string: the number of
+consecutive aligned pairs (M), residues of the query facing a gap (I) and
+residues of the target facing a gap (D), such as 12M2I30M1D5M. The
+coordinates are the first (start) and after the last (end) aligned residue
+of each protein, from 0, given by the cells of the path (see
+alignment_algorithm). A glocal alignment going past the first row wraps
+around the end of the query: its query_start is then negative, the number of
+residues before the end of the query where it starts.
+
+"""
+
+import itertools
+import json
+import queue
+import sys
+import threading
+
+import numpy as np
+
+import alignment_algorithm as aa
+import profiling as pr
+
+# Fields of an alignment in a tsv file, then the fields added in the jsonl
+# and npz files.
+FIELDS = ("query", "target", "mode", "rank", "score", "aligned_query",
+          "aligned_target")
+PATH_FIELDS = ("query_start", "query_end", "target_start", "target_end",
+               "path")
+
+# Fields of a score.
+SCORE_FIELDS = ("query", "target", "mode", "score")
+
+# Output formats, and the format given by the extension of a file.
+FORMATS = ("tsv", "jsonl", "text", "npz")
+EXTENSIONS = {".jsonl": "jsonl", ".json": "jsonl", ".txt": "text",
+              ".npz": "npz"}
+
+# Number of chunks of records waiting for the writer thread.
+QUEUE_SIZE = 64
+
+# Size of the buffer of the file, in bytes.
+BUFFER_SIZE = 2**20
+
+###############################################################################
+#                                                                             #
+#                                 Records                                     #
+#                                                                             #
+###############################################################################
+
+def alignment_path(result1, result2):
+    """Writes the path of an alignment as a CIGAR string.
+
+    Parameters
+    ----------
+    result1 : str
+        The aligned sequence of the query.
+
+    result2 : str
+        The aligned sequence of the target.
+
+    Returns
+    -------
+    str
+        The path, for instance 12M2I30M1D5M.
+    """
+
+    moves = ("I" if residue2 == "-" else "D" if residue1 == "-" else "M"
+             for residue1, residue2 in zip(result1, result2))
+
+    return "".join(f"{len(list(group))}{move}"
+                   for move, group in itertools.groupby(moves))
+
+
+def coordinates(cells):
+    """Gives the aligned residues of both proteins from the path.
+
+    Parameters
+    ----------
+    cells : tuple
+        The cells of the path, ((i, j), (i, j)), where it starts and where
+        it ends (see alignment_algorithm).
+
+    Returns
+    -------
+    tuple
+        The first aligned residue and the residue after the last one in the
+        query, then in the target.
+    """
+
+    (start1, start2), (end1, end2) = cells
+
+    return int(start1), int(end1), int(start2), int(end2)
+
+
+def alignment_records(prot_name1, prot_name2, mode, alignments, fasta1,
+                      fasta2):
+    """Gives the records of the alignments of a pair.
+
+    Parameters
+    ----------
+    prot_name1 : str
+        The name of the query.
+
+    prot_name2 : str
+        The name of the target.
+
+    mode : str
+        nw (global), sw (local) or gl (glocal).
+
+    alignments : list
+        A list of tuples, the alignment score, the two aligned sequences
+        (str) and the cells of the path of each alignment.
+
+    fasta1 : list of string
+        The sequence of the query.
+
+    fasta2 : list of string
+        The sequence of the target.
+
+    Returns
+    -------
+    list
+        A dictionary of the FIELDS and PATH_FIELDS of each alignment.
+    """
+
+    records = []
+
+    for rank, (score, result1, result2, cells) in enumerate(alignments, 1):
+        query_start, query_end, target_start, target_end = coordinates(cells)
+        records.append({"query": prot_name1, "target": prot_name2,
+                        "mode": mode, "rank": rank, "score": score,
+                        "aligned_query": result1, "aligned_target": result2,
+                        "query_start": query_start, "query_end": query_end,
+                        "target_start": target_start,
+                        "target_end": target_end,
+                        "path": alignment_path(result1, result2)})
+
+    return records
+
+
+def score_record(prot_name1, prot_name2, mode, score):
+    """Gives the record of an alignment score.
+
+    Parameters
+    ----------
+    prot_name1 : str
+        The name of the query.
+
+    prot_name2 : str
+        The name of the target.
+
+    mode : str
+        nw (global), sw (local) or gl (glocal).
+
+    score : float
+        The alignment score.
+
+    Returns
+    -------
+    dict
+        A dictionary of the SCORE_FIELDS.
+    """
+
+    return {"query": prot_name1, "target": prot_name2, "mode": mode,
+            "score": score}
+
+###############################################################################
+#                                                                             #
+#                                 Formats                                     #
+#                                                                             #
+###############################################################################
+
+def path_format(path):
+    """Gives the format of an output file from its extension.
+
+    Parameters
+    ----------
+    path : str
+        The name of the file.
+
+    Returns
+    -------
+    str
+        jsonl for .jsonl and .json, text for .txt, npz for .npz and tsv
+        otherwise.
+    """
+
+    for extension, name in EXTENSIONS.items():
+        if path.endswith(extension):
+            return name
+
+    return "tsv"
+
+
+def render(record, output_format):
+    """Writes a record as a line (or lines) of a text format.
+
+    Parameters
+    ----------
+    record : dict
+        An alignment record or a score record.
+
+    output_format : str
+        tsv, jsonl or text.
+
+    Returns
+    -------
+    str
+        The text of the record.
+    """
+
+    if output_format == "tsv":
+        fields = FIELDS if "rank" in record else SCORE_FIELDS
+        return "\t".join(f"{record[field]}" for field in fields) + "\n"
+
+    if output_format == "jsonl":
+        return json.dumps(dict(record, score=float(record["score"]))) + "\n"
+
+    kind = aa.KINDS[record["mode"]]
+    if "rank" not in record:
+        return (f"{kind} alignment of {record['query']} and "
+                f"{record['target']}\n\n"
+                f"Alignment_score = {record['score']}\n\n")
+
+    return aa.alignment_text(kind, record["query"], record["target"],
+                             (record["score"], record["aligned_query"],
+                              record["aligned_target"]))
+
+###############################################################################
+#                                                                             #
+#                                  Writer                                     #
+#                                                                             #
+###############################################################################
+
+class ResultWriter:
+    """Writes records in a single file, from a thread fed by a queue.
+
+    The writer is used as a context manager: leaving it writes the last
+    records and closes the file.
+
+    Parameters
+    ----------
+    path : str
+        The output file, - for the standard output.
+
+    output_format : str
+        OPTIONAL, tsv, jsonl, text or npz. By default, the format given by
+        the extension of the file (see path_format).
+
+    score_only : bool
+        OPTIONAL, True if the records are scores, for the header of a tsv
+        file. By default, False.
+
+    append : bool
+        OPTIONAL, True to add the records at the end of the file (not for
+        npz). The header of a tsv file is only written in an empty file. By
+        default, False.
+    """
+
+    def __init__(self, path, output_format=None, score_only=False,
+                 append=False):
+        self.path = path
+        self.format = output_format or path_format(path)
+        self.score_only = score_only
+        self.append = append
+        self.count = 0
+        self.error = None
+        self.finished = False
+        self.queue = queue.Queue(QUEUE_SIZE)
+        self.columns = {}
+
+        if self.format == "npz" and (path == "-" or append):
+            raise ValueError("An npz file is written at once, in a file.")
+
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+    def write(self, records):
+        """Adds records to the queue of the writer thread.
+
+        Parameters
+        ----------
+        records : list
+            A list of records (dict).
+        """
+
+        if self.error is not None:
+            raise self.error
+        self.queue.put(records)
+
+    def close(self):
+        """Writes the last records and closes the file."""
+
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+        if self.error is not None:
+            raise self.error
+
+    def run(self):
+        """Writes the records of the queue (in the writer thread)."""
+
+        try:
+            if self.format == "npz":
+                self.collect()
+            elif self.path == "-":
+                self.write_text(sys.stdout, True)
+            else:
+                with open(self.path, "a" if self.append else "w",
+                          buffering=BUFFER_SIZE) as output:
+                    # A file added to already has a header.
+                    self.write_text(output, output.tell() == 0)
+        except Exception as error:
+            self.error = error
+            # The queue is emptied up to the end of the records, so that
+            # write and close do not block.
+            while not self.finished:
+                self.finished = self.queue.get() is None
+
+    def write_text(self, output, header):
+        """Writes the records of the queue in a text file.
+
+        Parameters
+        ----------
+        output : file
+            An open text file.
+
+        header : bool
+            True to begin a tsv file with its header.
+        """
+
+        if self.format == "tsv" and header:
+            fields = SCORE_FIELDS if self.score_only else FIELDS
+            output.write("\t".join(fields) + "\n")
+
+        while True:
+            records = self.queue.get()
+            if records is None:
+                self.finished = True
+                break
+            with pr.stage("write"):
+                text = "".join(render(record, self.format)
+                               for record in records)
+                output.write(text)
+                # The results are visible as soon as the writer is idle.
+                if self.queue.empty():
+                    output.flush()
+            self.count += len(records)
+            pr.count("bytes_written", len(text))
+
+        output.flush()
+
+    def collect(self):
+        """Gathers the records of the queue by field, then writes the npz
+        file."""
+
+        fields = SCORE_FIELDS if self.score_only \
+            else FIELDS[:5] + PATH_FIELDS
+
+        while True:
+            records = self.queue.get()
+            if records is None:
+                self.finished = True
+                break
+            for field in fields:
+                self.columns.setdefault(field, []).extend(
+                    record[field] for record in records)
+            self.count += len(records)
+
+        with pr.stage("write"), open(self.path, "wb") as output:
+            np.savez(output, **{field: np.array(self.columns.get(field, []))
+                                for field in fields})
+            pr.count("bytes_written", output.tell())
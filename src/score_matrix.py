@@ -0,0 +1,317 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 09:00:28 2026
+
+@author: Jean Delhomme
+
+This file contains the symmetric all-vs-all and its score matrix :
+    - upper_pairs
+    - unique_pairs
+    - chunk_cells
+    - balanced_chunks
+    - ScoreMatrix
+    - load_matrix
+
+The gap is the same on both sides, so aligning A against B gives the same
+global and local scores as aligning B against A, and the glocal score of B
+against A is given by the same alignment matrix (see alignment_score). An
+all-vs-all on n proteins then only needs the n * (n + 1) / 2 pairs of the
+upper triangle of the score matrix, the diagonal included.
+
+The time of a pair grows with the product of the lengths of the two
+proteins, so chunks with the same number of pairs can take very different
+times. balanced_chunks cuts the pairs in chunks of about the same number of
+cells instead, and upper_pairs gives the pairs of the longest proteins
+first, so the last chunks given to the workers are the shortest ones.
+
+A ScoreMatrix writes the scores in a file that can be loaded directly :
+    - .npy: a dense matrix of float64, NaN for the pairs not aligned, written
+      through a memory map. The names of the proteins (rows and columns) are
+      in a text file next to it, FILE.names.txt, one per line.
+    - .npz: a sparse matrix, the rows, columns and scores of the aligned
+      pairs and the names of the proteins, in the layout of
+      scipy.sparse.save_npz (scipy.sparse.load_npz reads it as a COO
+      matrix).
+
+"""
+
+import os
+
+import numpy as np
+
+# Extension of the file of the names of a dense matrix.
+NAMES_EXTENSION = ".names.txt"
+
+###############################################################################
+#                                                                             #
+#                                  Pairs                                      #
+#                                                                             #
+###############################################################################
+
+def upper_pairs(proteins, lengths):
+    """Generates each unordered pair of proteins once, the longest first.
+
+    Parameters
+    ----------
+    proteins : list
+        The proteins, as given by batch.read_protein_set.
+
+    lengths : dict
+        The number of residues of each protein.
+
+    Returns
+    -------
+    generator
+        The (query, target) pairs of the upper triangle, diagonal included,
+        grouped by query. The query is the longest protein of a pair.
+    """
+
+    order = sorted(proteins, key=lambda protein: -lengths[protein])
+
+    for row, query in enumerate(order):
+        for target in order[row:]:
+            yield query, target
+
+
+def unique_pairs(pairs):
+    """Skips the pairs whose reversed pair was already given.
+
+    Parameters
+    ----------
+    pairs : iterable
+        The (query, target) pairs, as given by batch.prefilter_pairs.
+
+    Returns
+    -------
+    generator
+        The pairs, each unordered pair once.
+    """
+
+    seen = set()
+
+    for query, target in pairs:
+        if (target, query) not in seen:
+            seen.add((query, target))
+            yield query, target
+
+
+def chunk_cells(lengths, chunksize):
+    """Gives the number of cells of a balanced chunk.
+
+    Parameters
+    ----------
+    lengths : dict
+        The number of residues of each protein.
+
+    chunksize : int
+        The average number of pairs of a chunk.
+
+    Returns
+    -------
+    int
+        The number of cells of chunksize pairs of proteins of the mean
+        length.
+    """
+
+    mean_length = sum(lengths.values()) / max(len(lengths), 1)
+
+    return max(1, round(chunksize * mean_length**2))
+
+
+def balanced_chunks(pairs, lengths, cells):
+    """Cuts the pairs in chunks of about the same number of cells.
+
+    Parameters
+    ----------
+    pairs : iterable
+        The (query, target) pairs.
+
+    lengths : dict
+        The number of residues of each protein.
+
+    cells : int
+        The number of cells (product of the lengths) of a chunk, see
+        chunk_cells.
+
+    Returns
+    -------
+    generator
+        The chunks, lists of pairs. A chunk ends with the pair reaching the
+        number of cells, so a pair larger than a chunk is alone.
+    """
+
+    chunk = []
+    chunk_size = 0
+
+    for query, target in pairs:
+        chunk.append((query, target))
+        chunk_size += lengths[query] * lengths[target]
+        if chunk_size >= cells:
+            yield chunk
+            chunk = []
+            chunk_size = 0
+
+    if chunk:
+        yield chunk
+
+###############################################################################
+#                                                                             #
+#                                  Matrix                                     #
+#                                                                             #
+###############################################################################
+
+def names_file(path):
+    """Gives the file of the names of a dense matrix.
+
+    Parameters
+    ----------
+    path : str
+        The .npy file of the matrix.
+
+    Returns
+    -------
+    str
+        The file of the names, FILE.names.txt.
+    """
+
+    return os.path.splitext(path)[0] + NAMES_EXTENSION
+
+
+class ScoreMatrix:
+    """Writes the scores of an all-vs-all in a matrix file.
+
+    The matrix is written under a temporary name and renamed when it is
+    closed. It is used as a context manager, as result_writer.ResultWriter.
+
+    Parameters
+    ----------
+    path : str
+        The matrix file, .npy for a dense matrix and .npz for a sparse one.
+
+    names : list
+        The names of the proteins, in the order of the rows and columns.
+
+    symmetric : bool
+        OPTIONAL, True if the score of a pair is also the score of the
+        reversed pair (nw and sw). By default, False.
+    """
+
+    def __init__(self, path, names, symmetric=False):
+        self.path = path
+        self.names = list(names)
+        self.positions = {name: position
+                          for position, name in enumerate(self.names)}
+        self.symmetric = symmetric
+        self.sparse = path.endswith(".npz")
+        self.temporary_file = f"{path}.{os.getpid()}.tmp"
+        self.count = 0
+        self.closed = False
+
+        if len(self.positions) != len(self.names):
+            raise ValueError("The names of the proteins of a score matrix "
+                             "must be unique.")
+        if not self.sparse and not path.endswith(".npy"):
+            raise ValueError("A score matrix is a .npy (dense) or .npz "
+                             "(sparse) file.")
+
+        # Rows, columns and scores of a sparse matrix.
+        self.entries = ([], [], [])
+        self.matrix = None
+        if not self.sparse:
+            self.matrix = np.lib.format.open_memmap(
+                self.temporary_file, "w+", np.float64,
+                (len(self.names), len(self.names)))
+            self.matrix.fill(np.nan)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+    def add(self, scores):
+        """Puts scores in the matrix.
+
+        Parameters
+        ----------
+        scores : list
+            A list of tuples, the name of the query, the name of the target
+            and the alignment score, as given by batch.score_chunk.
+        """
+
+        if not scores:
+            return
+
+        rows = np.array([self.positions[prot_name1]
+                         for prot_name1, _, _ in scores])
+        columns = np.array([self.positions[prot_name2]
+                            for _, prot_name2, _ in scores])
+        values = np.array([score for _, _, score in scores],
+                          dtype=np.float64)
+
+        # The reversed pairs, without the diagonal.
+        if self.symmetric:
+            mirror = rows != columns
+            rows, columns = (np.concatenate((rows, columns[mirror])),
+                             np.concatenate((columns, rows[mirror])))
+            values = np.concatenate((values, values[mirror]))
+
+        if self.sparse:
+            for entry, array in zip(self.entries, (rows, columns, values)):
+                entry.append(array)
+        else:
+            self.matrix[rows, columns] = values
+        self.count += len(values)
+
+    def close(self):
+        """Writes the matrix and gives it its name."""
+
+        if self.closed:
+            return
+        self.closed = True
+
+        if self.sparse:
+            rows, columns, values = (
+                np.concatenate(entry) if entry else np.zeros(0, dtype)
+                for entry, dtype in zip(self.entries,
+                                        (np.int64, np.int64, np.float64)))
+            # The layout of scipy.sparse.save_npz for a COO matrix.
+            with open(self.temporary_file, "wb") as output:
+                np.savez(output, format=b"coo",
+                         shape=np.array((len(self.names),) * 2),
+                         row=rows, col=columns, data=values,
+                         names=np.array(self.names, dtype=str))
+        else:
+            self.matrix.flush()
+            self.matrix = None
+            with open(names_file(self.path), "w") as names:
+                names.write("".join(f"{name}\n" for name in self.names))
+
+        os.replace(self.temporary_file, self.path)
+
+
+def load_matrix(path):
+    """Loads a score matrix written by ScoreMatrix.
+
+    Parameters
+    ----------
+    path : str
+        The .npy or .npz file of the matrix.
+
+    Returns
+    -------
+    tuple
+        The names of the proteins and the matrix: a memory map of the dense
+        matrix, or, for a sparse matrix, the scores and their rows and
+        columns, as (scores, (rows, columns)), the argument of
+        scipy.sparse.coo_matrix.
+    """
+
+    if path.endswith(".npz"):
+        with np.load(path) as matrix:
+            return (list(matrix["names"]),
+                    (matrix["data"], (matrix["row"], matrix["col"])))
+
+    with open(names_file(path), "r") as names:
+        return ([name.rstrip("\n") for name in names],
+                np.load(path, mmap_mode="r"))
@@ -0,0 +1,502 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 09:04:53 2026
+
+@author: Jean Delhomme
+
+This file contains the persistent store of the alignment scores :
+    - protein_hash
+    - pair_key
+    - score_settings
+    - read_shards
+    - ScoreStore
+    - merge_stores
+
+A score store is a directory keeping every score computed by batch.py
+--store, so that a growing protein set only aligns its new pairs, and an
+interrupted batch starts again where it stopped.
+
+A score is found by a key made from the contents of the two proteins (a
+hash of the embedding, the text of its .t5emb file or its rows in a
+database, and of the fasta sequence, not of the names of the files), the
+mode and the settings changing the score (the precision of the embeddings,
+and the seed and extend heuristic). The key of a global or local score does
+not depend on the order of the pair.
+
+The scores are written by checkpoints: every CHECKPOINT_SIZE new scores,
+or CHECKPOINT_SECONDS after the last checkpoint, and when the store is
+closed, the new scores are written in a new shard, a .npz file of sorted
+keys and scores. A shard is written under a temporary name, then renamed,
+so a shard is either complete or missing, and a shard is never changed
+afterwards. Each process writes its own shards, with a random name: several
+processes, or several machines sharing the directory, can fill the same
+store, and two stores are merged by putting their shards together. The
+store is read from all its shards, a key given twice keeping its first
+score.
+
+The shards of stores are compacted (and merged) into a single shard with :
+
+    python3 score_store.py STORE [OTHER_STORE ...]
+
+"""
+
+import hashlib
+import json
+import os
+import sys
+import time
+import uuid
+
+import numpy as np
+
+import embedding_database as ed
+import fasta_index as fi
+import fasta_reader as fr
+
+# Number of new scores written in a checkpoint.
+CHECKPOINT_SIZE = 10000
+
+# Largest time between two checkpoints, in seconds.
+CHECKPOINT_SECONDS = 60
+
+# Extension of the shards and file of the hashes of the embedding files.
+SHARD_EXTENSION = ".npz"
+HASHES_FILE = "hashes.json"
+
+# Type of the keys: the hexadecimal digest of a pair.
+KEY_TYPE = "S32"
+
+# Size of the blocks of an embedding file hashed at once, in bytes.
+READ_SIZE = 2**20
+
+###############################################################################
+#                                                                             #
+#                                   Keys                                      #
+#                                                                             #
+###############################################################################
+
+def embedding_hash(embedding_file):
+    """Hashes the values of an embedding.
+
+    Parameters
+    ----------
+    embedding_file : str or tuple
+        The name of an embedding file, or the name of a database and the
+        name of a protein of this database.
+
+    Returns
+    -------
+    str
+        The hexadecimal digest of the embedding file, or of the rows of the
+        protein in the database.
+    """
+
+    digest = hashlib.blake2b(digest_size=16)
+
+    if isinstance(embedding_file, tuple):
+        embedding = ed.database_embedding(*embedding_file)
+        for array in embedding if isinstance(embedding, tuple) \
+                else (embedding,):
+            digest.update(str(array.dtype).encode())
+            digest.update(np.ascontiguousarray(array).tobytes())
+        return digest.hexdigest()
+
+    with open(embedding_file, "rb") as embedding:
+        for block in iter(lambda: embedding.read(READ_SIZE), b""):
+            digest.update(block)
+
+    return digest.hexdigest()
+
+
+def protein_hash(embedding_file, fasta_file, hashes=None):
+    """Hashes the contents of a protein: its embedding and its sequence.
+
+    Parameters
+    ----------
+    embedding_file : str or tuple
+        The name of an embedding file, or the name of a database and the
+        name of a protein of this database.
+
+    fasta_file : str or tuple
+        The name of a fasta file, or the name of a multi-fasta file and the
+        name of a record of this file.
+
+    hashes : dict
+        OPTIONAL, the hashes of the embeddings already read, by file, size
+        and modification time. It receives the new ones.
+
+    Returns
+    -------
+    str
+        The hexadecimal digest of the protein.
+    """
+
+    # An embedding is only hashed again when its file changes.
+    if isinstance(embedding_file, tuple):
+        source, protein = embedding_file
+    else:
+        source, protein = embedding_file, None
+    status = os.stat(source)
+    name = json.dumps([os.path.abspath(source), protein, status.st_size,
+                       status.st_mtime_ns])
+
+    if hashes is None or name not in hashes:
+        embedding_digest = embedding_hash(embedding_file)
+        if hashes is not None:
+            hashes[name] = embedding_digest
+    else:
+        embedding_digest = hashes[name]
+
+    if isinstance(fasta_file, tuple):
+        sequence = fi.fetch_sequence(*fasta_file)
+    else:
+        sequence = fr.fasta_reader(fasta_file)
+
+    return hashlib.blake2b(f"{embedding_digest}\t{''.join(sequence)}"
+                           .encode(), digest_size=16).hexdigest()
+
+
+def pair_key(hash1, hash2, mode, settings):
+    """Gives the key of the score of a pair.
+
+    Parameters
+    ----------
+    hash1, hash2 : str
+        The hashes of the query and of the target (see protein_hash).
+
+    mode : str
+        nw (global), sw (local) or gl (glocal).
+
+    settings : str
+        The settings changing the score (see score_settings).
+
+    Returns
+    -------
+    bytes
+        The key, a hexadecimal digest. The global and local scores have the
+        same key in both orders of the pair.
+    """
+
+    if mode != "gl":
+        hash1, hash2 = sorted((hash1, hash2))
+
+    return hashlib.blake2b(f"{hash1}\t{hash2}\t{mode}\t{settings}".encode(),
+                           digest_size=16).hexdigest().encode()
+
+
+def score_settings(engine="numpy", precision="float64"):
+    """Gives the settings changing the scores of a run.
+
+    The engines compute the same scores, up to the rounding of the dot
+    products (see batched_alignment), except the seed and extend heuristic.
+
+    Parameters
+    ----------
+    engine : str
+        OPTIONAL, the engine. By default, numpy.
+
+    precision : str
+        OPTIONAL, the type of the stored embeddings. By default, float64.
+
+    Returns
+    -------
+    str
+        The settings, such as float32 or float64/seed.
+    """
+
+    if engine == "seed":
+        return f"{precision}/seed"
+
+    return precision
+
+###############################################################################
+#                                                                             #
+#                                  Shards                                     #
+#                                                                             #
+###############################################################################
+
+def shard_files(directory):
+    """Lists the shards of a store.
+
+    Parameters
+    ----------
+    directory : str
+        The directory of the store.
+
+    Returns
+    -------
+    list
+        The names of the shard files, in the order of their names.
+    """
+
+    return [os.path.join(directory, name)
+            for name in sorted(os.listdir(directory))
+            if name.endswith(SHARD_EXTENSION)]
+
+
+def read_shards(files):
+    """Reads the keys and scores of shards.
+
+    Parameters
+    ----------
+    files : list
+        The names of the shard files.
+
+    Returns
+    -------
+    tuple
+        The keys, sorted and unique, and their scores (arrays). A key given
+        by several shards keeps the score of the first one.
+    """
+
+    keys = [np.zeros(0, KEY_TYPE)]
+    scores = [np.zeros(0)]
+
+    for file in files:
+        with np.load(file) as shard:
+            keys.append(shard["keys"].astype(KEY_TYPE))
+            scores.append(shard["scores"])
+
+    keys, positions = np.unique(np.concatenate(keys), return_index=True)
+
+    return keys, np.concatenate(scores)[positions]
+
+
+def write_shard(directory, keys, scores):
+    """Writes a new shard in a store, atomically.
+
+    Parameters
+    ----------
+    directory : str
+        The directory of the store.
+
+    keys : array
+        The keys of the scores.
+
+    scores : array
+        The scores.
+
+    Returns
+    -------
+    str
+        The name of the shard file.
+    """
+
+    order = np.argsort(keys, kind="stable")
+    file = os.path.join(directory, uuid.uuid4().hex + SHARD_EXTENSION)
+    temporary_file = f"{file}.tmp"
+
+    try:
+        with open(temporary_file, "wb") as output:
+            np.savez(output, keys=np.asarray(keys, KEY_TYPE)[order],
+                     scores=np.asarray(scores, np.float64)[order])
+            # The shard is on the disk before it gets its name.
+            output.flush()
+            os.fsync(output.fileno())
+        os.replace(temporary_file, file)
+    except BaseException:
+        if os.path.exists(temporary_file):
+            os.remove(temporary_file)
+        raise
+
+    return file
+
+###############################################################################
+#                                                                             #
+#                                  Store                                      #
+#                                                                             #
+###############################################################################
+
+class ScoreStore:
+    """Keeps the scores of the pairs of a run in a store directory.
+
+    The proteins are registered first, by name, then the scores are looked
+    up and added by the names of the proteins, as given by the workers of
+    batch.py. The store is used as a context manager: leaving it writes the
+    last checkpoint.
+
+    Parameters
+    ----------
+    directory : str
+        The directory of the store, created if needed.
+
+    mode : str
+        OPTIONAL, nw (global), sw (local) or gl (glocal). By default, nw.
+
+    settings : str
+        OPTIONAL, the settings changing the scores (see score_settings). By
+        default, float64.
+
+    checkpoint_size : int
+        OPTIONAL, the number of new scores written in a checkpoint.
+
+    checkpoint_seconds : float
+        OPTIONAL, the largest time between two checkpoints, in seconds.
+    """
+
+    def __init__(self, directory, mode="nw", settings="float64",
+                 checkpoint_size=CHECKPOINT_SIZE,
+                 checkpoint_seconds=CHECKPOINT_SECONDS):
+        self.directory = directory
+        self.mode = mode
+        self.settings = settings
+        self.checkpoint_size = checkpoint_size
+        self.checkpoint_seconds = checkpoint_seconds
+        self.hashes = {}
+        self.new_keys = []
+        self.new_scores = []
+        self.count = 0
+        self.last_checkpoint = time.monotonic()
+
+        os.makedirs(directory, exist_ok=True)
+        self.keys, self.scores = read_shards(shard_files(directory))
+
+        # The hashes of the embedding files already read.
+        self.file_hashes = {}
+        self.hashes_file = os.path.join(directory, HASHES_FILE)
+        if os.path.exists(self.hashes_file):
+            with open(self.hashes_file, "r") as hashes:
+                self.file_hashes = json.load(hashes)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def register(self, prot_name, embedding_file, fasta_file):
+        """Hashes a protein and gives it its name.
+
+        Parameters
+        ----------
+        prot_name : str
+            The name of the protein, as given by batch.load_protein.
+
+        embedding_file, fasta_file : str or tuple
+            The embedding and the fasta sequence of the protein (see
+            protein_hash).
+        """
+
+        digest = protein_hash(embedding_file, fasta_file, self.file_hashes)
+
+        if self.hashes.setdefault(prot_name, digest) != digest:
+            raise ValueError(f"Two different proteins are named {prot_name}, "
+                             "the names must be unique in a score store.")
+
+    def key(self, prot_name1, prot_name2):
+        """Gives the key of a pair of registered proteins (see pair_key)."""
+
+        return pair_key(self.hashes[prot_name1], self.hashes[prot_name2],
+                        self.mode, self.settings)
+
+    def lookup(self, prot_name1, prot_name2):
+        """Gives the stored score of a pair.
+
+        Parameters
+        ----------
+        prot_name1, prot_name2 : str
+            The names of the query and of the target.
+
+        Returns
+        -------
+        float
+            The score, or None if the pair is not in the store.
+        """
+
+        key = self.key(prot_name1, prot_name2)
+        position = np.searchsorted(self.keys, key)
+
+        if position < len(self.keys) and self.keys[position] == key:
+            return float(self.scores[position])
+
+        return None
+
+    def add(self, scores):
+        """Adds new scores, and writes a checkpoint when it is due.
+
+        Parameters
+        ----------
+        scores : list
+            A list of tuples, the name of the query, the name of the target
+            and the alignment score, as given by batch.score_chunk.
+        """
+
+        for prot_name1, prot_name2, score in scores:
+            self.new_keys.append(self.key(prot_name1, prot_name2))
+            self.new_scores.append(score)
+
+        if len(self.new_keys) >= self.checkpoint_size \
+                or time.monotonic() - self.last_checkpoint \
+                >= self.checkpoint_seconds:
+            self.checkpoint()
+
+    def checkpoint(self):
+        """Writes the new scores in a new shard."""
+
+        if self.new_keys:
+            write_shard(self.directory, self.new_keys, self.new_scores)
+            self.count += len(self.new_keys)
+            self.new_keys = []
+            self.new_scores = []
+        self.last_checkpoint = time.monotonic()
+
+    def close(self):
+        """Writes the last checkpoint and the hashes of the embedding
+        files."""
+
+        self.checkpoint()
+
+        temporary_file = f"{self.hashes_file}.{os.getpid()}.tmp"
+        with open(temporary_file, "w") as hashes:
+            json.dump(self.file_hashes, hashes)
+        os.replace(temporary_file, self.hashes_file)
+
+
+def merge_stores(directory, others=()):
+    """Compacts the shards of a store, with the shards of other stores, into
+    a single shard.
+
+    Only the shards read are removed from the store, so other processes can
+    keep adding shards during the merge. The other stores are not changed.
+
+    Parameters
+    ----------
+    directory : str
+        The directory of the store receiving the scores.
+
+    others : list
+        OPTIONAL, the directories of the other stores.
+
+    Returns
+    -------
+    int
+        The number of scores of the merged shard.
+    """
+
+    files = shard_files(directory)
+    keys, scores = read_shards(files + [file for other in others
+                                        for file in shard_files(other)])
+    write_shard(directory, keys, scores)
+
+    # The merged shard has all their scores.
+    for file in files:
+        try:
+            os.remove(file)
+        except FileNotFoundError:
+            pass
+
+    return len(keys)
+
+
+if __name__ == "__main__":
+
+    # Compacts a store and merges other stores into it:
+    # python3 score_store.py STORE [OTHER_STORE ...]
+    if len(sys.argv) < 2:
+        sys.exit("Usage: python3 score_store.py STORE [OTHER_STORE ...]")
+
+    print(f"{merge_stores(sys.argv[1], sys.argv[2:])} scores in "
+          f"{sys.argv[1]}")
@@ -0,0 +1,433 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 08:33:45 2026
+
+@author: Jean Delhomme
+
+This file contains the functions of the seed and extend local alignment :
+    - find_seeds
+    - diagonal_runs
+    - xdrop_length
+    - xdrop_extend
+    - seed_windows
+    - seed_alignment
+    - seed_benchmark
+
+seed_alignment is a heuristic version of smith_waterman, as in BLAST. The dot
+matrix is computed (it is the fast part), but the Smith and Waterman matrix
+is only filled in small windows :
+    - the seeds are the pairs of residues whose dot product is above a
+      threshold (mean + SEED_SIGMAS standard deviations of the dot matrix).
+    - the seeds on the same diagonal, close to each other, are grouped in
+      runs.
+    - the best runs are extended on their diagonal, in both directions, while the
+      sum of the dot products minus their mean does not fall more than
+      x_drop below the best sum reached (X-drop). This gives a segment of
+      the diagonal.
+    - the best segments, with a margin on each side, are the windows. The
+      Smith and Waterman matrix of each window is filled and traced back as
+      in smith_waterman_alignments.
+
+The alignments of the best window are given, in the format of
+smith_waterman_alignments. Their score is at most the one of smith_waterman,
+the windows being parts of the whole matrix. seed_benchmark compares both on
+a set of pairs. It can be run as a script :
+
+    python3 seed_alignment.py SET [TARGET] [--fasta-dir DIR]
+
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+import alignment_matrix as am
+import alignment_algorithm as aa
+
+# Threshold of the seeds, in standard deviations above the mean of the dot
+# matrix.
+SEED_SIGMAS = 3.0
+
+# Drop allowed during the extension, in standard deviations of the dot
+# matrix.
+X_DROP_SIGMAS = 5.0
+
+# Largest distance between two seeds of the same run, on their diagonal.
+RUN_GAP = 4
+
+# Number of cells added on each side of a segment to make its window.
+MARGIN = 16
+
+# Number of windows aligned.
+MAX_WINDOWS = 4
+
+# Number of runs extended, the runs with the best seeds first.
+MAX_EXTENSIONS = 64
+
+###############################################################################
+#                                                                             #
+#                                  Seeds                                      #
+#                                                                             #
+###############################################################################
+
+def find_seeds(dot_matrix, threshold):
+    """Finds the pairs of residues whose dot product is above a threshold.
+
+    Parameters
+    ----------
+    dot_matrix : array
+        An array containing the score matrix for an alignment.
+
+    threshold : float
+        The smallest dot product of a seed.
+
+    Returns
+    -------
+    tuple
+        The rows and the columns of the seeds (two arrays). Without any
+        seed, the best pair of residues is the only seed.
+    """
+
+    rows, columns = np.nonzero(dot_matrix >= threshold)
+
+    if len(rows) == 0:
+        best = np.unravel_index(np.argmax(dot_matrix), dot_matrix.shape)
+        rows = np.array([best[0]])
+        columns = np.array([best[1]])
+
+    return rows, columns
+
+
+def diagonal_runs(rows, columns, weights, run_gap=RUN_GAP):
+    """Groups the seeds of the same diagonal that are close to each other.
+
+    Parameters
+    ----------
+    rows : array
+        The rows of the seeds.
+
+    columns : array
+        The columns of the seeds.
+
+    weights : array
+        The score of each seed.
+
+    run_gap : int
+        OPTIONAL, the largest distance between two seeds of the same run.
+
+    Returns
+    -------
+    list
+        A list of tuples, the first row, the first column and the length of
+        each run, from the run with the highest sum of seed scores.
+    """
+
+    diagonals = columns - rows
+    order = np.lexsort((rows, diagonals))
+    rows = rows[order]
+    diagonals = diagonals[order]
+    weights = weights[order]
+
+    # A run ends where the diagonal changes or the next seed is too far.
+    ends = np.flatnonzero((np.diff(diagonals) != 0)
+                          | (np.diff(rows) > run_gap))
+    starts = np.concatenate([[0], ends + 1])
+    stops = np.concatenate([ends, [len(rows) - 1]])
+    order = np.argsort(-np.add.reduceat(weights, starts), kind="stable")
+
+    return [(int(rows[starts[run]]),
+             int(rows[starts[run]] + diagonals[starts[run]]),
+             int(rows[stops[run]] - rows[starts[run]] + 1))
+            for run in order]
+
+###############################################################################
+#                                                                             #
+#                                Extension                                    #
+#                                                                             #
+###############################################################################
+
+def xdrop_length(scores, x_drop):
+    """Finds the best extension along a list of scores, with an X-drop.
+
+    Parameters
+    ----------
+    scores : array
+        The scores of the cells met by the extension, in order.
+
+    x_drop : float
+        The extension stops when the sum falls x_drop below its best value.
+
+    Returns
+    -------
+    tuple
+        The number of cells of the best extension and its score.
+    """
+
+    totals = np.cumsum(scores)
+    best_totals = np.maximum.accumulate(np.maximum(totals, 0))
+
+    # The extension stops at the first drop.
+    drops = np.flatnonzero(totals < best_totals - x_drop)
+    if len(drops):
+        totals = totals[:drops[0]]
+
+    if len(totals) == 0 or totals.max() <= 0:
+        return 0, 0.0
+
+    length = int(np.argmax(totals))
+
+    return length + 1, float(totals[length])
+
+
+def xdrop_extend(dot_matrix, row, column, length, background, x_drop):
+    """Extends a run on its diagonal, with an X-drop termination.
+
+    Parameters
+    ----------
+    dot_matrix : array
+        An array containing the score matrix for an alignment.
+
+    row, column : int
+        The first cell of the run.
+
+    length : int
+        The number of cells of the run.
+
+    background : float
+        The score of a random pair of residues, removed from each dot
+        product.
+
+    x_drop : float
+        The extension stops when the sum falls x_drop below its best value.
+
+    Returns
+    -------
+    tuple
+        The first row, the first column and the length of the segment, and
+        its score (sum of the dot products minus the background).
+    """
+
+    # The diagonal of the run, from its top-left end.
+    diagonal = np.diagonal(dot_matrix, column - row) - background
+    position = min(row, column)
+
+    score = float(diagonal[position:position+length].sum())
+    forward, forward_score = xdrop_length(diagonal[position+length:], x_drop)
+    backward, backward_score = xdrop_length(diagonal[:position][::-1],
+                                            x_drop)
+
+    return (row - backward, column - backward, length + backward + forward,
+            score + forward_score + backward_score)
+
+
+def seed_windows(dot_matrix, seed_sigmas=SEED_SIGMAS,
+                 x_drop_sigmas=X_DROP_SIGMAS, margin=MARGIN,
+                 max_windows=MAX_WINDOWS, max_extensions=MAX_EXTENSIONS):
+    """Finds the windows of the matrix around the best extended seeds.
+
+    Parameters
+    ----------
+    dot_matrix : array
+        An array containing the score matrix for an alignment.
+
+    seed_sigmas : float
+        OPTIONAL, the threshold of the seeds, in standard deviations above
+        the mean of the dot matrix.
+
+    x_drop_sigmas : float
+        OPTIONAL, the drop allowed during the extension, in standard
+        deviations of the dot matrix.
+
+    margin : int
+        OPTIONAL, the number of cells added on each side of a segment.
+
+    max_windows : int
+        OPTIONAL, the number of windows kept.
+
+    max_extensions : int
+        OPTIONAL, the number of runs extended.
+
+    Returns
+    -------
+    list
+        A list of tuples, the first row, the last row (excluded), the first
+        column and the last column (excluded) of each window of the dot
+        matrix, from the best segment. Overlapping windows are merged.
+    """
+
+    seq1_size, seq2_size = dot_matrix.shape
+    background = dot_matrix.mean()
+    deviation = dot_matrix.std()
+
+    rows, columns = find_seeds(dot_matrix,
+                               background + seed_sigmas * deviation)
+    runs = diagonal_runs(rows, columns, dot_matrix[rows, columns])
+
+    # The best runs are extended, the same segment is only kept once.
+    segments = {}
+    for row, column, length in runs[:max_extensions]:
+        *segment, score = xdrop_extend(dot_matrix, row, column, length,
+                                       background, x_drop_sigmas * deviation)
+        segments[tuple(segment)] = score
+
+    best = sorted(segments, key=segments.get, reverse=True)[:max_windows]
+
+    windows = []
+    for row, column, length in best:
+        window = [max(row - margin, 0), min(row + length + margin, seq1_size),
+                  max(column - margin, 0),
+                  min(column + length + margin, seq2_size)]
+        # Merges the window with the windows it overlaps.
+        for other in list(windows):
+            if window[0] < other[1] and other[0] < window[1] \
+                    and window[2] < other[3] and other[2] < window[3]:
+                windows.remove(other)
+                window = [min(window[0], other[0]), max(window[1], other[1]),
+                          min(window[2], other[2]), max(window[3], other[3])]
+        windows.append(window)
+
+    return [tuple(window) for window in windows]
+
+###############################################################################
+#                                                                             #
+#                                Alignment                                    #
+#                                                                             #
+###############################################################################
+
+def seed_alignment(fasta1, fasta2, dot_matrix, seed_sigmas=SEED_SIGMAS,
+                   x_drop_sigmas=X_DROP_SIGMAS, margin=MARGIN,
+                   max_windows=MAX_WINDOWS):
+    """Finds the local alignments with the seed and extend heuristic.
+
+    Parameters
+    ----------
+    fasta1 : list of string
+        A list of string containing the first fasta sequence.
+
+    fasta2 : list of string
+        A list of string containing the second fasta sequence.
+
+    dot_matrix : array
+        An array containing the score matrix for an alignment.
+
+    seed_sigmas, x_drop_sigmas, margin, max_windows :
+        OPTIONAL, the settings of the windows, see seed_windows.
+
+    Returns
+    -------
+    list
+        A list of tuples, the alignment score, the two aligned sequences
+        (str) and the cells of the path in the whole alignment matrix of each
+        alignment of the best window, as smith_waterman_alignments.
+    """
+
+    best_score = -np.inf
+    best_alignments = []
+
+    for first_row, last_row, first_column, last_column in seed_windows(
+            dot_matrix, seed_sigmas, x_drop_sigmas, margin, max_windows):
+
+        alignment_matrix = am.alignment_matrix_sw_numpy(
+            dot_matrix[first_row:last_row, first_column:last_column])
+
+        if alignment_matrix.max() > best_score:
+            best_score = alignment_matrix.max()
+            best_alignments = [
+                (score, result1, result2,
+                 tuple((i + first_row, j + first_column) for i, j in cells))
+                for score, result1, result2, cells
+                in aa.smith_waterman_alignments(
+                    fasta1[first_row:last_row],
+                    fasta2[first_column:last_column], alignment_matrix)]
+
+    return best_alignments
+
+###############################################################################
+#                                                                             #
+#                                Benchmark                                    #
+#                                                                             #
+###############################################################################
+
+def seed_benchmark(pairs):
+    """Compares seed_alignment with the exhaustive Smith and Waterman.
+
+    Parameters
+    ----------
+    pairs : iterable
+        Tuples of two embedding arrays and two fasta sequences.
+
+    Returns
+    -------
+    dict
+        The number of pairs, the part of the pairs where the heuristic finds
+        the best score, the mean ratio of the scores and the time per pair in
+        seconds of both methods (dot products included).
+    """
+
+    found = 0
+    ratios = []
+    exhaustive_time = 0.0
+    seed_time = 0.0
+
+    for embedding1, embedding2, fasta1, fasta2 in pairs:
+
+        start = time.perf_counter()
+        dot_matrix = np.dot(embedding1, embedding2.T)
+        best = aa.smith_waterman_alignments(
+            fasta1, fasta2, am.alignment_matrix_sw_numpy(dot_matrix))[0][0]
+        exhaustive_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        dot_matrix = np.dot(embedding1, embedding2.T)
+        score = seed_alignment(fasta1, fasta2, dot_matrix)[0][0]
+        seed_time += time.perf_counter() - start
+
+        found += score == best
+        ratios.append(score / best if best else 1.0)
+
+    count = max(len(ratios), 1)
+
+    return {"pairs": len(ratios),
+            "found": found / count,
+            "score_ratio": float(np.mean(ratios)) if ratios else 1.0,
+            "exhaustive_seconds": exhaustive_time / count,
+            "seed_seconds": seed_time / count}
+
+
+if __name__ == "__main__":
+
+    # batch reads the protein sets.
+    import batch as ba
+    import embedding_precision as ep
+
+    parser = argparse.ArgumentParser(
+        description="Compares the seed and extend local alignment with the "
+                    "exhaustive one.")
+    parser.add_argument("query",
+                        help="directory, .t5emb file, .t5db database or "
+                             "manifest")
+    parser.add_argument("target", nargs="?", default=None,
+                        help="directory, .t5emb file, .t5db database or "
+                             "manifest, by default all-vs-all on the query "
+                             "set")
+    parser.add_argument("--fasta-dir", default="../data/fasta/",
+                        help="directory containing the fasta files, or a "
+                             "multi-fasta file")
+    arguments = parser.parse_args()
+
+    query_set = ba.read_protein_set(arguments.query, arguments.fasta_dir)
+    target_set = None
+    if arguments.target is not None:
+        target_set = ba.read_protein_set(arguments.target,
+                                         arguments.fasta_dir)
+
+    def protein_pairs():
+        for query, target in ba.make_pairs(query_set, target_set):
+            embedding1, fasta1, _ = ba.load_protein(*query)
+            embedding2, fasta2, _ = ba.load_protein(*target)
+            yield (ep.as_float(embedding1), ep.as_float(embedding2),
+                   fasta1, fasta2)
+
+    for key, value in seed_benchmark(protein_pairs()).items():
+        print(f"{key}\t{value}")
@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 08:23:26 2026
+
+@author: Jean Delhomme
+
+This file contains the function tiled_matrix and the function tile_shape.
+
+tiled_matrix fills the alignment matrix without computing the whole dot
+matrix first. The dot products are computed by tiles (a block of rows of the
+first protein against a block of columns of the second one) and each tile is
+used by the fill as soon as it is computed. Only one tile, one row of the
+alignment matrix and the last column of the current tile are in memory.
+
+As direction_matrix, it gives the direction matrix (or nothing, if only the
+scores are needed), the last column of the alignment matrix and its
+maximums. The tracebacks needleman_wunsch_directions,
+smith_waterman_directions and glocal_directions of alignment_algorithm can
+then be used.
+
+The dot products of a tile may differ from the ones of the whole dot matrix
+in the last digits (they are not added in the same order by BLAS), so the
+scores are the same as the ones of alignment_matrix up to this rounding.
+
+"""
+
+import math
+
+import numpy as np
+
+import alignment_matrix as am
+
+# Default size of a tile: 256 rows and 256 columns, 512 kB of dot products.
+TILE_ROWS = 256
+TILE_COLUMNS = 256
+
+###############################################################################
+#                                                                             #
+#                                Tile shape                                   #
+#                                                                             #
+###############################################################################
+
+def tile_shape(memory_budget, dimension=1024, itemsize=8):
+    """Chooses a square tile fitting a memory budget.
+
+    A tile needs the dot products (size * size values) and the embeddings of
+    its rows and columns (2 * size * dimension values).
+
+    Parameters
+    ----------
+    memory_budget : int
+        The memory available for a tile, in bytes (for instance the size of
+        the L2 or L3 cache).
+
+    dimension : int
+        OPTIONAL, the size of the embedding vectors. By default, 1024.
+
+    itemsize : int
+        OPTIONAL, the size of a value in bytes. By default, 8 (float64).
+
+    Returns
+    -------
+    tuple
+        The number of rows and columns of a tile.
+    """
+
+    values = memory_budget // itemsize
+
+    # Positive root of size**2 + 2*dimension*size - values = 0.
+    size = int(-dimension + math.sqrt(dimension**2 + values))
+
+    return max(size, 1), max(size, 1)
+
+###############################################################################
+#                                                                             #
+#                                Tiled fill                                   #
+#                                                                             #
+###############################################################################
+
+def tiled_matrix(embedding1, embedding2, local=False, directions=True,
+                 tile_rows=TILE_ROWS, tile_columns=TILE_COLUMNS):
+    """Fills the alignment matrix tile by tile, from the embeddings.
+
+    The rows of a block of rows are filled one tile of columns after the
+    other. Within a tile, the recurrence is the one of
+    alignment_matrix_nw_numpy: the top row comes from the previous block of
+    rows and the left column from the previous tile.
+
+    Parameters
+    ----------
+    embedding1 : array
+        The embedding array of the first protein (rows).
+
+    embedding2 : array
+        The embedding array of the second protein (columns).
+
+    local : bool
+        OPTIONAL, True for the Smith and Waterman matrix. By default, False.
+
+    directions : bool
+        OPTIONAL, False to only compute the scores, without the direction
+        matrix. By default, True.
+
+    tile_rows : int
+        OPTIONAL, the number of rows of a tile.
+
+    tile_columns : int
+        OPTIONAL, the number of columns of a tile.
+
+    Returns
+    -------
+    tuple
+        The direction matrix (uint8 array, or None), the last column of the
+        alignment matrix (array), the positions of the maximums of the
+        alignment matrix (tuple of two arrays, as given by np.where) and the
+        maximum.
+    """
+
+    # The gap is fixed at 0.
+    gap = 0
+
+    seq1_size = embedding1.shape[0]
+    seq2_size = embedding2.shape[0]
+
+    direction_matrix = None
+    if directions:
+        direction_matrix = np.zeros((seq1_size+1, seq2_size+1),
+                                    dtype=np.uint8)
+    last_column = np.zeros(seq1_size+1)
+
+    # Last row of the previous block of rows, starting with the first row of
+    # the alignment matrix.
+    first_row = np.arange(seq2_size+1) * gap
+    top_row = first_row.astype(float)
+
+    # Maximums of the alignment matrix, starting with the first row.
+    best = top_row.max()
+    columns = np.flatnonzero(top_row == best)
+    maxima_rows = [np.zeros(len(columns), dtype=np.intp)]
+    maxima_columns = [columns]
+
+    for row_start in range(0, seq1_size, tile_rows):
+        row_stop = min(row_start+tile_rows, seq1_size)
+        block_size = row_stop - row_start
+
+        # First column of the alignment matrix for the rows of the block.
+        left_column = (np.arange(row_start+1, row_stop+1) * gap).astype(float)
+        next_top_row = np.empty(seq2_size+1)
+        next_top_row[0] = row_stop * gap
+
+        for column_start in range(0, seq2_size, tile_columns):
+            column_stop = min(column_start+tile_columns, seq2_size)
+
+            # Dot products of the tile, used straight away.
+            scores = np.dot(embedding1[row_start:row_stop],
+                            embedding2[column_start:column_stop].T)
+
+            # Cells (i-1, column_start) to (i-1, column_stop) of the
+            # alignment matrix: one more column on the left.
+            previous_row = top_row[column_start:column_stop+1]
+
+            for k in range(block_size):
+                i = row_start + k + 1
+
+                row = np.empty(column_stop-column_start+1)
+                row[0] = left_column[k]
+                np.maximum(previous_row[:-1] + scores[k],
+                           previous_row[1:] + gap, out=row[1:])
+                # In Smith and Waterman, the maximum needs to be > 0.
+                if local:
+                    np.maximum(row[1:], 0, out=row[1:])
+                np.maximum.accumulate(row, out=row)
+
+                if directions:
+                    am.row_directions(
+                        direction_matrix[i, column_start:column_stop+1],
+                        previous_row, row)
+
+                # Keeps the maximums (the first column of the alignment
+                # matrix is only in the first tile of the row).
+                first = 0 if column_start == 0 else 1
+                row_max = row[first:].max()
+                if row_max >= best:
+                    if row_max > best:
+                        best = row_max
+                        maxima_rows = []
+                        maxima_columns = []
+                    columns = np.flatnonzero(row[first:] == best) \
+                        + column_start + first
+                    maxima_rows.append(np.full(len(columns), i,
+                                               dtype=np.intp))
+                    maxima_columns.append(columns)
+
+                left_column[k] = row[-1]
+                previous_row = row
+
+            next_top_row[column_start+1:column_stop+1] = previous_row[1:]
+
+        last_column[row_start+1:row_stop+1] = left_column
+        top_row = next_top_row
+
+    # The row before the first row is the last one (glocal traceback).
+    if directions:
+        am.row_directions(direction_matrix[0], top_row, first_row)
+
+    # The maximums are sorted in the order of np.where.
+    maxima_rows = np.concatenate(maxima_rows)
+    maxima_columns = np.concatenate(maxima_columns)
+    order = np.lexsort((maxima_columns, maxima_rows))
+
+    return (direction_matrix, last_column,
+            (maxima_rows[order], maxima_columns[order]), best)
+
+###############################################################################
+#                                                                             #
+#                                 Score                                       #
+#                                                                             #
+###############################################################################
+
+def tiled_score(embedding1, embedding2, mode="nw", tile_rows=TILE_ROWS,
+                tile_columns=TILE_COLUMNS):
+    """Computes an alignment score tile by tile, without direction matrix.
+
+    Parameters
+    ----------
+    embedding1 : array
+        The embedding array of the first protein (rows).
+
+    embedding2 : array
+        The embedding array of the second protein (columns).
+
+    mode : str
+        OPTIONAL, nw (global), sw (local) or gl (glocal). By default, nw.
+
+    tile_rows : int
+        OPTIONAL, the number of rows of a tile.
+
+    tile_columns : int
+        OPTIONAL, the number of columns of a tile.
+
+    Returns
+    -------
+    float
+        The alignment score.
+    """
+
+    _, last_column, _, best = tiled_matrix(embedding1, embedding2,
+                                           mode != "nw", False, tile_rows,
+                                           tile_columns)
+
+    if mode == "nw":
+        return last_column[-1]
+    if mode == "sw":
+        return best
+    return last_column.max()
@@ -0,0 +1,278 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 08:36:01 2026
+
+@author: Jean Delhomme
+
+This file contains two functions :
+    - top_local_alignments
+    - top_glocal_alignments
+
+smith_waterman gives one alignment for each maximum of the alignment matrix
+and glocal one for each maximum of its last column. On repetitive proteins
+or self-alignments, there can be many tied maximums, and the alignments
+found share most of their pairs of residues. The functions of this file give
+at most k alignments, the best first, which never align the same pair of
+residues twice (Waterman and Eggert) :
+    - the best cell is traced back as in smith_waterman_alignments (or
+      glocal_alignments), but a pair of residues already aligned cannot be
+      aligned again.
+    - the pairs of residues of the alignment are removed (their dot product
+      becomes -inf), and only the part of the matrix below and on the right
+      of them, which depends on them, is filled again.
+    - the next best cell is found from the maximum of each row (or from the
+      last column), without reading the whole matrix again.
+The search stops after k alignments, when the best score is below
+min_score, or when no new pair of residues can be aligned.
+
+The first local alignment is the first one of smith_waterman_alignments.
+The first glocal alignment starts at the same cell as the first one of
+glocal_alignments, but its traceback stops at the first row and completes
+the alignment with gaps to the first column, where glocal_alignments would
+continue from the last row.
+
+"""
+
+import numpy as np
+
+import alignment_matrix as am
+
+# Default number of alignments.
+TOP_K = 5
+
+###############################################################################
+#                                                                             #
+#                                Traceback                                    #
+#                                                                             #
+###############################################################################
+
+def trace_back(fasta1, fasta2, alignment_matrix, scores, i, j, glocal=False):
+    """Traces an alignment back, avoiding the pairs already aligned.
+
+    The moves are the ones of smith_waterman_alignments: the best of the
+    diagonal, top and left cells, preferring the diagonal, then the top. The
+    diagonal is not allowed on a pair of residues whose dot product is -inf.
+
+    Parameters
+    ----------
+    fasta1 : list of string
+        A list of string containing the first fasta sequence.
+
+    fasta2 : list of string
+        A list of string containing the second fasta sequence.
+
+    alignment_matrix : array
+        The Smith and Waterman alignment matrix.
+
+    scores : array
+        The dot matrix, with -inf for the pairs already aligned.
+
+    i, j : int
+        The cell where the alignment ends.
+
+    glocal : bool
+        OPTIONAL, True to complete the alignment to the first column with
+        gaps. By default, False.
+
+    Returns
+    -------
+    tuple
+        The two aligned sequences (str), the cells of the path (see
+        alignment_algorithm) and the rows and columns of the aligned pairs of
+        residues in the dot matrix (two lists).
+    """
+
+    end = (i, j)
+    result1 = []
+    result2 = []
+    rows = []
+    columns = []
+
+    while i > 0 and j > 0:
+
+        score_diagonal = alignment_matrix[i-1][j-1]
+        score_left = alignment_matrix[i][j-1]
+        score_top = alignment_matrix[i-1][j]
+        # A pair already aligned cannot be aligned again.
+        if scores[i-1][j-1] == -np.inf:
+            score_diagonal = -np.inf
+        max_score = max(score_diagonal, score_left, score_top)
+
+        if max_score == score_diagonal:
+            result1.append(fasta1[i-1])
+            result2.append(fasta2[j-1])
+            rows.append(i-1)
+            columns.append(j-1)
+            i -= 1
+            j -= 1
+        elif max_score == score_top:
+            result1.append(fasta1[i-1])
+            result2.append('-')
+            i -= 1
+        else:
+            result1.append('-')
+            result2.append(fasta2[j-1])
+            j -= 1
+
+    # The glocal alignment goes to the first column.
+    while glocal and j > 0:
+        result1.append('-')
+        result2.append(fasta2[j-1])
+        j -= 1
+
+    return ("".join(result1[::-1]), "".join(result2[::-1]), ((i, j), end),
+            rows, columns)
+
+
+def remove_pairs(alignment_matrix, scores, rows, columns):
+    """Removes aligned pairs of residues and fills the matrix again.
+
+    Only the cells below and on the right of the first removed pair depend
+    on the removed pairs, so only they are filled again (see
+    alignment_matrix.fill_tile).
+
+    Parameters
+    ----------
+    alignment_matrix : array
+        The Smith and Waterman alignment matrix, updated in place.
+
+    scores : array
+        The dot matrix, updated in place.
+
+    rows, columns : list
+        The rows and columns of the pairs in the dot matrix.
+
+    Returns
+    -------
+    int
+        The first row of the alignment matrix filled again.
+    """
+
+    scores[rows, columns] = -np.inf
+
+    first_row = min(rows)
+    first_column = min(columns)
+    am.fill_tile(alignment_matrix, scores, first_row, scores.shape[0],
+                 first_column, scores.shape[1], local=True)
+
+    return first_row + 1
+
+###############################################################################
+#                                                                             #
+#                                  Top k                                      #
+#                                                                             #
+###############################################################################
+
+def top_local_alignments(fasta1, fasta2, dot_matrix, k=TOP_K, min_score=0):
+    """Finds the k best local alignments without shared pairs of residues.
+
+    Parameters
+    ----------
+    fasta1 : list of string
+        A list of string containing the first fasta sequence.
+
+    fasta2 : list of string
+        A list of string containing the second fasta sequence.
+
+    dot_matrix : array
+        An array containing the score matrix for an alignment.
+
+    k : int
+        OPTIONAL, the largest number of alignments. By default, 5.
+
+    min_score : float
+        OPTIONAL, the smallest score of an alignment. By default, 0.
+
+    Returns
+    -------
+    list
+        A list of tuples, the alignment score, the two aligned sequences
+        (str) and the cells of the path of each alignment, the best first.
+    """
+
+    scores = np.array(dot_matrix, dtype=float)
+    alignment_matrix = am.alignment_matrix_sw_numpy(scores)
+
+    # The maximum of each row, updated with the rows filled again.
+    row_maxima = alignment_matrix.max(axis=1)
+
+    alignments = []
+
+    while len(alignments) < k:
+
+        best = row_maxima.max()
+        if best < min_score:
+            break
+
+        # The last maximum in reading order, as in smith_waterman.
+        i = int(np.flatnonzero(row_maxima == best)[-1])
+        j = int(np.flatnonzero(alignment_matrix[i] == best)[-1])
+
+        result1, result2, cells, rows, columns = trace_back(
+            fasta1, fasta2, alignment_matrix, scores, i, j)
+        alignments.append((best, result1, result2, cells))
+
+        # Without any new pair, the next alignments would be the same.
+        if not rows:
+            break
+
+        first_row = remove_pairs(alignment_matrix, scores, rows, columns)
+        row_maxima[first_row:] = alignment_matrix[first_row:].max(axis=1)
+
+    return alignments
+
+
+def top_glocal_alignments(fasta1, fasta2, dot_matrix, k=TOP_K, min_score=0):
+    """Finds the k best glocal alignments without shared pairs of residues.
+
+    The alignments end in the last column, as in glocal.
+
+    Parameters
+    ----------
+    fasta1 : list of string
+        A list of string containing the first fasta sequence.
+
+    fasta2 : list of string
+        A list of string containing the second fasta sequence.
+
+    dot_matrix : array
+        An array containing the score matrix for an alignment.
+
+    k : int
+        OPTIONAL, the largest number of alignments. By default, 5.
+
+    min_score : float
+        OPTIONAL, the smallest score of an alignment. By default, 0.
+
+    Returns
+    -------
+    list
+        A list of tuples, the alignment score, the two aligned sequences
+        (str) and the cells of the path of each alignment, the best first.
+    """
+
+    scores = np.array(dot_matrix, dtype=float)
+    alignment_matrix = am.alignment_matrix_sw_numpy(scores)
+    j = alignment_matrix.shape[1] - 1
+
+    alignments = []
+
+    while len(alignments) < k:
+
+        # The last maximum of the last column, as in glocal.
+        last_column = alignment_matrix[:, j]
+        best = last_column.max()
+        if best < min_score:
+            break
+        i = int(np.flatnonzero(last_column == best)[-1])
+
+        result1, result2, cells, rows, columns = trace_back(
+            fasta1, fasta2, alignment_matrix, scores, i, j, glocal=True)
+        alignments.append((best, result1, result2, cells))
+
+        if not rows:
+            break
+
+        remove_pairs(alignment_matrix, scores, rows, columns)
+
+    return alignments